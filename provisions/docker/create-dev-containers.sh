@@ -29,33 +29,43 @@ echo "Creating \"datahub_dev\" Docker network if needed..."
 docker network create datahub_dev 2> /dev/null
 
 echo "Creating Docker containers..."
-echo "(1/6) Creating \"logs\" - Data container for all server logs"
+echo "(1/7) Creating \"logs\" - Data container for all server logs"
 docker create --name logs \
     -v /var/log/postgresql \
     -v /var/log/gunicorn \
     -v /var/log/nginx \
     --entrypoint /bin/true \
     datahuborg/postgres
-echo "(2/6) Creating \"data\" - Data container for Postgres db and user_data uploads"
+echo "(2/7) Creating \"data\" - Data container for Postgres db and user_data uploads"
 docker create --name data \
     --entrypoint /bin/true \
     datahuborg/postgres
-echo "(3/6) Creating \"db\" - Postgres server"
+echo "(3/7) Creating \"db\" - Postgres server"
 docker create --name db \
     --volumes-from logs \
     --volumes-from data \
     --net=datahub_dev \
     datahuborg/postgres
-echo "(4/6) Creating \"app\" - gunicorn server hosting DataHub"
+echo "(4/7) Creating \"app\" - gunicorn server hosting DataHub"
 docker create --name app \
     --env 'USER=vagrant' \
+    --env 'RUN_JOBS=0' \
     --volumes-from logs \
     --volumes-from data \
     --net=datahub_dev \
     -v /vagrant:/datahub \
     datahuborg/datahub
     # gunicorn browser.wsgi --config=provisions/gunicorn/config_dev.py
-echo "(5/6) Creating \"web\" - nginx http proxy"
+echo "(5/7) Creating \"jobs\" - worker running background exports and imports"
+docker create --name jobs \
+    --env 'USER=vagrant' \
+    --volumes-from logs \
+    --volumes-from data \
+    --net=datahub_dev \
+    -v /vagrant:/datahub \
+    datahuborg/datahub \
+    python src/manage.py runjobs
+echo "(6/7) Creating \"web\" - nginx http proxy"
 docker create --name web \
     --volumes-from logs \
     --volumes-from app \
@@ -63,7 +73,7 @@ docker create --name web \
     --net=datahub_dev \
     -p 80:80 -p 443:443 \
     datahuborg/nginx
-echo "(6/6) Creating \"phantomjs\" - PhantomJS remote web driver for Selenium tests"
+echo "(7/7) Creating \"phantomjs\" - PhantomJS remote web driver for Selenium tests"
 docker create --name phantomjs \
     --env 'USER=vagrant' \
     --net=datahub_dev \
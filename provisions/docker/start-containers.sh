@@ -19,5 +19,6 @@ docker run \
     datahuborg/datahub \
     /bin/bash -c "python src/manage.py migrate --noinput"
 docker start app
+docker start jobs
 docker start web
 echo "Done."
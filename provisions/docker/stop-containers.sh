@@ -7,6 +7,7 @@ fi
 
 echo "Stopping containers..."
 docker stop web
+docker stop jobs
 docker stop app
 docker stop db
 echo "Done."
\ No newline at end of file
@@ -3,10 +3,19 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 
-from inventory.models import Collaborator
-from core.db.manager import DataHubManager
+from config import settings
+from inventory.models import Collaborator, Job
+from core import jobs
+from core.db.cache import LRUCache
+from core.db.manager import DataHubManager, user_data_path
 from core.db.rlsmanager import RowLevelSecurityManager
 
+# Pages of card results, keyed on (repo_base, executing role, query,
+# current_page, rows_per_page). Each entry holds the version of the tables
+# the query read from, so that writes to those tables invalidate it.
+_card_results_cache = LRUCache(max_size=settings.CARD_CACHE_SIZE,
+                               ttl=settings.CARD_CACHE_TTL)
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -347,14 +356,9 @@ class CardSerializer(DataHubSerializer):
         res['public'] = card.public
 
         # Get the results of the card
-        # cards must spawn a new serializer, since they run as the user
-        # that created the card (not necessarily the current user)
-        query_serializer = QuerySerializer(self.repo_base, self.repo_base)
-        query_results = query_serializer.execute_query(
-            query=card.query, repo=repo, current_page=current_page,
-            rows_per_page=rows_per_page,
-            rows_only=False)
-        res['results'] = query_results
+        res['results'] = self._card_results(card, current_page, rows_per_page)
+        res['last_refreshed'] = card.last_refreshed
+        res['result_size'] = card.result_size
 
         if rows_only:
             # Some formats, like CSV, don't have a place for metadata.
@@ -363,6 +367,30 @@ class CardSerializer(DataHubSerializer):
 
         return res
 
+    def _card_results(self, card, current_page, rows_per_page):
+        # cards must spawn a new serializer, since they run as the user
+        # that created the card (not necessarily the current user)
+        query_serializer = QuerySerializer(self.repo_base, self.repo_base)
+        manager = query_serializer.manager
+
+        key = (self.repo_base, manager.username, card.query,
+               current_page, rows_per_page)
+        # read the version before running the query, so that writes made
+        # while it runs leave the cached results stale rather than current
+        version = manager.get_query_version(card.query)
+        cached = _card_results_cache.get(key)
+        if version is not None and cached is not None and \
+                cached[0] == version:
+            return cached[1]
+
+        results = query_serializer.execute_query(
+            query=card.query, repo=card.repo_name, current_page=current_page,
+            rows_per_page=rows_per_page, rows_only=False)
+        if version is not None:
+            _card_results_cache.set(key, (version, results))
+        manager.record_card_refresh(card, len(results['rows']))
+        return results
+
     def update_card(self, repo, card_name, new_query, new_name, public):
         card = self.manager.update_card(
             repo, card_name, new_query, new_name, public)
@@ -379,7 +407,8 @@ class CardSerializer(DataHubSerializer):
 
     def export_card(self, repo, card_name, file_name=None, file_format='CSV'):
         file_name = file_name or card_name
-        self.manager.export_card(repo, card_name, file_name, file_format)
+        self.manager.export_card(repo=repo, file_name=file_name,
+                                 card_name=card_name, file_format=file_format)
 
 
 class FileSerializer(DataHubSerializer):
@@ -406,16 +435,57 @@ class FileSerializer(DataHubSerializer):
     def get_file(self, repo, file_name):
         return self.manager.get_file(repo, file_name)
 
+    def get_file_path(self, repo, file_name):
+        return self.manager.get_file_path(repo, file_name)
+
+    def start_upload(self, repo, file_name, size):
+        upload = self.manager.start_upload(repo, file_name, size)
+        return self._upload_obj(repo, upload)
+
+    def describe_upload(self, repo, upload_id):
+        upload = self.manager.describe_upload(repo, upload_id)
+        return self._upload_obj(repo, upload)
+
+    def append_upload(self, repo, upload_id, offset, data):
+        upload = self.manager.append_upload(repo, upload_id, offset, data)
+        return self._upload_obj(repo, upload)
+
+    def cancel_upload(self, repo, upload_id):
+        return self.manager.cancel_upload(repo, upload_id)
+
+    def _upload_obj(self, repo, upload):
+        upload_obj = dict(upload)
+        if upload['complete']:
+            relative_uri = reverse('api:file', args=(
+                self.repo_base, repo, upload['file_name']))
+        else:
+            relative_uri = reverse('api:file_upload', args=(
+                self.repo_base, repo, upload['upload_id']))
+        upload_obj['href'] = self.base_uri + relative_uri
+        return upload_obj
+
 
 class QuerySerializer(DataHubSerializer):
 
     def execute_query(self, query, current_page=1,
                       rows_per_page=1000, repo=None,
-                      rows_only=False):
+                      rows_only=False, order_by=None, page_token=None):
+        """
+        Executes a query and returns a page of its results.
+
+        Passing order_by (a list of columns uniquely identifying a row) pages
+        with keyset pagination: instead of current_page, the next page is
+        requested with the page_token from next_results_params.
+        """
+        keyset = bool(order_by)
 
         result = None
-        result = self.manager.paginate_query(
-            query, current_page, rows_per_page)
+        if keyset:
+            result = self.manager.keyset_paginate_query(
+                query, rows_per_page, order_by, page_token)
+        else:
+            result = self.manager.paginate_query(
+                query, current_page, rows_per_page)
 
         rows = result.get('rows', None)
 
@@ -439,14 +509,23 @@ class QuerySerializer(DataHubSerializer):
 
         # add appropriate link to previous and next:
         # next
-        if rows_per_page <= len(rows):
+        if keyset:
+            if result.get('next_page_token'):
+                next_params = {
+                    "query": query,
+                    "order_by": result.get('order_by', order_by),
+                    "page_token": result['next_page_token'],
+                    "rows_per_page": rows_per_page}
+                return_dict['next_results_params'] = next_params
+        elif rows_per_page <= len(rows):
             next_params = {
                 "query": query,
                 "current_page": current_page + 1,
                 "rows_per_page": rows_per_page}
             return_dict['next_results_params'] = next_params
 
-        if current_page > 1:
+        # keyset pages can only be walked forwards
+        if not keyset and current_page > 1:
             previous_params = {
                 "query": query,
                 "current_page": current_page - 1,
@@ -463,6 +542,38 @@ class QuerySerializer(DataHubSerializer):
         # By default, return the query result plus metadata.
         return return_dict
 
+    def stream_query(self, query, rows_per_page=None, current_page=1):
+        """
+        Executes a query and returns its column names and an iterator over
+        its rows, which are read from a server-side cursor as the iterator
+        is consumed.
+
+        Every row is returned unless rows_per_page is given, in which case
+        only the current_page is.
+        """
+        if rows_per_page:
+            res = self.manager.limit_and_offset_select_query(
+                query=query, limit=rows_per_page,
+                offset=(current_page - 1) * rows_per_page)
+            query = res['query']
+
+        res = self.manager.execute_sql(query, stream=True)
+        columns = _unique_keys([field['name'] for field in res['fields']])
+        return columns, res['tuples']
+
+    def execute_batch(self, statements):
+        """
+        Executes (query, params) pairs in a single transaction, and returns
+        the row count and rows of each.
+        """
+        results = []
+        for res in self.manager.execute_batch(statements):
+            columns = _unique_keys([field['name'] for field in res['fields']])
+            results.append({
+                'row_count': res['row_count'],
+                'rows': [dict(zip(columns, row)) for row in res['tuples']]})
+        return results
+
 
 class RowLevelSecuritySerializer(object):
 
@@ -517,6 +628,64 @@ class RowLevelSecuritySerializer(object):
         return res
 
 
+class JobSerializer(DataHubSerializer):
+
+    def submit_job(self, repo, kind, **params):
+        job = jobs.submit_job(
+            self.username, self.repo_base, repo, kind, **params)
+        return self.describe_job(job.id)
+
+    def list_jobs(self):
+        user_jobs = Job.objects.filter(username=self.username).order_by('-id')
+        return {'jobs': [self._job_obj(job) for job in user_jobs]}
+
+    def describe_job(self, job_id):
+        return self._job_obj(self._get_job(job_id))
+
+    def cancel_job(self, job_id):
+        return self._job_obj(jobs.cancel_job(self._get_job(job_id)))
+
+    def get_job_result_path(self, job_id):
+        """
+        Returns the path of the file a job wrote.
+
+        Raises LookupError if the job hasn't written a file.
+        Raises PermissionDenied on insufficient privileges.
+        """
+        job = self._get_job(job_id)
+        if job.status != Job.SUCCEEDED or not job.result:
+            raise LookupError('Job %s has no result to download.' % job.id)
+
+        DataHubManager.has_repo_file_privilege(
+            self.username, job.repo_base, job.repo_name, 'read')
+        return user_data_path(job.repo_base, job.repo_name, job.result)
+
+    def _get_job(self, job_id):
+        # users only see their own jobs
+        return Job.objects.get(id=job_id, username=self.username)
+
+    def _job_obj(self, job):
+        job_obj = {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'repo_base': job.repo_base,
+            'repo_name': job.repo_name,
+            'progress': job.progress,
+            'total': job.total,
+            'result': job.result,
+            'error': job.error,
+            'timestamp': job.timestamp,
+            'started': job.started,
+            'finished': job.finished,
+            'href': self.base_uri + reverse('api:job', args=(job.id,)),
+        }
+        if job.status == Job.SUCCEEDED and job.result:
+            job_obj['result_href'] = self.base_uri + reverse(
+                'api:job_result', args=(job.id,))
+        return job_obj
+
+
 def _unique_keys(proposed):
     """
     Uniques and returns a given list of strings.
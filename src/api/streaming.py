@@ -0,0 +1,75 @@
+import csv
+import io
+import itertools
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+"""
+Encoders for streamed query results.
+
+Each encoder takes a list of column names and an iterable of row tuples, and
+yields the encoded result in chunks of up to CHUNK_ROWS rows, so that a
+StreamingHttpResponse can send rows as they are read from the database.
+"""
+
+# Number of rows encoded into each chunk of a streamed response.
+CHUNK_ROWS = 500
+
+
+def _chunks(lines):
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= CHUNK_ROWS:
+            yield ''.join(buf)
+            buf = []
+    if buf:
+        yield ''.join(buf)
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def _dumps(obj):
+    return json.dumps(obj, cls=JSONEncoder)
+
+
+def stream_csv(columns, rows):
+    """A header line of column names, then one line per row."""
+    def lines():
+        out = io.BytesIO()
+        writer = csv.writer(out)
+        for row in itertools.chain([columns], rows):
+            writer.writerow([_utf8(v) for v in row])
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    return _chunks(lines())
+
+
+def stream_ndjson(columns, rows):
+    """One JSON object per line, per row."""
+    return _chunks(
+        _dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+def stream_json(columns, rows):
+    """A JSON array of row objects, like the rows of a paginated result."""
+    def lines():
+        yield '['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + _dumps(dict(zip(columns, row)))
+        yield ']'
+    return _chunks(lines())
+
+
+# format name: (content type, encoder)
+STREAM_FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+    'json': ('application/json', stream_json),
+}
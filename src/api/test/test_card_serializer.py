@@ -0,0 +1,72 @@
+from mock import Mock, patch
+
+from django.test import TestCase
+
+from ..serializer import CardSerializer, _card_results_cache
+
+
+class CardSerializerTests(TestCase):
+    """Test CardSerializer methods"""
+
+    def setUp(self):
+        self.username = "delete_me_username"
+        self.repo_base = "delete_me_repo_base"
+        self.password = "delete_me_password"
+
+        self.mock_manager = self.create_patch(
+            'api.serializer.DataHubManager')
+        self.manager = self.mock_manager.return_value
+        self.manager.username = self.repo_base
+        self.manager.get_card.return_value = Mock(
+            query='SELECT * FROM repo.table', repo_name='repo',
+            last_refreshed=None, result_size=None)
+        self.manager.get_query_version.return_value = (
+            ('repo', 'table', 16384, 10, 0, 0),)
+        self.manager.paginate_query.return_value = {
+            'column_names': ['id'], 'rows': [(1,), (2,)],
+            'select_query': True}
+
+        _card_results_cache.clear()
+        self.serializer = CardSerializer(
+            username=self.username, repo_base=self.repo_base)
+
+    def create_patch(self, name):
+        # helper method for creating patches
+        patcher = patch(name)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def test_describe_card_records_refresh(self):
+        res = self.serializer.describe_card('repo', 'card')
+
+        self.assertEqual(res['results']['rows'], [{'id': 1}, {'id': 2}])
+        card = self.manager.get_card.return_value
+        self.manager.record_card_refresh.assert_called_once_with(card, 2)
+
+    def test_describe_card_caches_results(self):
+        first = self.serializer.describe_card('repo', 'card')
+        second = self.serializer.describe_card('repo', 'card')
+
+        self.assertEqual(first['results'], second['results'])
+        self.assertEqual(self.manager.paginate_query.call_count, 1)
+        self.assertEqual(self.manager.record_card_refresh.call_count, 1)
+
+        # other pages are cached separately
+        self.serializer.describe_card('repo', 'card', current_page=2)
+        self.assertEqual(self.manager.paginate_query.call_count, 2)
+
+    def test_writes_to_card_tables_invalidate_results(self):
+        self.serializer.describe_card('repo', 'card')
+        self.manager.get_query_version.return_value = (
+            ('repo', 'table', 16384, 11, 0, 0),)
+        self.serializer.describe_card('repo', 'card')
+
+        self.assertEqual(self.manager.paginate_query.call_count, 2)
+
+    def test_untracked_tables_are_not_cached(self):
+        self.manager.get_query_version.return_value = None
+        self.serializer.describe_card('repo', 'card')
+        self.serializer.describe_card('repo', 'card')
+
+        self.assertEqual(self.manager.paginate_query.call_count, 2)
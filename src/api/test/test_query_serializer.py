@@ -31,3 +31,59 @@ class QuerySerializerTests(TestCase):
         query = "select * from foo.bar"
         self.serializer.execute_query(query)
         self.assertTrue(mock_paginate_query.called)
+
+    def test_query_with_order_by_uses_keyset_pagination(self):
+        mock_paginate_query = self.mock_manager.return_value.paginate_query
+        mock_keyset = self.mock_manager.return_value.keyset_paginate_query
+        mock_keyset.return_value = {
+            'column_names': ['id'], 'rows': [(1,)], 'select_query': True,
+            'order_by': ['id'], 'next_page_token': 'token'}
+
+        query = "select * from foo.bar"
+        res = self.serializer.execute_query(
+            query, rows_per_page=1, order_by=['id'])
+
+        self.assertFalse(mock_paginate_query.called)
+        self.assertTrue(mock_keyset.called)
+        self.assertEqual(res['rows'], [{'id': 1}])
+        self.assertEqual(res['next_results_params'], {
+            'query': query, 'order_by': ['id'], 'page_token': 'token',
+            'rows_per_page': 1})
+        self.assertFalse('previous_results_params' in res)
+
+    def test_stream_query(self):
+        mock_execute_sql = self.mock_manager.return_value.execute_sql
+        mock_limit = self.mock_manager.return_value\
+            .limit_and_offset_select_query
+        mock_limit.return_value = {'select_query': True, 'query': 'limited'}
+        rows = iter([(1, 2)])
+        mock_execute_sql.return_value = {
+            'tuples': rows, 'fields': [{'name': 'a'}, {'name': 'a'}]}
+
+        query = "select * from foo.bar"
+        columns, res = self.serializer.stream_query(query)
+        mock_execute_sql.assert_called_with(query, stream=True)
+        self.assertEqual(columns, ['a', 'a_1'])
+        self.assertIs(res, rows)
+        self.assertFalse(mock_limit.called)
+
+        self.serializer.stream_query(query, rows_per_page=10, current_page=3)
+        mock_limit.assert_called_with(query=query, limit=10, offset=20)
+        mock_execute_sql.assert_called_with('limited', stream=True)
+
+    def test_execute_batch(self):
+        mock_execute_batch = self.mock_manager.return_value.execute_batch
+        mock_execute_batch.return_value = [
+            {'row_count': 1, 'tuples': [], 'fields': []},
+            {'row_count': 2, 'tuples': [(1, 'a'), (2, 'b')],
+             'fields': [{'name': 'id'}, {'name': 'name'}]}]
+        statements = [('insert into foo.bar values (%s)', ['1']),
+                      ('select * from foo.bar', None)]
+
+        res = self.serializer.execute_batch(statements)
+
+        mock_execute_batch.assert_called_once_with(statements)
+        self.assertEqual(res, [
+            {'row_count': 1, 'rows': []},
+            {'row_count': 2, 'rows': [{'id': 1, 'name': 'a'},
+                                      {'id': 2, 'name': 'b'}]}])
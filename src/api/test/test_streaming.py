@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+
+from django.test import TestCase
+
+from ..streaming import stream_csv, stream_ndjson, stream_json
+
+
+class StreamingTests(TestCase):
+    """Test the encoders for streamed query results"""
+
+    def setUp(self):
+        self.columns = ['id', 'name', 'day']
+        self.rows = [(1, u'caf\xe9', datetime.date(2016, 1, 2)),
+                     (2, None, None)]
+
+    def test_stream_csv(self):
+        res = ''.join(stream_csv(self.columns, iter(self.rows)))
+        self.assertEqual(
+            res, 'id,name,day\r\n1,caf\xc3\xa9,2016-01-02\r\n2,,\r\n')
+
+    def test_stream_ndjson(self):
+        lines = ''.join(stream_ndjson(self.columns, iter(self.rows)))
+        lines = [json.loads(l) for l in lines.splitlines()]
+        self.assertEqual(lines, [
+            {'id': 1, 'name': u'caf\xe9', 'day': '2016-01-02'},
+            {'id': 2, 'name': None, 'day': None}])
+
+    def test_stream_json(self):
+        res = json.loads(''.join(stream_json(self.columns, iter(self.rows))))
+        self.assertEqual(res, [
+            {'id': 1, 'name': u'caf\xe9', 'day': '2016-01-02'},
+            {'id': 2, 'name': None, 'day': None}])
+        self.assertEqual(''.join(stream_json(self.columns, iter([]))), '[]')
@@ -69,6 +69,24 @@ urlpatterns = [
     url(r'^v1/repos/(?P<repo_base>\w+)/(?P<repo_name>\w+)/files/?$',
         views.Files.as_view(),
         name='files'),
+    url(r'^v1/repos/(?P<repo_base>\w+)/(?P<repo_name>\w+)'
+        r'/uploads/(?P<upload_id>[0-9a-f]+)/?$',
+        views.FileUpload.as_view(),
+        name='file_upload'),
+    url(r'^v1/repos/(?P<repo_base>\w+)/(?P<repo_name>\w+)/uploads/?$',
+        views.FileUploads.as_view(),
+        name='file_uploads'),
+
+    # jobs
+    url(r'^v1/jobs/?$',
+        views.Jobs.as_view(),
+        name='jobs'),
+    url(r'^v1/jobs/(?P<job_id>\d+)/?$',
+        views.Job.as_view(),
+        name='job'),
+    url(r'^v1/jobs/(?P<job_id>\d+)/result/?$',
+        views.JobResult.as_view(),
+        name='job_result'),
 
     # query
     url(r'^v1/query/(?P<repo_base>\w+)/(?P<repo_name>\w+)/?$',
@@ -77,6 +95,9 @@ urlpatterns = [
     url(r'^v1/query/(?P<repo_base>\w+)/?$',
         views.Query.as_view(),
         name='query'),
+    url(r'^v1/query_batch/(?P<repo_base>\w+)/?$',
+        views.QueryBatch.as_view(),
+        name='query_batch'),
 
     # row level security
     url(r'^v1/rls/id/(?P<policy_id>\w+)//?$',
@@ -1,7 +1,9 @@
 import ast
 import json
+import re
+import six
 
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
 
@@ -23,10 +25,12 @@ from django.core.exceptions import ValidationError, \
     ObjectDoesNotExist
 
 from config import settings
+from core.file_response import file_response
+from .streaming import STREAM_FORMATS
 from .serializer import (
     UserSerializer, RepoSerializer, CollaboratorSerializer,
     TableSerializer, ViewSerializer, FileSerializer, QuerySerializer,
-    CardSerializer, RowLevelSecuritySerializer)
+    CardSerializer, RowLevelSecuritySerializer, JobSerializer)
 
 
 class CurrentUser(APIView):
@@ -307,6 +311,9 @@ class Tables(APIView):
         table creation
         e.g. { "table_name": "mytablename",
            "params": [{"column_name":"foo", "data_type":"integer" }]}
+
+        Tables created from_file are imported by a background job. The
+        response is then the job, whose href reports the import's progress.
         ---
         omit_serializer: true
 
@@ -344,9 +351,13 @@ class Tables(APIView):
                 has_header = True
 
             quote_character = str(request.data['quote_character'])
-            serializer.create_table_from_file(
-                repo_name, table_name, file_name,
-                delimiter, quote_character, has_header)
+            job_serializer = JobSerializer(
+                username, repo_base, request, manager=serializer.manager)
+            job = job_serializer.submit_job(
+                repo_name, 'import_file', table=table_name,
+                file_name=file_name, delimiter=delimiter,
+                header=has_header, quote_character=quote_character)
+            return Response(job, status=status.HTTP_202_ACCEPTED)
         else:
             # Default to creating an empty table from scratch.
             # hack because swagger UI doesn't deal with arrays objects well
@@ -409,6 +420,10 @@ class Files(APIView):
 
         e.g. $ curl --form file=@FILENAME.CSV
         datahub-local.mit.edu/api/v1/repos/REPO_BASE/REPO_NAME/files
+
+        Files exported from_table, from_view or from_card are written by a
+        background job. The response is then the job, whose href reports the
+        export's progress, and whose result_href downloads the file.
         ---
         omit_serializer: true
 
@@ -419,7 +434,8 @@ class Files(APIView):
           - name: file_format
             in: body
             type: string
-            description: format of the file to be created e.g. CSV
+            description: format of the file to be created, CSV, TEXT,
+                         ARROW (Arrow IPC/Feather) or PARQUET
           - name: file
             type: file
             paramType: formData,
@@ -463,33 +479,21 @@ class Files(APIView):
             files = serializer.list_files(repo_name)
             return Response(files, status=status.HTTP_201_CREATED)
 
-        elif table:
-            serializer = TableSerializer(username, repo_base, request)
-            serializer.export_table(repo_name, table, file_name, file_format,
-                                    delimiter, header)
-
-            filename = file_name + "." + file_format
-            serializer = FileSerializer(username, repo_base, request)
-            file = serializer.get_file(repo_name, filename)
-            return Response(file, status=status.HTTP_201_CREATED)
-
-        elif view:
-            serializer = ViewSerializer(username, repo_base, request)
-            serializer.export_view(repo_name, view, file_name, file_format,
-                                   delimiter, header)
-            filename = file_name + "." + file_format
-            serializer = FileSerializer(username, repo_base, request)
-            file = serializer.get_file(repo_name, filename)
-            return Response(file, status=status.HTTP_201_CREATED)
-
-        elif card:
-            serializer = CardSerializer(username, repo_base, request)
-            serializer.export_card(repo_name, card, file_name, file_format)
-
-            filename = file_name + "." + file_format
-            serializer = FileSerializer(username, repo_base, request)
-            file = serializer.get_file(repo_name, filename)
-            return Response(file, status=status.HTTP_201_CREATED)
+        elif table or view or card:
+            if table:
+                kind, params = 'export_table', {
+                    'table': table, 'delimiter': delimiter, 'header': header}
+            elif view:
+                kind, params = 'export_view', {
+                    'view': view, 'delimiter': delimiter, 'header': header}
+            else:
+                kind, params = 'export_card', {'card_name': card}
+
+            serializer = JobSerializer(username, repo_base, request)
+            job = serializer.submit_job(
+                repo_name, kind, file_name=file_name,
+                file_format=file_format, **params)
+            return Response(job, status=status.HTTP_202_ACCEPTED)
 
         else:
             raise(KeyError)
@@ -504,12 +508,15 @@ class File(APIView):
     def get(self, request, repo_base, repo_name, file_name, format=None):
         """
         See/Download a file
+
+        Supports Range requests, to resume interrupted downloads, and
+        conditional requests with If-None-Match or If-Modified-Since.
         """
         username = request.user.get_username()
         serializer = FileSerializer(
             username=username, repo_base=repo_base)
-        files = serializer.get_file(repo_name, file_name)
-        return Response(files, status=status.HTTP_200_OK)
+        file_path = serializer.get_file_path(repo_name, file_name)
+        return file_response(request, file_path, file_name)
 
     def delete(self, request, repo_base, repo_name, file_name, format=None):
         """
@@ -522,6 +529,83 @@ class File(APIView):
         return Response(None, status=status.HTTP_204_NO_CONTENT)
 
 
+class FileUploads(APIView):
+
+    def post(self, request, repo_base, repo_name, format=None):
+        """
+        Start a resumable upload of a file
+
+        The file is then sent in one or more PUTs of raw bytes to the
+        upload's href, each with a Content-Range header, e.g.
+        Content-Range: bytes 0-1048575/4194304. If a PUT is interrupted,
+        GET the upload's href to find the offset to resume from. The file
+        appears in the repo once all of it has arrived.
+        ---
+        omit_serializer: true
+
+        parameters:
+          - name: file_name
+            in: body
+            type: string
+            required: true
+          - name: size
+            in: body
+            type: integer
+            description: size of the file in bytes
+            required: true
+        """
+        username = request.user.get_username()
+        serializer = FileSerializer(username, repo_base, request)
+        upload = serializer.start_upload(
+            repo_name, request.data['file_name'], request.data['size'])
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+
+class FileUpload(APIView):
+
+    def get(self, request, repo_base, repo_name, upload_id, format=None):
+        """
+        The offset that a resumable upload continues from
+        """
+        username = request.user.get_username()
+        serializer = FileSerializer(username, repo_base, request)
+        upload = serializer.describe_upload(repo_name, upload_id)
+        return Response(upload, status=status.HTTP_200_OK)
+
+    def put(self, request, repo_base, repo_name, upload_id, format=None):
+        """
+        Send the next chunk of a resumable upload
+
+        The request body is the raw bytes of the chunk, and the
+        Content-Range header gives their offset in the file, e.g.
+        Content-Range: bytes 1048576-2097151/4194304
+        """
+        match = re.match(r'^bytes (\d+)-\d+/(\d+|\*)$',
+                         request.META.get('HTTP_CONTENT_RANGE', ''))
+        if not match:
+            raise ValueError('A Content-Range header is required, e.g. '
+                             'Content-Range: bytes 0-1023/4096')
+
+        username = request.user.get_username()
+        serializer = FileSerializer(username, repo_base, request)
+        # an empty body has no stream
+        data = request.stream or six.BytesIO()
+        upload = serializer.append_upload(
+            repo_name, upload_id, int(match.group(1)), data)
+        if upload['complete']:
+            return Response(upload, status=status.HTTP_201_CREATED)
+        return Response(upload, status=status.HTTP_200_OK)
+
+    def delete(self, request, repo_base, repo_name, upload_id, format=None):
+        """
+        Cancel a resumable upload
+        """
+        username = request.user.get_username()
+        serializer = FileSerializer(username, repo_base, request)
+        serializer.cancel_upload(repo_name, upload_id)
+        return Response(None, status=status.HTTP_204_NO_CONTENT)
+
+
 class Views(APIView):
 
     def get(self, request, repo_base, repo_name, format=None):
@@ -749,6 +833,25 @@ class Query(APIView):
             in: body
             type: integer
             description: page being viewed
+          - name: order_by
+            in: body
+            type: string
+            description: >
+                comma separated columns uniquely identifying a row. Enables
+                keyset pagination, which is much faster for deep pages.
+          - name: page_token
+            in: body
+            type: string
+            description: >
+                next page token from next_results_params, when paging with
+                order_by
+          - name: stream
+            in: body
+            type: string
+            description: >
+                csv, ndjson or json. Streams the rows in that format as they
+                are read, instead of returning a page with metadata. Every
+                row is returned unless rows_per_page is given.
 
         # responseMessages:
         #     - code: 401
@@ -771,15 +874,114 @@ class Query(APIView):
         data = request.data
         query = data['query']
         current_page = int(data.get('current_page', 1))
+
+        stream_format = data.get('stream', None)
+        if stream_format:
+            return self._stream(
+                username, repo_base, request, query, stream_format,
+                current_page, data.get('rows_per_page', None))
+
         rows_per_page = int(data.get('rows_per_page', 1000))
+        order_by = data.get('order_by', None)
+        if isinstance(order_by, six.string_types):
+            order_by = [c.strip() for c in order_by.split(',') if c.strip()]
+        page_token = data.get('page_token', None)
         serializer = QuerySerializer(username, repo_base, request)
 
         result = serializer.execute_query(
             query=query, repo=repo_name, current_page=current_page,
             rows_per_page=rows_per_page,
-            rows_only=(request.accepted_media_type == 'text/csv'))
+            rows_only=(request.accepted_media_type == 'text/csv'),
+            order_by=order_by, page_token=page_token)
         return Response(result, status=status.HTTP_200_OK)
 
+    def _stream(self, username, repo_base, request, query, stream_format,
+                current_page, rows_per_page):
+        if stream_format not in STREAM_FORMATS:
+            raise ValueError(
+                'stream must be one of: %s' % ', '.join(
+                    sorted(STREAM_FORMATS)))
+        content_type, encode = STREAM_FORMATS[stream_format]
+        if rows_per_page is not None:
+            rows_per_page = int(rows_per_page)
+
+        serializer = QuerySerializer(username, repo_base, request)
+        columns, rows = serializer.stream_query(
+            query=query, rows_per_page=rows_per_page,
+            current_page=current_page)
+
+        return StreamingHttpResponse(
+            encode(columns, rows), content_type=content_type,
+            status=status.HTTP_200_OK)
+
+
+class QueryBatch(APIView):
+    """
+    run batches of queries
+    """
+
+    def post(self, request, repo_base, format=None):
+        """
+        Runs several parameterized statements, or one statement with several
+        sets of params, in a single transaction. If any of them fails, none
+        of them are committed. At most QUERY_BATCH_MAX_STATEMENTS statements
+        can be run at once.
+        ---
+        omit_serializer: true
+
+        parameters:
+          - name: statements
+            in: body
+            type: array
+            description: >
+                list of {"query": ..., "params": [...]} objects, run in order
+          - name: query
+            in: body
+            type: string
+            description: query to run once for each of params_list
+          - name: params_list
+            in: body
+            type: array
+            description: list of param lists for query
+
+        consumes:
+            - application/json
+        produces:
+            - application/json
+
+        """
+        username = request.user.get_username()
+        data = request.data
+
+        if 'statements' in data:
+            if not isinstance(data['statements'], list):
+                raise ValueError('statements must be a list.')
+            if not all(isinstance(s, dict) and
+                       isinstance(s.get('query'), six.string_types)
+                       for s in data['statements']):
+                raise ValueError('Every statement must be an object with a '
+                                 'query.')
+            statements = [(s['query'], s.get('params', None))
+                          for s in data['statements']]
+        elif 'query' in data and 'params_list' in data:
+            if (not isinstance(data['query'], six.string_types) or
+                    not isinstance(data['params_list'], list)):
+                raise ValueError('query must be a string, and params_list '
+                                 'a list.')
+            statements = [(data['query'], params)
+                          for params in data['params_list']]
+        else:
+            raise ValueError('Either statements, or query and params_list, '
+                             'are required.')
+
+        if len(statements) > settings.QUERY_BATCH_MAX_STATEMENTS:
+            raise ValueError('At most %d statements can be run at once.' %
+                             settings.QUERY_BATCH_MAX_STATEMENTS)
+
+        serializer = QuerySerializer(username, repo_base, request)
+        results = serializer.execute_batch(statements)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
 
 class RowLevelSecurity(APIView):
     """
@@ -922,6 +1124,56 @@ class RowLevelSecurityById(APIView):
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
 
+class Jobs(APIView):
+
+    def get(self, request, format=None):
+        """
+        The current user's exports and imports, newest first
+        """
+        username = request.user.get_username()
+        serializer = JobSerializer(username, username, request)
+        return Response(serializer.list_jobs(), status=status.HTTP_200_OK)
+
+
+class Job(APIView):
+
+    def get(self, request, job_id, format=None):
+        """
+        The status and progress of an export or import
+
+        progress counts the bytes written (exports) or read (imports) so far.
+        total, when known, is the number of bytes to read.
+        """
+        username = request.user.get_username()
+        serializer = JobSerializer(username, username, request)
+        job = serializer.describe_job(job_id)
+        return Response(job, status=status.HTTP_200_OK)
+
+    def delete(self, request, job_id, format=None):
+        """
+        Cancel an export or import
+
+        Queued jobs are cancelled right away. Running jobs stop within a few
+        seconds, and their status changes to cancelled once they have.
+        """
+        username = request.user.get_username()
+        serializer = JobSerializer(username, username, request)
+        job = serializer.cancel_job(job_id)
+        return Response(job, status=status.HTTP_202_ACCEPTED)
+
+
+class JobResult(APIView):
+
+    def get(self, request, job_id, format=None):
+        """
+        Download the file written by a finished export
+        """
+        username = request.user.get_username()
+        serializer = JobSerializer(username, username, request)
+        file_path = serializer.get_job_result_path(job_id)
+        return file_response(request, file_path)
+
+
 def custom_exception_handler(exc, context):
     result = {}
 
@@ -963,4 +1215,8 @@ def custom_exception_handler(exc, context):
         result['pgcode'] = exc.pgcode
         result['severity'] = exc.diag.severity
 
+    # and for the failed statement of a batch
+    if hasattr(exc, 'statement_index'):
+        result['statement_index'] = exc.statement_index
+
     return Response(result, status=status_code)
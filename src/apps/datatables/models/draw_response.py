@@ -9,6 +9,7 @@ class DrawResponse:
         self.data = []
         self.query = ""
         self.error = None
+        self.estimated = False
     def to_json(self):
         response = {}
         response["draw"] = self.draw
@@ -16,6 +17,7 @@ class DrawResponse:
         response["recordsFiltered"] = self.records_filtered
         response["data"] = self.data
         response["query"] = self.query
+        response["recordsEstimated"] = self.estimated
         if self.error is not None:
             response.error["error"] = self.error
         return json.dumps(response, default=strange_data_handler)
@@ -0,0 +1,73 @@
+from mock import Mock
+
+from django.test import TestCase
+
+from datatables.models.draw_request_column_filter import \
+    DrawRequestColumnFilter
+from datatables.util.run_draw_request import RunDrawRequest, \
+                                             compile_filters, \
+                                             escape_like, \
+                                             _where_clauses
+
+
+class CompileFilters(TestCase):
+    """Tests compiling filters' shapes into where clauses."""
+
+    def test_compile_filters(self):
+        shape = [(('name', 'text', '='), ('age', 'integer', '>=')),
+                 (('age', 'integer', 'btw'),)]
+
+        self.assertEqual(
+            compile_filters(shape, False),
+            'where ((name ILIKE %s) AND (age >= %s)) OR '
+            '((age BETWEEN %s AND %s))')
+        self.assertEqual(
+            compile_filters([(('name', 'text', '!='),)], True),
+            'where NOT (((name NOT ILIKE %s)))')
+
+    def test_escape_like(self):
+        self.assertEqual(escape_like('100%'), '100\\%')
+        self.assertEqual(escape_like('a_b'), 'a\\_b')
+        self.assertEqual(escape_like('C:\\'), 'C:\\\\')
+        self.assertEqual(escape_like("it's"), "it's")
+
+
+class WhereClause(TestCase):
+    """Tests turning a draw request's filters into a where clause."""
+
+    def setUp(self):
+        _where_clauses.clear()
+        self.manager = Mock()
+        self.manager.get_schema.return_value = [
+            ('name', 'text'), ('age', 'integer')]
+
+    def where_clause(self, *filters):
+        draw_request = Mock(filters=[[DrawRequestColumnFilter(*f)
+                                      for f in filters]],
+                            filterInverted=False)
+        return RunDrawRequest(
+            'repo', 'table', draw_request, Mock(), self.manager
+        ).where_clause()
+
+    def test_values_are_parameters(self):
+        clause, params = self.where_clause(
+            ('name', "o'_%", '='), ('age', '30', '<'))
+
+        self.assertEqual(
+            clause, 'where ((name ILIKE %s) AND (age < %s))')
+        # the text is matched literally, and the quote is left to the driver
+        self.assertEqual(params, ["%o'\\_\\%%", '30'])
+
+    def test_unknown_columns_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.where_clause(('name; DROP TABLE table', 'x', '='))
+
+    def test_unknown_operations_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.where_clause(('age', '1', '= 1 OR 1 ='))
+
+    def test_malformed_ranges_match_everything(self):
+        self.assertEqual(self.where_clause(('age', '1', 'btw')), ('', []))
+        self.assertEqual(
+            self.where_clause(('age', '1;5', 'btw')),
+            ('where ((age BETWEEN %s AND %s))', ['1', '5']))
@@ -1,4 +1,30 @@
-from core.db.manager import DataHubManager 
+import logging
+
+from config import settings
+from core.db.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Operators that filters compare columns with. On text columns, = and != are
+# case insensitive substring matches.
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+TEXT_OPERATORS = {"=": "ILIKE", "!=": "NOT ILIKE"}
+
+# Each table's total row count, keyed on (repo_base, username, repo, table).
+# Entries hold the version of the table they were counted at, so that writes
+# to the table invalidate them.
+_total_counts = LRUCache(max_size=settings.DATATABLES_COUNT_CACHE_SIZE,
+                         ttl=settings.DATATABLES_COUNT_CACHE_TTL)
+
+# Where clauses, keyed on the shape of the filters they were compiled from:
+# the table, each filter's column, type and operator, and whether they're
+# inverted. Filter values are bound as parameters, so draws with filters of
+# the same shape run the same statement.
+_where_clauses = LRUCache(max_size=settings.DATATABLES_CLAUSE_CACHE_SIZE)
+
+# Columns that trigram indexes have been created on, or failed to be, keyed
+# on (repo_base, repo, table, column).
+_trigram_indexes = LRUCache(max_size=settings.DATATABLES_CLAUSE_CACHE_SIZE)
 
 
 class RunDrawRequest:
@@ -8,96 +34,231 @@ class RunDrawRequest:
         self.draw_request = draw_request
         self.draw_response = draw_response
         self.manager = manager
+        self.type_for_col = None
 
     def run(self):
         select_clause = self.select_clause()
         from_clause = self.from_clause()
-        where_clause = self.where_clause()
+        where_clause, params = self.where_clause()
         order_by_clause = self.order_by_clause()
         limit_offset_clause = self.limit_offset_clause()
-        sql = "%s %s %s %s %s;" % (select_clause, from_clause, where_clause, order_by_clause, limit_offset_clause) 
         self.draw_response.query = "%s %s %s %s;" % (select_clause, from_clause, where_clause, order_by_clause)
-        data = self.manager.execute_sql(sql)
-        data = data['tuples']
-        self.draw_response.records_total = self.num_tuples(False)
-        if len(self.where_clause()) == 0:
-            self.draw_response.records_filtered = self.draw_response.records_total
+        if params:
+            self.draw_response.query %= tuple(quote_literal(p) for p in params)
+        else:
+            params = None
+        self.create_trigram_indexes()
+
+        if self.use_estimates():
+            self.draw_response.estimated = True
+            self.draw_response.records_total = self.estimate_tuples("", None)
+            self.draw_response.records_filtered = self.estimate_tuples(
+                where_clause, params)
+            sql = "%s %s %s %s %s;" % (
+                select_clause, from_clause, where_clause, order_by_clause,
+                limit_offset_clause)
+            self.draw_response.data = self.manager.execute_sql(
+                sql, params)['tuples']
+            return self.draw_response
+
+        # The page, with the number of rows that match the filters counted
+        # by a window function, and the table's total row count, unless
+        # there are no filters or it's cached, all in one query.
+        key = (self.manager.repo_base, self.manager.username, self.repo,
+               self.table)
+        version = None
+        total = None
+        if len(where_clause) > 0:
+            version = self.manager.get_query_version(
+                "SELECT * %s" % (from_clause,))
+            cached = _total_counts.get(key)
+            if (version is not None and cached is not None and
+                    cached[0] == version):
+                total = cached[1]
+        count_clause = ", count(*) OVER ()"
+        if len(where_clause) > 0 and total is None:
+            count_clause += ", (SELECT count(*) %s)" % (from_clause,)
+        sql = "%s%s %s %s %s %s;" % (
+            select_clause, count_clause, from_clause, where_clause,
+            order_by_clause, limit_offset_clause)
+        tuples = self.manager.execute_sql(sql, params)['tuples']
+        ncolumns = len(self.draw_request.columns)
+
+        if len(tuples) > 0:
+            filtered = int(tuples[0][ncolumns])
+            if len(where_clause) == 0:
+                total = filtered
+            elif total is None:
+                total = int(tuples[0][ncolumns + 1])
         else:
-            self.draw_response.records_filtered = self.num_tuples(True)
-        self.draw_response.data = data
+            # past the last page, so there's nothing to count over
+            filtered = self.num_tuples(where_clause, params)
+            if len(where_clause) == 0:
+                total = filtered
+            elif total is None:
+                total = self.num_tuples("", None)
+        if version is not None:
+            _total_counts.set(key, (version, total))
+
+        self.draw_response.records_total = total
+        self.draw_response.records_filtered = filtered
+        self.draw_response.data = [row[:ncolumns] for row in tuples]
         return self.draw_response
 
+    def use_estimates(self):
+        # Whether the table is large enough that counting its rows, on every
+        # draw, costs more than approximate counts are worth.
+        limit = settings.DATATABLES_ESTIMATE_ROWS
+        return limit is not None and self.estimate_tuples("", None) > limit
+
+    def estimate_tuples(self, where_clause, params):
+        # The planner's estimate of the number of rows, without reading them.
+        query = "SELECT * %s %s" % (self.from_clause(), where_clause)
+        return self.manager.explain_query(query, params)['num_rows']
+
+    def column_types(self):
+        # Figure out the types of the columns so we'll know whether to use
+        # numeric operations or string operations. Looked up once per draw.
+        if self.type_for_col is None:
+            schema = self.manager.get_schema(self.repo, self.table)
+            self.type_for_col = {}
+            for column in schema:
+                self.type_for_col[column[0]] = column[1]
+        return self.type_for_col
+
+    def column(self, name):
+        # Column names are written into the SQL, so only the table's own are
+        # allowed.
+        if name not in self.column_types():
+            raise ValueError("Invalid column: %s" % (name,))
+        return name
+
     def select_clause(self):
-        return "SELECT " + ", ".join([col.name for col in self.draw_request.columns])
+        return "SELECT " + ", ".join(
+            [self.column(col.name) for col in self.draw_request.columns])
 
     def where_clause(self):
-        # Figure out the types of the columns so we'll know whether to use
-        # numeric operations or string operations.
-        schema = self.manager.get_schema(self.repo, self.table)
-        type_for_col = {}
-        for column in schema:
-            type_for_col[column[0]] = column[1]
-
-        if len(self.draw_request.filters) > 0: 
-            inverted = self.draw_request.filterInverted
-            list_filters = []
-            for table_filter in self.draw_request.filters: # Iterate through each filter.
-                list_filter = []
-                for col_filter in table_filter: # Iterate through each column filter.
-                    op = col_filter.operation
-                    text = col_filter.text
-                    if "btw" in op:
-                        range_vals = text.split(";")
-                        if len(range_vals) != 2:
-                            return ""
-                        first, second = range_vals[0], range_vals[1]
-                        if type_for_col[col_filter.name] == "text":
-                            first = "'" + first + "'"
-                            second = "'" + second + "'"
-                        col_filter_string = "(%s BETWEEN %s AND %s)" % (col_filter.name, first, second)
-                    if type_for_col[col_filter.name] == "text": # Change the op and text for string comparison.
-                        if op == "=":
-                            text = "'%" + text + "%'"
-                            op = "ILIKE"
-                        elif op == "!=":
-                            text = "'%" + text + "%'"
-                            op = "NOT ILIKE"
-                        elif "btw" not in op:
-                            text = "'" + text + "'"
-                    if "btw" not in op:
-                        col_filter_string = "(%s %s %s)" % (col_filter.name, op, text)
-                    list_filter.append(col_filter_string)
-                table_filter_string = " AND ".join(list_filter)
-                table_filter_string = "(%s)" % (table_filter_string,)
-                list_filters.append(table_filter_string)
-
-            clause = " OR ".join(list_filters)
-            if inverted:
-                clause = "NOT (%s)" % (clause,)
-            return "where " + clause
-        return ""
-
-    def num_tuples(self, with_where_clause):
-        where_clause = ""
-        if with_where_clause:
-            where_clause = self.where_clause()
-        data = self.manager.execute_sql("SELECT COUNT(*) %s %s" % (self.from_clause(), where_clause))
+        # Returns the where clause, with a %s placeholder for each of the
+        # filters' values, and the values. Malformed ranges match everything.
+        if len(self.draw_request.filters) == 0:
+            return "", []
+
+        type_for_col = self.column_types()
+        inverted = getattr(self.draw_request, "filterInverted", False)
+        params = []
+        shape = []
+        # Iterate through each filter, and each of its column filters.
+        for table_filter in self.draw_request.filters:
+            filter_shape = []
+            for col_filter in table_filter:
+                name = self.column(col_filter.name)
+                op = col_filter.operation
+                text = col_filter.text
+                if "btw" in op:
+                    range_vals = text.split(";")
+                    if len(range_vals) != 2:
+                        return "", []
+                    op = "btw"
+                    params.extend(range_vals)
+                elif op not in OPERATORS:
+                    raise ValueError("Invalid filter operation: %s" % (op,))
+                elif type_for_col[name] == "text" and op in TEXT_OPERATORS:
+                    params.append("%" + escape_like(text) + "%")
+                else:
+                    params.append(text)
+                filter_shape.append((name, type_for_col[name], op))
+            shape.append(tuple(filter_shape))
+
+        key = (self.repo, self.table, tuple(shape), inverted)
+        clause = _where_clauses.get(key)
+        if clause is None:
+            clause = compile_filters(shape, inverted)
+            _where_clauses.set(key, clause)
+        return clause, params
+
+    def create_trigram_indexes(self):
+        # Indexes the text columns that substring filters are used on, if
+        # that's enabled. Each is only tried once per process.
+        if not settings.DATATABLES_TRIGRAM_INDEXES:
+            return
+        type_for_col = self.column_types()
+        for table_filter in self.draw_request.filters:
+            for col_filter in table_filter:
+                name = col_filter.name
+                if (type_for_col.get(name) != "text" or
+                        col_filter.operation not in TEXT_OPERATORS):
+                    continue
+                key = (self.manager.repo_base, self.repo, self.table, name)
+                if key in _trigram_indexes:
+                    continue
+                _trigram_indexes.set(key, True)
+                try:
+                    self.manager.create_trigram_index(
+                        self.repo, self.table, name)
+                except Exception:
+                    logger.exception("Couldn't index %s.%s.%s",
+                                     self.repo, self.table, name)
+
+    def num_tuples(self, where_clause, params):
+        data = self.manager.execute_sql(
+            "SELECT COUNT(*) %s %s" % (self.from_clause(), where_clause),
+            params)
         return int(data['tuples'][0][0])
 
     def from_clause(self):
         return "from %s.%s" % (self.repo, self.table)
 
     def limit_offset_clause(self):
-        return "LIMIT %s OFFSET %s" % (self.draw_request.length, self.draw_request.start)
+        return "LIMIT %d OFFSET %d" % (
+            self.draw_request.length, self.draw_request.start)
 
     def order_by_clause(self):
         sql = "ORDER BY "
         order_strings = []
         for order in self.draw_request.order:
-            column = self.draw_request.columns[order.column].name
-            order_strings.append("%s %s" % (column, order.direction))
+            column = self.column(self.draw_request.columns[order.column].name)
+            direction = order.direction.upper()
+            if direction not in ("ASC", "DESC"):
+                raise ValueError(
+                    "Invalid order direction: %s" % (order.direction,))
+            order_strings.append("%s %s" % (column, direction))
         if len(order_strings) > 0:
             sql = sql + ", ".join(order_strings)
         else:
             return "ORDER BY %s" % (self.draw_request.columns[0].name,)
         return sql
+
+
+def compile_filters(shape, inverted):
+    '''
+    Compiles filters' shapes, lists of (column, type, operation) tuples, into
+    a where clause that ORs the filters and ANDs each filter's comparisons,
+    with %s placeholders for their values.
+    '''
+    list_filters = []
+    for filter_shape in shape:
+        list_filter = []
+        for name, column_type, op in filter_shape:
+            if op == "btw":
+                col_filter_string = "(%s BETWEEN %%s AND %%s)" % (name,)
+            elif column_type == "text" and op in TEXT_OPERATORS:
+                col_filter_string = "(%s %s %%s)" % (name, TEXT_OPERATORS[op])
+            else:
+                col_filter_string = "(%s %s %%s)" % (name, op)
+            list_filter.append(col_filter_string)
+        list_filters.append("(%s)" % (" AND ".join(list_filter),))
+
+    clause = " OR ".join(list_filters)
+    if inverted:
+        clause = "NOT (%s)" % (clause,)
+    return "where " + clause
+
+
+def escape_like(text):
+    # So that the text matches itself in a LIKE pattern.
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def quote_literal(value):
+    # For showing the query, not running it.
+    return "'%s'" % (value.replace("'", "''"),)
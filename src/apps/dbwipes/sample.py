@@ -0,0 +1,138 @@
+import math
+import random
+
+from scorpionsql.sql import SelectExpr
+
+from util import parse_agg
+
+'''
+Sampled, approximate execution of dbwipes queries.
+
+Samples are drawn with a random() < fraction predicate, i.e. Bernoulli
+sampling of rows, sized from the planner's row estimate in pg_class rather
+than a count(*) of the table. Postgres 9.4 has no TABLESAMPLE, and the row
+level security rewriter replaces tables with subqueries, which TABLESAMPLE
+can't be applied to.
+'''
+
+# api_tuples draws this many times the requested number of rows before the
+# reservoir trims the sample, so that the variance of Bernoulli sampling
+# rarely leaves it short.
+OVERSAMPLE = 2.0
+
+# api_tuples never returns more rows than this, whatever was asked for.
+MAX_SAMPLE_ROWS = 10000
+
+
+def estimate_row_count(manager, repo, table):
+    """
+    Returns the planner's estimate of the number of rows in repo.table, or
+    None if the table hasn't been analyzed yet.
+    """
+    q = ('SELECT c.reltuples FROM pg_class c JOIN pg_namespace n '
+         'ON n.oid = c.relnamespace WHERE n.nspname = %s AND c.relname = %s')
+    rows = manager.execute_sql(q, (repo, table))['tuples']
+    if not rows or rows[0][0] < 1:
+        return None
+    return int(rows[0][0])
+
+
+def sample_fraction(nrows, rows=None, fraction=None):
+    """
+    Returns the fraction of rows to sample, given either the fraction itself
+    or a budget of rows to sample from a table of about nrows rows.
+    """
+    if fraction is not None:
+        fraction = float(fraction)
+        if not 0 < fraction <= 1:
+            raise ValueError('The sample fraction must be in (0, 1].')
+        return fraction
+    if rows is not None and nrows:
+        return min(1.0, float(rows) / nrows)
+    return 1.0
+
+
+def reservoir_sample(rows, k):
+    """Returns a uniform sample of k items from the iterable rows."""
+    sample = []
+    for n, row in enumerate(rows):
+        if n < k:
+            sample.append(row)
+        else:
+            i = random.randint(0, n)
+            if i < k:
+                sample[i] = row
+    return sample
+
+
+def add_sampling(o, params, fraction):
+    """
+    Restricts the aggregate query o to a sample of fraction of its rows.
+
+    Also selects the helper aggregates that scale_results needs to scale
+    counts and sums back up and to estimate their standard errors. Returns
+    the params for the sampled query.
+    """
+    o.where.append('random() < %s')
+    for n, agg in enumerate(o.select.aggregates):
+        fname = parse_agg(agg.expr)['fname'].lower()
+        col = agg.cols[0]
+        if fname in ('count', 'sum', 'avg'):
+            o.select.append(SelectExpr(
+                '_n%d' % n, [col], 'count(%s)' % col, col))
+        if fname == 'sum':
+            o.select.append(SelectExpr(
+                '_ss%d' % n, [col], 'sum((%s)::float8 ^ 2)' % col, col))
+        if fname == 'avg':
+            o.select.append(SelectExpr(
+                '_sd%d' % n, [col], 'stddev_samp(%s)' % col, col))
+    return list(params) + [fraction]
+
+
+def scale_results(o, cols, rows, fraction):
+    """
+    Scales the sampled results of a query prepared by add_sampling.
+
+    Counts and sums are divided by fraction to estimate their values over
+    the whole table. Returns the columns and rows without the helper
+    aggregates, and a list with the standard error of every aggregate in
+    each row, or None where it can't be estimated (min, max, ...).
+    """
+    aggs = [(n, parse_agg(agg.expr)['fname'].lower())
+            for n, agg in enumerate(o.select.aggregates)]
+    names = set('_%s%d' % (prefix, n)
+                for n, fname in aggs for prefix in ('n', 'ss', 'sd'))
+    helpers = dict((c, i) for i, c in enumerate(cols) if c in names)
+    keep = [i for i, c in enumerate(cols) if c not in helpers]
+
+    def helper(row, name):
+        value = row[helpers[name]] if name in helpers else None
+        return float(value) if value is not None else None
+
+    scaled = []
+    stderrs = []
+    for row in rows:
+        row = list(row)
+        stderr = {}
+        for n, fname in aggs:
+            # aggregates follow the group by column in the select list
+            i = n + 1
+            samples = helper(row, '_n%d' % n)
+            err = None
+            if fname in ('count', 'sum') and row[i] is not None:
+                row[i] = float(row[i]) / fraction
+            if fname == 'count' and samples is not None:
+                err = math.sqrt(samples * (1 - fraction)) / fraction
+            elif fname == 'sum':
+                squares = helper(row, '_ss%d' % n)
+                if squares is not None:
+                    err = math.sqrt((1 - fraction) * squares) / fraction
+            elif fname == 'avg':
+                sd = helper(row, '_sd%d' % n)
+                if sd is not None and samples:
+                    err = sd / math.sqrt(samples)
+            stderr[cols[i]] = err
+        scaled.append([row[i] for i in keep])
+        stderrs.append(stderr)
+
+    return [cols[i] for i in keep], scaled, stderrs
@@ -1,12 +1,25 @@
+from collections import defaultdict
 from functools import wraps
+import decimal
 import json
 
 from core.db.manager import DataHubManager
 
 from util import pick
 
+numeric_types = ['int', 'float', 'double', 'numeric', 'num']
+char_types = ['char', 'text', 'str']
+
 dbwipes_repo = 'dbwipes_cache'
-dbwipes_table = 'dbwipes_cache'
+dbwipes_table = 'column_profiles'
+
+# The schema of the column profile store, as reported by get_schema
+dbwipes_schema = [('tablename', 'character varying'),
+                  ('method', 'character varying'),
+                  ('filter', 'character varying'),
+                  ('version', 'character varying'),
+                  ('profile', 'text'),
+                  ('computed_at', 'timestamp without time zone')]
 
 
 def does_cache_exist(repo_base):
@@ -29,19 +42,30 @@ def does_cache_exist(repo_base):
     if table_exists:
         schema = manager.get_schema(dbwipes_repo, dbwipes_table)
 
-    if schema == [('key', 'character varying'), ('val', 'text')]:
+    if schema == dbwipes_schema:
         schema_correct = True
 
+    manager.close_connection()
     return repo_exists and table_exists and schema_correct
 
 
 def create_cache(username):
     """ DBWipes stores some metadata about the table in a schema in the owner's
         database. Note that this is not necessarily the current user's DB
+
+        The primary key doubles as the index that profile lookups and
+        invalidations use.
     """
     try:
-        query = ('create table if not exists %s.dbwipes_cache'
-                 '(key varchar, val text)') % dbwipes_repo
+        query = ('create table if not exists %s.%s ('
+                 'tablename varchar not null, '
+                 'method varchar not null, '
+                 'filter varchar not null, '
+                 'version varchar not null, '
+                 'profile text not null, '
+                 'computed_at timestamp not null default now(), '
+                 'primary key (tablename, method, filter))') % (
+                     dbwipes_repo, dbwipes_table)
         manager = DataHubManager(user=username)
         manager.create_repo(dbwipes_repo)
         manager.execute_sql(query)
@@ -51,33 +75,106 @@ def create_cache(username):
         return False
 
 
+class ColumnProfileStore(object):
+    """
+    Column profiles for one table, stored in the repo base's dbwipes_cache.
+
+    Every profile is tagged with the version of the table it was computed
+    from. The version changes whenever rows are inserted, updated or deleted,
+    or the table is truncated or rewritten, so profiles of an older version
+    are never returned, and are deleted the next time a profile is stored.
+    """
+
+    def __init__(self, repo_base, tablename):
+        self.manager = DataHubManager(user=repo_base)
+        self.tablename = tablename
+        self.version = self.get_table_version()
+        self._purged = False
+
+    def get_table_version(self):
+        """
+        Returns the table's version, or None if postgres doesn't track it,
+        e.g. because tablename is a view.
+        """
+        repo, table = self.tablename.split('.')
+        q = ('select pg_relation_filenode(relid), '
+             'n_tup_ins, n_tup_upd, n_tup_del '
+             'from pg_stat_user_tables '
+             'where schemaname = %s and relname = %s')
+        rows = self.manager.execute_sql(q, (repo, table))['tuples']
+        if not rows:
+            return None
+        return ':'.join(str(v) for v in rows[0])
+
+    def get(self, method, filter_key):
+        """Returns the stored profile, or _missing if there isn't one."""
+        if self.version is None:
+            return _missing
+
+        q = ('select profile from {}.{} where tablename = %s and method = %s '
+             'and filter = %s and version = %s').format(
+                 dbwipes_repo, dbwipes_table)
+        params = (self.tablename, method, filter_key, self.version)
+        rows = self.manager.execute_sql(q, params)['tuples']
+        if not rows:
+            return _missing
+        return json.loads(rows[0][0])
+
+    def put(self, method, filter_key, profile):
+        if self.version is None:
+            return
+
+        if not self._purged:
+            # drop profiles computed from older versions of the table
+            q = ('delete from {}.{} where tablename = %s '
+                 'and version <> %s').format(dbwipes_repo, dbwipes_table)
+            self.manager.execute_sql(q, (self.tablename, self.version))
+            self._purged = True
+
+        q = ('delete from {}.{} where tablename = %s and method = %s '
+             'and filter = %s').format(dbwipes_repo, dbwipes_table)
+        self.manager.execute_sql(q, (self.tablename, method, filter_key))
+
+        q = ('insert into {}.{} (tablename, method, filter, version, profile) '
+             'values (%s, %s, %s, %s, %s)').format(dbwipes_repo, dbwipes_table)
+        value = json.dumps(profile, default=json_handler)
+        params = (self.tablename, method, filter_key, self.version, value)
+        self.manager.execute_sql(q, params)
+
+    def clear(self):
+        q = 'delete from {}.{} where tablename = %s'.format(
+            dbwipes_repo, dbwipes_table)
+        self.manager.execute_sql(q, (self.tablename,))
+
+    def close(self):
+        self.manager.close_connection()
+
+
 def insert_into_cache(f):
-    """Inserts metadata into the cache"""
+    """Loads the result from the column profile store, or computes and
+       stores it. The profile is keyed by table, method and filter, i.e. the
+       where clause, number of buckets and arguments.
+    """
     @wraps(f)
     def _f(self, *args, **kwargs):
-        try:
-            key = str(map(str, (f.__name__, self.repo, self.tablename,
-                                self.where, self.nbuckets, map(str, args))))
-            query = 'select val from {}.dbwipes_cache where key = %s'.format(
-                dbwipes_repo)
-
-            manager = DataHubManager(user=self.repo_base)
-            vals = manager.execute_sql(query, (key,))['tuples']
+        profiles = self.profiles
+        if profiles is None:
+            return f(self, *args, **kwargs)
 
-            if len(vals) > 0:
-                return json.loads(vals[0][0])
+        filter_key = json.dumps([self.where, self.nbuckets, args, kwargs],
+                                default=json_handler, sort_keys=True)
+        try:
+            res = profiles.get(f.__name__, filter_key)
+            if res is not _missing:
+                return res
         except Exception as e:
             print(e)
 
         res = f(self, *args, **kwargs)
-        if key:
-            value = json.dumps(res, default=json_handler)
-            params = (key, value)
-            q = 'insert into ' + dbwipes_repo + '.dbwipes_cache values(%s, %s)'
-
-            manager = DataHubManager(user=self.repo_base)
-            manager.execute_sql(q, params)
-
+        try:
+            profiles.put(f.__name__, filter_key, res)
+        except Exception as e:
+            print(e)
         return res
     return _f
 
@@ -85,6 +182,11 @@ def insert_into_cache(f):
 def json_handler(o):
     if hasattr(o, 'isoformat'):
         return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+
+
+_missing = object()
 
 
 class Summary(object):
@@ -101,39 +203,33 @@ class Summary(object):
         if where:
             self.where = 'WHERE %s' % where
 
-        # make sure cache exists
-        # create_cache(username)
+        self.manager = DataHubManager(user=username, repo_base=repo_base)
+
+        # profiles are only stored if the owner has created the cache
+        self.profiles = None
+        if repo_base and does_cache_exist(repo_base):
+            self.profiles = ColumnProfileStore(repo_base, tablename)
 
         self.nrows = self.get_num_rows()
         self.col_types = self.get_columns_and_types()
 
     def __call__(self):
-        stats = []
-        for col, typ in self.col_types:
-            # print "stats for: %s\t%s" % (col, typ)
-            col_stats = self.get_col_stats(col, typ)
-            if col_stats is None:
-                # print "\tgot None"
-                continue
-            # print "\tgot %d" % (len(col_stats))
-            stats.append((col, typ, col_stats))
-        return stats
+        return self.get_all_col_stats()
 
     def close(self):
-        pass
+        self.manager.close_connection()
+        if self.profiles is not None:
+            self.profiles.close()
 
     def reset_cache(self):
-        q = "delete from cache where key like '%%%%%s%%%%%s%%%%'" % (
-            str(self.engine), self.tablename)
-        manager = DataHubManager(user=self.username, repo_base=self.username)
-        manager.execute_sql(q)
+        if self.profiles is not None:
+            self.profiles.clear()
 
     def query(self, q, *args):
         """
         Summaries using other engines only need to override this method
         """
-        manager = DataHubManager(user=self.username, repo_base=self.repo_base)
-        return manager.execute_sql(q, params=args)['tuples']
+        return self.manager.execute_sql(q, params=args)['tuples']
 
     @insert_into_cache
     def get_num_rows(self):
@@ -155,15 +251,12 @@ class Summary(object):
         counts = tuple(self.query(q)[0])
         return dict(zip(cols, counts))
 
-    @insert_into_cache
     def get_columns_and_types(self):
-        manager = DataHubManager(user=self.username, repo_base=self.repo_base)
-
         tokens = self.tablename.split('.')
         repo = tokens[0]
         table = tokens[1]
 
-        rows = manager.get_schema(repo, table)
+        rows = self.manager.get_schema(repo, table)
         ret = []
         for col, typ in rows:
             if typ == 'text':
@@ -177,16 +270,14 @@ class Summary(object):
             ret.append((str(col), str(typ)))
         return ret
 
-    @insert_into_cache
     def get_columns(self):
         """
         engine specific way to get table columns
         """
-        return pick(self.get_columns_and_types(), 0)
+        return pick(self.col_types, 0)
 
-    @insert_into_cache
     def get_type(self, col_name):
-        return dict(self.get_columns_and_types()).get(col_name, None)
+        return dict(self.col_types).get(col_name, None)
 
     def get_col_groupby(self, col_name, col_type):
         if col_type is None:
@@ -210,11 +301,8 @@ class Summary(object):
         # if col_type.startswith('_'):
         # return None
 
-        numerics = ['int', 'float', 'double', 'numeric', 'num']
-        chars = ['char', 'text', 'str']
-
-        is_numeric = col_type in numerics
-        is_char = col_type in chars
+        is_numeric = col_type in numeric_types
+        is_char = col_type in char_types
 
         if is_numeric:
             return self.get_numeric_stats(col_name)
@@ -227,6 +315,140 @@ class Summary(object):
             return stats
         return None
 
+    @insert_into_cache
+    def get_all_col_stats(self):
+        """
+        Returns (col, type, stats) for every column, in the same form as
+        get_col_stats, but scanning the table at most twice instead of once
+        or twice per column.
+
+        The first scan gets the distinct counts and bucket widths of all
+        numeric columns. The second turns every row into one row per column,
+        holding that column's bucket, and groups on (column, bucket), so
+        that all histograms come out of one aggregation.
+        """
+        numerics = []
+        buckets = []
+        stats = {}
+        for col, typ in self.col_types:
+            if typ in numeric_types:
+                numerics.append(col)
+            elif typ in char_types:
+                buckets.append((col, 'char', col))
+            elif typ == 'time':
+                buckets.append((col, 'time', self.get_time_stats(col)))
+
+        if numerics:
+            select = []
+            for col in numerics:
+                select += ['count(distinct %s)' % col,
+                           'stddev(%s)' % col,
+                           'min(%s)' % col]
+            q = 'SELECT %s FROM %s %s' % (
+                ', '.join(select), self.tablename, self.where)
+            row = self.query(q)[0]
+
+            for n, col in enumerate(numerics):
+                ndistinct, stddev, val = row[3 * n:3 * n + 3]
+                if ndistinct == 0:
+                    stats[col] = []
+                elif ndistinct == 1:
+                    stats[col] = [
+                        {'val': val, 'count': self.nrows, 'range': [val, val]}]
+                else:
+                    block = 2.5 * float(stddev) / self.nbuckets
+                    bucket = '(%s/%r)::int*%r' % (col, block, block)
+                    buckets.append((col, 'num', bucket))
+
+        if buckets:
+            stats.update(self._get_bucket_stats(buckets))
+
+        ret = []
+        for col, typ in self.col_types:
+            if col in stats:
+                col_stats = stats[col]
+            else:
+                col_stats = self.get_col_stats(col, typ)
+            if col_stats is not None:
+                ret.append((col, typ, col_stats))
+        return ret
+
+    def _get_bucket_stats(self, buckets):
+        # buckets is a list of (col, kind, bucket expression). Columns are
+        # identified by their index i in the list, bucket expressions and
+        # values are selected as k<i> and v<i>.
+        ncols = len(buckets)
+        expand = ['generate_series(0, %d) AS i' % (ncols - 1)]
+        keys = []
+        ranges = []
+        time_keys = []
+        for n, (col, kind, bucket) in enumerate(buckets):
+            expand += ['%s AS k%d' % (bucket, n), '%s AS v%d' % (col, n)]
+            key = 'CASE WHEN i = %d THEN k%d END' % (n, n)
+            keys.append(key)
+            ranges += ['min(CASE WHEN i = %d THEN v%d END)' % (n, n),
+                       'max(CASE WHEN i = %d THEN v%d END)' % (n, n)]
+            if kind == 'time':
+                time_keys.append(key)
+
+        # char histograms keep the most frequent values and time histograms
+        # the earliest buckets, as get_char_stats and get_group_stats do
+        limited = []
+        for kind, rank in (('char', 'count_rank'), ('time', 'key_rank')):
+            idxs = [str(n) for n, b in enumerate(buckets) if b[1] == kind]
+            if idxs:
+                limited.append('(i IN (%s) AND %s <= %d)' % (
+                    ', '.join(idxs), rank, self.nbuckets))
+        idxs = [str(n) for n, b in enumerate(buckets) if b[1] == 'num']
+        if idxs:
+            limited.append('i IN (%s)' % ', '.join(idxs))
+
+        # group by i and the keys, which follow the four leading columns
+        groupby = ['1'] + [str(n) for n in range(5, 5 + ncols)]
+
+        q = """
+            SELECT * FROM (
+              SELECT i, count(*) AS count,
+                     row_number() OVER (PARTITION BY i
+                                        ORDER BY count(*) DESC) AS count_rank,
+                     row_number() OVER (PARTITION BY i
+                                        ORDER BY %s) AS key_rank,
+                     %s, %s
+              FROM (SELECT %s FROM %s %s) AS expanded
+              GROUP BY %s
+            ) AS ranked
+            WHERE %s
+            """
+        q = q % (', '.join(time_keys) or 'i', ', '.join(keys),
+                 ', '.join(ranges), ', '.join(expand), self.tablename,
+                 self.where, ', '.join(groupby), ' OR '.join(limited))
+
+        groups = defaultdict(list)
+        for row in self.query(q):
+            n = row[0]
+            key = row[4 + n]
+            minv, maxv = row[4 + ncols + 2 * n:4 + ncols + 2 * n + 2]
+            groups[n].append((key, row[1], minv, maxv))
+
+        stats = {}
+        for n, (col, kind, bucket) in enumerate(buckets):
+            rows = groups[n]
+            if kind == 'char':
+                rows.sort(key=lambda r: r[1], reverse=True)
+            else:
+                # ascending, with nulls last like postgres
+                rows.sort(key=lambda r: (r[0] is None, r[0]))
+
+            col_stats = []
+            for key, count, minv, maxv in rows:
+                val = key
+                if kind == 'num' and key is not None:
+                    val = (maxv + minv) / 2.
+                col_stats.append(
+                    {'val': val, 'count': count, 'range': [minv, maxv]})
+            stats[col] = col_stats
+        return stats
+
     def get_group_stats(self, col_name, groupby):
         q = ('select %s as GRP, min(%s), max(%s), count(*) '
              'from %s  %s group by GRP '
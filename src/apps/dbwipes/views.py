@@ -11,6 +11,9 @@ from django.http import HttpResponse, \
 
 from core.db.manager import DataHubManager
 from summary import Summary, does_cache_exist, create_cache
+from sample import OVERSAMPLE, MAX_SAMPLE_ROWS, estimate_row_count, \
+                   sample_fraction, reservoir_sample, add_sampling, \
+                   scale_results
 from util import SummaryEncoder, where_to_sql, create_sql_obj, pick
 
 
@@ -137,6 +140,14 @@ def schema(request):
 
 @returns_json
 def api_tuples(request):
+    """ Returns a uniform random sample of the table's rows.
+
+        The sample has at most sample_rows rows (50 by default, and never
+        more than MAX_SAMPLE_ROWS). If sample_fraction is given, every row
+        is drawn with that probability instead, before the sample is
+        trimmed to sample_rows. The table is scanned once, without counting
+        it first, unless postgres has no estimate of its size.
+    """
     ret = {}
     jsonstr = request.GET.get('json')
     if not jsonstr:
@@ -157,21 +168,36 @@ def api_tuples(request):
     # print(where)
     # print(params)
 
-    query = ("WITH XXXX as (select count(*) from %s WHERE 1 = 1 %s) "
-             "SELECT * FROM %s "
-             "WHERE random() <= 50.0 / (select * from XXXX) %s "
-             "LIMIT 50")
-    query = query % (full_tablename, where, full_tablename, where)
-    params = params + params
-
     manager = DataHubManager(user=username, repo_base=repo_base)
-    res = manager.execute_sql(query, params=params)
-    rows = res['tuples']
+
+    nrows = estimate_row_count(manager, repo, table)
+    if nrows is None:
+        query = "SELECT count(*) FROM %s WHERE 1 = 1 %s" % (
+            full_tablename, where)
+        nrows = manager.execute_sql(query, params=params)['tuples'][0][0]
+    elif where:
+        # size the sample from the rows that pass the filters
+        query = "SELECT * FROM %s WHERE 1 = 1 %s" % (full_tablename, where)
+        nrows = manager.explain_query(query, params)['num_rows']
+
+    try:
+        k = min(int(args.get('sample_rows') or 50), MAX_SAMPLE_ROWS)
+        fraction = sample_fraction(nrows, rows=OVERSAMPLE * k,
+                                   fraction=args.get('sample_fraction'))
+    except ValueError as e:
+        return {'error': str(e)}
+
+    query = "SELECT * FROM %s WHERE random() < %%s %s" % (
+        full_tablename, where)
+    res = manager.execute_sql(
+        query, params=[fraction] + params, stream=True)
     cols = [field['name'] for field in res['fields']]
+    rows = reservoir_sample(res['tuples'], k)
 
     data = [dict(zip(cols, vals)) for vals in rows]
     ret['data'] = data
     ret['schema'] = get_schema(repo, table, username, repo_base)
+    ret['sample'] = {'fraction': fraction, 'estimated_rows': nrows}
 
     # print("%d points returned" % len(ret.get('data', [])))
     return(ret)
@@ -179,6 +205,13 @@ def api_tuples(request):
 
 @returns_json
 def api_query(request):
+    """ Runs the aggregate query described by the json argument.
+
+        If sample_fraction or sample_rows is given, the query runs over a
+        sample of the table. Counts and sums are scaled up to the whole
+        table, and the standard error of every aggregate is returned in
+        stderr, aligned with data.
+    """
     ret = {}
     jsonstr = request.GET.get('json', None)
     if not jsonstr:
@@ -194,19 +227,38 @@ def api_query(request):
 
     o, params = create_sql_obj(None, args)
     o.limit = 10000
-    query = str(o)
-    # print(query)
-    # print(params)
 
-    if not repo or not table or not query:
+    if not repo or not table:
         # print("query: no db/table/query. giving up")
         return ret
 
     manager = DataHubManager(user=username, repo_base=repo_base)
+
+    fraction = 1.0
+    sample_rows = args.get('sample_rows')
+    if sample_rows is not None or args.get('sample_fraction') is not None:
+        nrows = estimate_row_count(manager, repo, table)
+        try:
+            fraction = sample_fraction(nrows, rows=sample_rows,
+                                       fraction=args.get('sample_fraction'))
+        except ValueError as e:
+            return {'error': str(e)}
+        ret['sample'] = {'fraction': fraction, 'estimated_rows': nrows}
+
+    if fraction < 1:
+        params = add_sampling(o, params, fraction)
+
+    query = str(o)
+    # print(query)
+    # print(params)
+
     res = manager.execute_sql(query, params)
     rows = res['tuples']
     cols = pick(res['fields'], 'name')
 
+    if fraction < 1:
+        cols, rows, ret['stderr'] = scale_results(o, cols, rows, fraction)
+
     data = [dict(zip(cols, vals)) for vals in rows]
     ret['data'] = data
     ret['schema'] = get_schema(repo, table, username, repo_base)
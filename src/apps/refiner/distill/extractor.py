@@ -0,0 +1,126 @@
+import collections
+import csv
+import multiprocessing
+import token
+
+import parser
+
+'''
+@author: anant bhardwaj
+@date: May 6, 2014
+
+extract the fields learned by inference.learn_mapping from records, without
+learning anything per record
+'''
+
+# a character for each token type, so that a record's token types are a
+# string, and fields can be found in it with str.find
+_type_codes = dict((name, chr(number)) for number, name in token.tok_name.items()
+                   if number < token.NT_OFFSET)
+
+class Extractor(object):
+  '''
+  the token types of each field in o_fields_structure, compiled once.
+
+  a record's fields are found, in order, as the first run of its tokens
+  with the field's token types after the previous field, and are the text
+  of those tokens. fields that aren't found are empty.
+  '''
+
+  def __init__(self, o_fields_structure):
+    self.patterns = []
+    for i in range(len(o_fields_structure)):
+      # a field's tokens end with an ENDMARKER, which a record's never match
+      types = [chunk[0] for chunk in o_fields_structure[i][0]['type']][:-1]
+      self.patterns.append(''.join([_type_codes[t] for t in types]))
+
+  def extract(self, record):
+    chunks = parser.parse(record)
+    types = ''.join([_type_codes[chunk[0]] for chunk in chunks])
+    fields = []
+    start = 0
+    for pattern in self.patterns:
+      i = types.find(pattern, start) if pattern else -1
+      if i == -1:
+        fields.append('')
+      else:
+        start = i + len(pattern)
+        fields.append(''.join([chunk[1] for chunk in chunks[i:start]]))
+    return fields
+
+  def extract_all(self, records, processes=1, chunk_size=1000):
+    '''
+    yields the fields of each of records, which can be any iterable, in
+    order. with more than one process, chunks of chunk_size records are
+    extracted in a pool of worker processes, with at most two chunks per
+    process in flight.
+    '''
+    if processes <= 1:
+      for record in records:
+        yield self.extract(record)
+      return
+
+    pool = multiprocessing.Pool(processes, _init_worker, (self,))
+    try:
+      pending = collections.deque()
+      for chunk in _chunks(records, chunk_size):
+        pending.append(pool.apply_async(_extract_chunk, (chunk,)))
+        if len(pending) >= 2 * processes:
+          for fields in pending.popleft().get():
+            yield fields
+      while pending:
+        for fields in pending.popleft().get():
+          yield fields
+    finally:
+      pool.terminate()
+
+  def write_csv(self, records, f, processes=1, chunk_size=1000):
+    '''
+    writes the fields of each of records to f as CSV, and returns the number
+    of rows written.
+    '''
+    writer = csv.writer(f)
+    count = 0
+    for fields in self.extract_all(records, processes, chunk_size):
+      writer.writerow(fields)
+      count += 1
+    return count
+
+def iter_records(f, sep="\n", size=1 << 20, progress=None):
+  '''
+  yields the records in file f, separated by sep, reading size bytes at a
+  time, and calling progress, if given, with the number read. a separator
+  at the end of the file doesn't start another record.
+  '''
+  rest = ''
+  while True:
+    data = f.read(size)
+    if not data:
+      break
+    if progress is not None:
+      progress(len(data))
+    records = (rest + data).split(sep)
+    rest = records.pop()
+    for record in records:
+      yield record
+  if rest:
+    yield rest
+
+def _chunks(records, chunk_size):
+  chunk = []
+  for record in records:
+    chunk.append(record)
+    if len(chunk) == chunk_size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+_extractor = None
+
+def _init_worker(extractor):
+  global _extractor
+  _extractor = extractor
+
+def _extract_chunk(chunk):
+  return [_extractor.extract(record) for record in chunk]
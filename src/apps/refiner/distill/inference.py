@@ -4,6 +4,8 @@ import parser
 import difflib
 from collections import defaultdict
 
+from extractor import Extractor
+
 '''
 @author: anant bhardwaj
 @date: May 6, 2014
@@ -102,39 +104,5 @@ def analyze_input_structure(i_chunks, o_fields_structure):
         break
 
 def extract(data, o_fields_structure, sep="\n"):
-  o_data = data.split(sep)
-  out = []
-  for line in o_data:
-    o_chunks = parser.parse(line)
-    # print line, o_chunks
-    fields = extract_fields(o_chunks, o_fields_structure)
-    out.append(fields)
-  return out
-
-def extract_fields(o_chunks, o_fields_structure):
-  extracted_fields = {}
-  o_chunks_types = [chunk[0] for chunk in o_chunks]
-  o_fields_types = []
-  field_matches = defaultdict(list)
-  for i in range(len(o_fields_structure)):
-     for o_field_type in o_fields_structure[i][0]['type']:
-      if o_field_type[0] == 'ENDMARKER':
-        o_fields_types.append('ENDMARKER_%s' %(i))
-      else:
-        o_fields_types.append(o_field_type[0])
-  
-  matcher = difflib.SequenceMatcher(None, o_fields_types, o_chunks_types)
-  alignments = matcher.get_opcodes()
-
-  k = 0
-  for i in range(len(o_fields_structure)):
-    extracted_fields[i] = ''
-    for alignment in alignments:
-      if alignment[0] == 'equal' and alignment[1] >= k and (
-          alignment[2] - alignment[1]) == len(o_fields_structure[i][0]['type']) - 1:      
-        for k in range(alignment[3], alignment[4]):
-          extracted_fields[i] += o_chunks[k][1]
-        k = alignment[2]
-        break
-
-  return extracted_fields
+  extractor = Extractor(o_fields_structure)
+  return [dict(enumerate(fields)) for fields in extractor.extract_all(data.split(sep))]
@@ -1,3 +1,4 @@
+import re
 import tokenize, token
 
 '''
@@ -7,11 +8,67 @@ import tokenize, token
 parse a given text and return lexical tokens
 '''
 
+# tokenize's own patterns, each in a group named after the type of the
+# tokens it matches, so that a line can be tokenized with one regex.
+# they're ordered by how common they are, so names that start strings are
+# excluded, and whatever else follows whitespace is an ERRORTOKEN.
+_String = tokenize.group(
+  r"[uUbB]?[rR]?'''" + tokenize.Single3,
+  r'[uUbB]?[rR]?"""' + tokenize.Double3, tokenize.String)
+_token_re = re.compile(
+  tokenize.Whitespace + '(?:' + '|'.join([
+    '(?P<NAME>(?!%s)%s)' % (_String, tokenize.Name),
+    r'(?P<NUMBER>[1-9]\d*(?![\d.eEjJlL])|%s)' % tokenize.Number,
+    '(?P<OP>%s)' % tokenize.Funny, '(?P<STRING>%s)' % _String,
+    '(?P<COMMENT>%s)' % tokenize.Comment, r'(?P<END>\Z)']) +
+  ')|(?P<ERRORTOKEN>.)')
+
 def parse(text):
+  if '\n' in text or '\r' in text:
+    return parse_lines(text)
+  return parse_line(text)
+
+def parse_lines(text):
   token_generator = tokenize.generate_tokens(iter([text]).next)   # tokenize the string
   chunks = [(token.tok_name[t[0]], t[1], t[2][1], t[3][1]) for t in token_generator]
   return chunks
 
+def parse_line(line):
+  '''
+  tokenizes a line without line breaks as parse_lines does, but about twice
+  as fast, and without failing on unbalanced brackets or quotes.
+  '''
+  pos, column = 0, 0
+  for c in line:
+    if c == ' ':
+      column += 1
+    elif c == '\t':
+      column = (column // tokenize.tabsize + 1) * tokenize.tabsize
+    elif c == '\f':
+      column = 0
+    else:
+      break
+    pos += 1
+
+  if pos == len(line):
+    return [('ENDMARKER', '', 0, 0)]
+  if line[pos] == '#':
+    comment = line[pos:]
+    return [('COMMENT', comment, pos, len(line)), ('NL', '', len(line), len(line)),
+            ('ENDMARKER', '', 0, 0)]
+
+  chunks = []
+  if column > 0:
+    chunks.append(('INDENT', line[:pos], 0, pos))
+  for m in _token_re.finditer(line, pos):
+    if m.lastgroup != 'END':
+      i = m.lastindex
+      chunks.append((m.lastgroup, m.group(i), m.start(i), m.end(i)))
+  if column > 0:
+    chunks.append(('DEDENT', '', 0, 0))
+  chunks.append(('ENDMARKER', '', 0, 0))
+  return chunks
+
 if __name__ == "__main__":
   text = [
   "2012-01-04 00:01:23,180 INFO org.apache.hadoop.hdfs.server.datanode.DataNode: Receiving block blk_-2281137920769708011_1116 src: /127.0.0.1:32981 dest: /127.0.0.1:50010",
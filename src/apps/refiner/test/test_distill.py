@@ -0,0 +1,137 @@
+import io
+import random
+import token
+import tokenize
+
+from mock import Mock
+
+from django.test import TestCase
+
+from refiner.distill import parser
+from refiner.distill.extractor import Extractor, iter_records
+
+
+def _tokenize_line(line):
+    # parse_lines, except that when tokenize fails on an unclosed bracket,
+    # the tokens it read are kept, and closed as it would have closed them.
+    # It still fails on unclosed triple quoted strings, which swallow the
+    # rest of the line.
+    chunks = []
+    try:
+        for t in tokenize.generate_tokens(iter([line]).next):
+            chunks.append((token.tok_name[t[0]], t[1], t[2][1], t[3][1]))
+    except tokenize.TokenError as e:
+        if 'statement' not in e.args[0]:
+            raise
+        if chunks and chunks[0][0] == 'INDENT':
+            chunks.append(('DEDENT', '', 0, 0))
+        chunks.append(('ENDMARKER', '', 0, 0))
+    return chunks
+
+
+class ParseLine(TestCase):
+    """Tests that parse_line tokenizes lines as tokenize does."""
+
+    lines = [
+        '2012-01-04 00:01:23,180 INFO org.apache.DataNode: Receiving block '
+        'blk_-2281137920769708011_1116 src: /127.0.0.1:32981',
+        'x=1, y=0x1F, z=1.5e3, n=7L, j=1j, e=1e, o=00',
+        'f(a, "b", \'c\') # and a comment',
+        'u"x" r\'y\' b"z" """triple""" \'\'\'quotes\'\'\'',
+        '  indented',
+        '\tindented with a tab',
+        '# a comment',
+        '',
+        '   ',
+        '$ ? ! ` @',
+    ]
+    unbalanced = [
+        "it's unbalanced",
+        'say "hi',
+        'close ) ] }',
+        'open (paren [x',
+        '{ "key": [1, 2',
+    ]
+
+    def test_parse_line_matches_parse_lines(self):
+        for line in self.lines:
+            self.assertEqual(parser.parse_line(line),
+                             parser.parse_lines(line), line)
+
+    def test_parse_line_allows_unbalanced_quotes_and_brackets(self):
+        for line in self.unbalanced:
+            self.assertEqual(parser.parse_line(line), _tokenize_line(line),
+                             line)
+
+    def test_parse_line_allows_unclosed_triple_quotes(self):
+        self.assertEqual(
+            parser.parse_line('say """hi'),
+            [('NAME', 'say', 0, 3), ('STRING', '""', 4, 6),
+             ('ERRORTOKEN', '"', 6, 7), ('NAME', 'hi', 7, 9),
+             ('ENDMARKER', '', 0, 0)])
+
+    def test_parse_line_matches_tokenize_on_random_lines(self):
+        rng = random.Random(0)
+        alphabet = 'ab_Z019 .,:;-+=/\\()[]{}\'"#@$\t'
+        compared = 0
+        for _ in range(5000):
+            line = ''.join(rng.choice(alphabet)
+                           for _ in range(rng.randint(0, 30)))
+            try:
+                expected = _tokenize_line(line)
+            except tokenize.TokenError:
+                continue
+            self.assertEqual(parser.parse_line(line), expected, repr(line))
+            compared += 1
+        self.assertGreater(compared, 4900)
+
+
+class IterRecords(TestCase):
+    """Tests splitting files into records as they're read."""
+
+    def records(self, data, sep='\n', size=4):
+        progress = Mock()
+        records = list(iter_records(io.BytesIO(data), sep, size, progress))
+        self.assertEqual(sum(c[0][0] for c in progress.call_args_list),
+                         len(data))
+        return records
+
+    def test_separator_at_a_chunk_boundary(self):
+        # the first read ends with the separator
+        self.assertEqual(self.records('abc\ndefgh\nij'),
+                         ['abc', 'defgh', 'ij'])
+        # and a two character separator is split across reads
+        self.assertEqual(self.records('abc\r\ndef', sep='\r\n'),
+                         ['abc', 'def'])
+
+    def test_separator_at_the_end_of_the_file(self):
+        self.assertEqual(self.records('abc\ndef\n'), ['abc', 'def'])
+        self.assertEqual(self.records('abc\n\n'), ['abc', ''])
+        self.assertEqual(self.records(''), [])
+
+
+class ExtractAll(TestCase):
+    """Tests extracting fields from records."""
+
+    def setUp(self):
+        # a name, then the first number after it
+        self.extractor = Extractor([
+            [{'type': parser.parse('name')}],
+            [{'type': parser.parse('123')}]])
+        self.records = ['user%d logged in %d times' % (i, i * 7)
+                        for i in range(100)] + ['no numbers here', '']
+
+    def test_extract(self):
+        self.assertEqual(self.extractor.extract('bob has 3 cats'),
+                         ['bob', '3'])
+        # fields that aren't found are empty, and don't stop the rest
+        self.assertEqual(self.extractor.extract('(42)'), ['', '42'])
+        self.assertEqual(self.extractor.extract(''), ['', ''])
+
+    def test_extract_all_in_processes_keeps_order(self):
+        expected = list(self.extractor.extract_all(self.records))
+        self.assertEqual(expected[5], ['user5', '35'])
+        self.assertEqual(
+            list(self.extractor.extract_all(
+                self.records, processes=2, chunk_size=7)),
+            expected)
@@ -4,5 +4,6 @@ urlpatterns = patterns(
     '',
     url(r'^$', 'refiner.views.index'),
     url(r'^refine-data$', 'refiner.views.refine_data'),
-    url(r'^create-table$', 'refiner.views.create_table')
+    url(r'^create-table$', 'refiner.views.create_table'),
+    url(r'^refine-file$', 'refiner.views.refine_file')
 )
@@ -6,6 +6,7 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, HttpResponseServerError
 
 from core.db.manager import DataHubManager
+from core.jobs import submit_job
 from distill import inference
 
 
@@ -86,3 +87,27 @@ def create_table(request):
 
     except Exception as e:
         return HttpResponseServerError(e)
+
+
+@login_required
+def refine_file(request):
+    username = request.user.get_username()
+    header = None
+    if request.POST.get('header'):
+        header = json.loads(request.POST['header'])
+
+    # files are refined in the background, straight into a new table
+    try:
+        job = submit_job(
+            username, username, request.POST['repo_name'], 'refine_file',
+            table=request.POST.get('table_name', ''),
+            file_name=request.POST['file_name'],
+            training_input=request.POST['training_input'],
+            training_output=request.POST['training_output'],
+            record_separator=request.POST.get('record_separator', '\n'),
+            header=header)
+        return HttpResponse(json.dumps({'job_id': job.id}),
+                            content_type="application/json")
+
+    except Exception as e:
+        return HttpResponseServerError(e)
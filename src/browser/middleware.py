@@ -1,4 +1,5 @@
 from psycopg2 import Error as PGError
+from core.db import superuser
 from core.db.manager import PermissionDenied
 from django.core.exceptions import ValidationError, \
                                    ObjectDoesNotExist
@@ -56,6 +57,18 @@ class DataHubManagerExceptionHandler(object):
             status=status_code)
 
 
+class SuperuserSessionMiddleware(object):
+    """Shares superuser database connections within each request."""
+
+    def process_request(self, request):
+        superuser.begin_session()
+        return None
+
+    def process_response(self, request, response):
+        superuser.end_session()
+        return response
+
+
 # Credit to @mattrobenolt:
 # - https://mattrobenolt.com/handle-x-forwarded-port-header-in-django/
 #
@@ -30,6 +30,8 @@ from oauth2_provider.views import ApplicationUpdate
 from inventory.models import App, Annotation
 from account.utils import grant_app_permission
 from core.db.manager import DataHubManager
+from core.jobs import submit_job
+from core.file_response import file_response
 from core.db.rlsmanager import RowLevelSecurityManager
 from core.db.licensemanager import LicenseManager
 from core.db.rls_permissions import RLSPermissionsParser
@@ -680,6 +682,7 @@ def table(request, repo_base, repo, table):
     current_page = 1
     if request.POST.get('page'):
         current_page = request.POST.get('page')
+    page_token = request.POST.get('page_token')
 
     username = request.user.get_username()
     if repo_base.lower() == 'user':
@@ -690,8 +693,16 @@ def table(request, repo_base, repo, table):
     with DataHubManager(user=username, repo_base=repo_base) as manager:
         query = manager.select_table_query(repo, table)
 
-        res = manager.paginate_query(
-            query=query, current_page=current_page, rows_per_page=50)
+        # Tables with a primary key are paged by seeking on the key, which
+        # keeps deep pages as cheap as the first one.
+        primary_key = manager.get_primary_key(repo, table)
+        if primary_key:
+            res = manager.keyset_paginate_query(
+                query=query, rows_per_page=50, order_by=primary_key,
+                page_token=page_token)
+        else:
+            res = manager.paginate_query(
+                query=query, current_page=current_page, rows_per_page=50)
 
     # get annotation to the table:
     annotation, created = Annotation.objects.get_or_create(url_path=url_path)
@@ -709,12 +720,18 @@ def table(request, repo_base, repo, table):
         'url_path': url_path,
         'column_names': res['column_names'],
         'tuples': res['rows'],
-        'total_pages': res['total_pages'],
-        'pages': range(res['start_page'], res['end_page'] + 1),  # template
-        'num_rows': res['num_rows'],
-        'time_cost': res['time_cost']
+        'next_page_token': res.get('next_page_token'),
     }
 
+    # offset pagination also estimates the number of pages
+    if 'total_pages' in res:
+        data.update({
+            'total_pages': res['total_pages'],
+            'pages': range(res['start_page'], res['end_page'] + 1),
+            'num_rows': res['num_rows'],
+            'time_cost': res['time_cost']
+        })
+
     data.update(csrf(request))
 
     # and then, after everything, hand this off to table-browse. It turns out
@@ -740,10 +757,10 @@ def table_export(request, repo_base, repo, table_name):
     username = request.user.get_username()
     file_name = request.GET.get('var_text', table_name)
 
-    with DataHubManager(user=username, repo_base=repo_base) as manager:
-        manager.export_table(
-            repo=repo, table=table_name, file_name=file_name,
-            file_format='CSV', delimiter=',', header=True)
+    # exports run in the background, and the file shows up when done
+    submit_job(username, repo_base, repo, 'export_table', table=table_name,
+               file_name=file_name, file_format='CSV', delimiter=',',
+               header=True)
 
     return HttpResponseRedirect(
         reverse('browser-repo_files', args=(repo_base, repo)))
@@ -817,15 +834,10 @@ def file_import(request, repo_base, repo, file_name):
     if quote_character == '':
         quote_character = request.GET['other_quote_character']
 
-    DataHubManager.import_file(
-        username=username,
-        repo_base=repo_base,
-        repo=repo,
-        table='',
-        file_name=file_name,
-        delimiter=delimiter,
-        header=header,
-        quote_character=quote_character)
+    # imports run in the background, and the table shows up when done
+    submit_job(username, repo_base, repo, 'import_file', table='',
+               file_name=file_name, delimiter=delimiter, header=header,
+               quote_character=quote_character)
 
     return HttpResponseRedirect(
         reverse('browser-repo', args=(repo_base, repo)))
@@ -846,12 +858,9 @@ def file_download(request, repo_base, repo, file_name):
     username = request.user.get_username()
 
     with DataHubManager(user=username, repo_base=repo_base) as manager:
-        file_to_download = manager.get_file(repo, file_name)
+        file_path = manager.get_file_path(repo, file_name)
 
-    response = HttpResponse(file_to_download,
-                            content_type='application/force-download')
-    response['Content-Disposition'] = 'attachment; filename="%s"' % (file_name)
-    return response
+    return file_response(request, file_path, file_name)
 
 
 '''
@@ -1028,8 +1037,9 @@ def card_export(request, repo_base, repo, card_name):
     username = request.user.get_username()
     file_name = request.GET.get('var_text', card_name)
 
-    with DataHubManager(user=username, repo_base=repo_base) as manager:
-        manager.export_card(repo, file_name, card_name)
+    # exports run in the background, and the file shows up when done
+    submit_job(username, repo_base, repo, 'export_card', card_name=card_name,
+               file_name=file_name)
 
     return HttpResponseRedirect(
         reverse('browser-repo_files', args=(repo_base, repo)))
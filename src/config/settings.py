@@ -36,6 +36,17 @@ DATABASES = {
     }
 }
 
+# Limits for the pools of user database connections kept by core.db.backend.
+# Connections are reused across requests. At most DB_POOL_MAX_CONNECTIONS are
+# open at once, and at most DB_POOL_MAX_CONNECTIONS_PER_POOL are in use for any
+# one (user, password, database). Connections idle for DB_POOL_IDLE_TIMEOUT
+# seconds are closed, and callers wait up to DB_POOL_WAIT_TIMEOUT seconds for a
+# free connection before giving up.
+DB_POOL_MAX_CONNECTIONS = 100
+DB_POOL_MAX_CONNECTIONS_PER_POOL = 10
+DB_POOL_IDLE_TIMEOUT = 300
+DB_POOL_WAIT_TIMEOUT = 10
+
 # Database role that public repos grant access to
 # All datahub users are granted access to this role
 PUBLIC_ROLE = 'dh_public'
@@ -62,6 +73,113 @@ LICENSE_LINK_TABLE = 'license_link'
 RLS_ALL = 'ALL'
 RLS_PUBLIC = 'PUBLIC'
 
+# How row level security policies are enforced. 'rewrite' rewrites users'
+# queries to filter the tables they read. 'native' compiles each table's
+# policies into Postgres row level security policies on the table, kept in
+# sync by RowLevelSecurityManager, and leaves queries alone. 'native' needs
+# PostgreSQL 9.5 or later; after switching to it, run
+# `manage.py sync_security_policies` once. Table owners aren't subject to
+# native policies.
+RLS_BACKEND = 'rewrite'
+
+# Row level security policies and rewritten queries are cached per process.
+# Policy changes are visible immediately in the process that made them, and in
+# other processes after RLS_CACHE_TTL seconds.
+RLS_CACHE_TTL = 30
+RLS_POLICY_CACHE_SIZE = 4096
+RLS_REWRITE_CACHE_SIZE = 1024
+
+# Repo, table, view and column listings are cached per process and repo_base.
+# DDL run through a PGBackend clears that repo_base's listings right away, and
+# changes made elsewhere show up after CATALOG_CACHE_TTL seconds.
+CATALOG_CACHE_TTL = 10
+CATALOG_CACHE_SIZE = 4096
+
+# Each login's privileges in a repo_base are looked up in one catalog query,
+# and its file privileges in one Collaborator query, and both are cached per
+# process for up to PRIVILEGE_CACHE_TTL seconds. Adding or removing a
+# collaborator through DataHubManager drops that repo_base's privileges right
+# away.
+PRIVILEGE_CACHE_TTL = 10
+PRIVILEGE_CACHE_SIZE = 4096
+
+# Pages of card results are cached per process for up to CARD_CACHE_TTL
+# seconds, and dropped sooner when the tables a card reads from are written.
+CARD_CACHE_TTL = 300
+CARD_CACHE_SIZE = 1024
+
+# DataTables draws count a table's rows exactly, and cache its total row count
+# for up to DATATABLES_COUNT_CACHE_TTL seconds, or until it's written to.
+# Tables the planner estimates to have more than DATATABLES_ESTIMATE_ROWS rows
+# get the planner's estimates instead. None always counts exactly.
+DATATABLES_COUNT_CACHE_TTL = 300
+DATATABLES_COUNT_CACHE_SIZE = 1024
+DATATABLES_ESTIMATE_ROWS = None
+
+# DataTables filters are compiled into where clauses with their values bound
+# as parameters, and up to DATATABLES_CLAUSE_CACHE_SIZE clauses are cached per
+# process. With DATATABLES_TRIGRAM_INDEXES, text columns get a trigram index
+# the first time they're filtered on, which needs the pg_trgm extension.
+DATATABLES_CLAUSE_CACHE_SIZE = 1024
+DATATABLES_TRIGRAM_INDEXES = False
+
+# Batches of statements run through the API are run in one transaction, so
+# each is limited to QUERY_BATCH_MAX_STATEMENTS statements.
+QUERY_BATCH_MAX_STATEMENTS = 1000
+
+# Resumable uploads that haven't received any bytes for UPLOAD_EXPIRY seconds
+# are deleted the next time an upload to the same repo is started.
+UPLOAD_EXPIRY = 24 * 60 * 60
+
+# Exports and imports run as background jobs (see core.jobs), in worker
+# processes started with `manage.py runjobs`. Each worker runs
+# JOB_WORKER_THREADS jobs at a time, and checks for new jobs every
+# JOB_POLL_INTERVAL seconds when idle. Running jobs record their progress,
+# and notice cancellation, every JOB_PROGRESS_INTERVAL seconds. Workers mark
+# their running jobs as alive every JOB_HEARTBEAT_INTERVAL seconds, and fail
+# running jobs that haven't been marked for JOB_STALE_TIMEOUT seconds, e.g.
+# because the worker running them crashed.
+JOB_WORKER_THREADS = 4
+JOB_POLL_INTERVAL = 2
+JOB_PROGRESS_INTERVAL = 1
+JOB_HEARTBEAT_INTERVAL = 10
+JOB_STALE_TIMEOUT = 120
+
+# Imported files get column types inferred from their first IMPORT_SAMPLE_ROWS
+# rows, and are loaded IMPORT_BATCH_SIZE rows at a time over
+# IMPORT_CONNECTIONS database connections at once.
+IMPORT_SAMPLE_ROWS = 10000
+IMPORT_BATCH_SIZE = 10000
+IMPORT_CONNECTIONS = 4
+
+# The refiner extracts fields from files' records in chunks of
+# REFINE_CHUNK_SIZE records, over REFINE_PROCESSES processes.
+REFINE_PROCESSES = 2
+REFINE_CHUNK_SIZE = 1000
+
+# Cursors opened through the Thrift service hold a database connection until
+# they're closed, so they're closed after THRIFT_CURSOR_TIMEOUT idle seconds,
+# and each server process keeps at most THRIFT_MAX_CURSORS open, and at most
+# THRIFT_MAX_CURSORS_PER_USER for any one (user, repo_base). Both stay below
+# the DB_POOL limits, so that open cursors can't starve other requests of
+# connections. Each fetch returns at most THRIFT_MAX_FETCH rows.
+THRIFT_CURSOR_TIMEOUT = 300
+THRIFT_MAX_CURSORS = 50
+THRIFT_MAX_CURSORS_PER_USER = 5
+THRIFT_MAX_FETCH = 10000
+
+# The Thrift TCP server (tserver/server.py) runs in 'threaded' mode, a thread
+# per connection, or 'nonblocking' mode, which needs framed transports on
+# clients. The latter processes requests on THRIFT_SERVER_THREADS threads,
+# stops accepting connections at THRIFT_SERVER_MAX_CONNECTIONS and reading
+# requests at THRIFT_SERVER_MAX_QUEUE queued ones, and logs its metrics every
+# THRIFT_SERVER_METRICS_INTERVAL seconds.
+THRIFT_SERVER_MODE = 'threaded'
+THRIFT_SERVER_THREADS = 16
+THRIFT_SERVER_MAX_CONNECTIONS = 1000
+THRIFT_SERVER_MAX_QUEUE = 256
+THRIFT_SERVER_METRICS_INTERVAL = 60
+
 # Other blacklisted usernames
 BLACKLISTED_USERNAMES = [RLS_ALL, RLS_PUBLIC]
 
@@ -169,6 +287,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'browser.middleware.XForwardedPort',
+    'browser.middleware.SuperuserSessionMiddleware',
     'browser.middleware.DataHubManagerExceptionHandler',
     # Uncomment the next line for simple clickjacking protection:
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
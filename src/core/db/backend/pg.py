@@ -1,16 +1,20 @@
 import re
 import os
+import io
+import csv
 import errno
 import shutil
 import hashlib
-from collections import namedtuple
+import itertools
 from uuid import uuid4
 import psycopg2
 import core.db.query_rewriter
 from psycopg2.extensions import AsIs
-from psycopg2.pool import ThreadedConnectionPool
 from psycopg2 import errorcodes
+from core.db import columnar
 from core.db.licensemanager import LicenseManager
+from core.db.backend.pool import ConnectionPoolManager, PoolKey
+from core.db.cache import LRUCache
 
 from core.db.errors import PermissionDenied
 from config import settings
@@ -27,38 +31,124 @@ if settings.DATABASES['default']['PORT'] != '':
     except:
         pass
 
+# Number of rows fetched per round trip when streaming query results through a
+# server-side cursor.
+STREAM_BATCH_SIZE = 2000
+
+# Number of rows sent to the database per COPY when importing rows.
+COPY_BATCH_SIZE = 10000
+
+# Number of rows per record batch (Arrow) or row group (Parquet) in columnar
+# exports.
+COLUMNAR_BATCH_SIZE = 65536
+
+# Results of catalog queries (list_repos, list_tables, list_views and
+# get_schema), keyed on (repo_base, user, method, args). information_schema
+# only shows what the user has privileges on, hence the user in the key.
+_catalog_cache = LRUCache(max_size=settings.CATALOG_CACHE_SIZE,
+                          ttl=settings.CATALOG_CACHE_TTL)
+
+# Statements that may change what the catalog queries return.
+CATALOG_STATEMENTS = ('create', 'alter', 'drop', 'grant', 'revoke')
+
+# The privileges that get_privileges looks up on each kind of object.
+BASE_PRIVILEGES = ('CREATE', 'CONNECT', 'TEMPORARY')
+REPO_PRIVILEGES = ('CREATE', 'USAGE')
+TABLE_PRIVILEGES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'TRUNCATE',
+                    'REFERENCES', 'TRIGGER')
+COLUMN_PRIVILEGES = ('SELECT', 'INSERT', 'UPDATE', 'REFERENCES')
+
+# Native row level security policies (see RowLevelSecurityManager) are named
+# with this prefix, and compiled for these DataHub policy types, with the
+# commands and clauses they become. DataHub has no delete policies, but every
+# command needs a policy once row level security is enabled on a table.
+NATIVE_POLICY_PREFIX = 'dh_'
+NATIVE_POLICY_COMMANDS = (
+    ('select', 'SELECT', 'USING'),
+    ('insert', 'INSERT', 'WITH CHECK'),
+    ('update', 'UPDATE', 'USING'),
+    (None, 'DELETE', 'USING'))
+
 # Maintain a separate db connection pool for each (user, password, database)
-# tuple.
-connection_pools = {}
-PoolKey = namedtuple('PoolKey', 'user, password, repo_base')
+# tuple, all sharing one cap on the total number of open connections.
+connection_pools = ConnectionPoolManager(
+    max_connections=settings.DB_POOL_MAX_CONNECTIONS,
+    max_pool_connections=settings.DB_POOL_MAX_CONNECTIONS_PER_POOL,
+    idle_timeout=settings.DB_POOL_IDLE_TIMEOUT,
+    wait_timeout=settings.DB_POOL_WAIT_TIMEOUT)
 
 
 def _pool_for_credentials(user, password, repo_base, create_if_missing=True):
-    pool_key = PoolKey(user, password, repo_base)
     # Create a new pool if one doesn't exist or if the existing one has been
     # closed. Normally a pool should only be closed during testing, to force
-    # all hanging connections to a database to be closed.
-    if pool_key not in connection_pools or connection_pools[pool_key].closed:
-        if create_if_missing is False:
-            return None
-        # Maintains at least 1 connection.
-        # Raises "PoolError: connection pool exausted" if a thread tries
-        # holding onto than 10 connections to a single database.
-        connection_pools[pool_key] = ThreadedConnectionPool(
-            0,
-            10,
-            user=user,
-            password=password,
-            host=HOST,
-            port=PORT,
-            database=repo_base)
-    return connection_pools[pool_key]
+    # all hanging connections to a database to be closed, or when the
+    # database is dropped.
+    return connection_pools.get_pool(
+        PoolKey(user, password, repo_base),
+        create_if_missing=create_if_missing,
+        user=user,
+        password=password,
+        host=HOST,
+        port=PORT,
+        database=repo_base)
 
 
 def _close_all_connections(repo_base):
-    for key, pool in connection_pools.iteritems():
-        if repo_base == key.repo_base and not pool.closed:
-            pool.closeall()
+    connection_pools.close_pools(lambda key: key.repo_base == repo_base)
+
+
+def _invalidate_catalog(repo_base):
+    _catalog_cache.invalidate(lambda key: key[0] == repo_base)
+
+
+def _batches(iterable, size):
+    """Yields lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class _ProgressFile(object):
+    """
+    Wraps a file for copy_expert, calling progress(n) after every n bytes
+    read or written. progress may raise to abort the COPY.
+    """
+
+    def __init__(self, f, progress):
+        self.f = f
+        self.progress = progress
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.progress(len(data))
+        return data
+
+    def write(self, data):
+        self.f.write(data)
+        self.progress(len(data))
+
+
+def _quote_identifier(name):
+    return '"%s"' % name.replace('"', '""')
+
+
+def _index_name(table, column, kind):
+    # Postgres truncates names to 63 bytes, and table_column_kind names can
+    # collide even when they fit, e.g. for a_b.c and a.b_c, so names end with
+    # a hash of what's indexed.
+    digest = hashlib.sha256(
+        _utf8('%s.%s.%s' % (table, column, kind))).hexdigest()[:8]
+    prefix = ('%s_%s' % (table, column))[:63 - len(digest) - len(kind) - 2]
+    return '%s_%s_%s' % (prefix, digest, kind)
 
 
 def _convert_pg_exception(e):
@@ -83,6 +173,63 @@ def _convert_pg_exception(e):
     raise e
 
 
+def _compile_native_policies(table_name, policies, roles):
+    """
+    Returns (query, params) statements that create native Postgres policies
+    on table_name enforcing policies, (policy, policy_type, grantee) tuples,
+    the way SQLQueryRewriter does.
+
+    Policies apply to their grantee, or to everyone if the grantee is
+    settings.RLS_ALL or settings.RLS_PUBLIC. Grantees that aren't in roles
+    don't exist, so their policies are left out. Each user's select and
+    insert policies are ORed and their update policies ANDed, and a user
+    with no policies of a type is unrestricted by that type.
+    """
+    everyone = (settings.RLS_ALL, settings.RLS_PUBLIC)
+    statements = []
+    for policy_type, command, clause in NATIVE_POLICY_COMMANDS:
+        combine = ' AND ' if policy_type == 'update' else ' OR '
+        general = []
+        specific = {}
+        for policy, grantee_policy_type, grantee in policies:
+            if grantee_policy_type != policy_type:
+                continue
+            if policy == "INSERT='True'":
+                expression = 'true'
+            else:
+                expression = '(%s)' % policy.replace(
+                    'USERNAME', 'current_user')
+            if grantee in everyone:
+                general.append(expression)
+            elif grantee in roles:
+                specific.setdefault(grantee, []).append(expression)
+
+        # a policy for each grantee, so that Postgres only plans theirs
+        for i, grantee in enumerate(sorted(specific)):
+            statements.append((
+                'CREATE POLICY %s ON %s FOR %s TO %s %s (%s);',
+                (AsIs('%s%s_%d' % (NATIVE_POLICY_PREFIX, policy_type, i)),
+                 AsIs(table_name), AsIs(command),
+                 AsIs(_quote_identifier(grantee)), AsIs(clause),
+                 AsIs(combine.join(specific[grantee] + general)))))
+
+        # and one for everyone else
+        name = AsIs('%s%s' % (NATIVE_POLICY_PREFIX, policy_type or 'delete'))
+        expression = AsIs(combine.join(general) or 'true')
+        if specific:
+            statements.append((
+                'CREATE POLICY %s ON %s FOR %s TO PUBLIC %s '
+                '((%s) AND current_user <> ALL (%s::name[]));',
+                (name, AsIs(table_name), AsIs(command), AsIs(clause),
+                 expression, sorted(specific))))
+        else:
+            statements.append((
+                'CREATE POLICY %s ON %s FOR %s TO PUBLIC %s (%s);',
+                (name, AsIs(table_name), AsIs(command), AsIs(clause),
+                 expression)))
+    return statements
+
+
 class PGBackend:
 
     def __init__(self, user, password, host=HOST, port=PORT, repo_base=None):
@@ -92,10 +239,13 @@ class PGBackend:
         self.port = port
         self.repo_base = repo_base
         self.connection = None
+        self.pool = None
 
-        # row level security is enabled unless the user is a superuser
+        # row level security is enabled unless the user is a superuser, or
+        # Postgres enforces it natively
         self.row_level_security = bool(
-            user != settings.DATABASES['default']['USER'])
+            user != settings.DATABASES['default']['USER'] and
+            settings.RLS_BACKEND == 'rewrite')
 
         # We only need a query rewriter if RLS is enabled
         if self.row_level_security:
@@ -108,8 +258,9 @@ class PGBackend:
         self.close_connection()
 
     def __open_connection__(self):
-        pool = _pool_for_credentials(self.user, self.password, self.repo_base)
-        self.connection = pool.getconn()
+        self.pool = _pool_for_credentials(
+            self.user, self.password, self.repo_base)
+        self.connection = self.pool.getconn()
         self.connection.set_isolation_level(
             psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
 
@@ -119,10 +270,11 @@ class PGBackend:
         self.__open_connection__()
 
     def close_connection(self):
-        pool = _pool_for_credentials(self.user, self.password, self.repo_base,
-                                     create_if_missing=False)
-        if self.connection and pool and not pool.closed:
-            pool.putconn(self.connection, close=True)
+        # The connection goes back to the pool it came from, to be reused by
+        # the next request. If that pool has since been closed, e.g. because
+        # the database was dropped, the pool closes the connection instead.
+        if self.connection and self.pool:
+            self.pool.putconn(self.connection)
             self.connection = None
 
     def _check_for_injections(self, noun):
@@ -175,6 +327,9 @@ class PGBackend:
         return res['status']
 
     def list_repos(self):
+        return self._cached_catalog(('list_repos',), self._list_repos)
+
+    def _list_repos(self):
         query = ('SELECT schema_name AS repo_name '
                  'FROM information_schema.schemata '
                  'WHERE schema_owner != %s')
@@ -362,6 +517,10 @@ class PGBackend:
         if repo not in all_repos:
             raise LookupError('Invalid repository name: %s' % (repo))
 
+        return self._cached_catalog(
+            ('list_tables', repo), lambda: self._list_tables(repo))
+
+    def _list_tables(self, repo):
         query = ('SELECT table_name FROM information_schema.tables '
                  'WHERE table_schema = %s AND table_type = \'BASE TABLE\';'
                  )
@@ -410,6 +569,10 @@ class PGBackend:
         if repo not in all_repos:
             raise LookupError('Invalid repository name: %s' % (repo))
 
+        return self._cached_catalog(
+            ('list_views', repo), lambda: self._list_views(repo))
+
+    def _list_views(self, repo):
         query = ('SELECT table_name FROM information_schema.tables '
                  'WHERE table_schema = %s '
                  'AND table_type = \'VIEW\';')
@@ -479,6 +642,10 @@ class PGBackend:
         self._check_for_injections(repo)
         self._validate_table_name(table)
 
+        return self._cached_catalog(
+            ('get_schema', repo, table), lambda: self._get_schema(repo, table))
+
+    def _get_schema(self, repo, table):
         query = ('SELECT column_name, data_type '
                  'FROM information_schema.columns '
                  'WHERE table_name = %s '
@@ -494,7 +661,19 @@ class PGBackend:
         # return will look like [('id', 'integer'), ('words', 'text')]
         return res['tuples']
 
-    def explain_query(self, query):
+    def _cached_catalog(self, key, fetch):
+        """
+        Returns the cached result of a catalog query, or calls fetch to run
+        it. Errors aren't cached.
+        """
+        key = (self.repo_base, self.user) + key
+        value = _catalog_cache.get(key)
+        if value is None:
+            value = tuple(fetch())
+            _catalog_cache.set(key, value)
+        return list(value)
+
+    def explain_query(self, query, params=None):
         """
         returns the number of rows, the cost (in time) to execute,
         and the width (bytes) of rows outputted
@@ -507,7 +686,7 @@ class PGBackend:
             return response
 
         query = 'EXPLAIN %s' % (query)
-        res = self.execute_sql(query)
+        res = self.execute_sql(query, params)
 
         num_rows = re.match(r'.*rows=(\d+).*', res['tuples'][0][0]).group(1)
         byte_width = re.match(r'.*width=(\d+).*', res['tuples'][0][0]).group(1)
@@ -523,6 +702,97 @@ class PGBackend:
                     }
         return response
 
+    def create_trigram_index(self, repo, table, column):
+        """
+        Creates a trigram index on a text column, which ILIKE and regular
+        expression filters can use wherever the pattern matches, unless the
+        column already has one. Returns whether the index was created.
+
+        The index is built without locking out writes to the table. It needs
+        the pg_trgm extension to be installed in the database. A build that
+        fails leaves an invalid index behind, which is dropped, then or by
+        the next call.
+        """
+        self._check_for_injections(repo)
+        self._validate_table_name(table)
+        self._validate_table_name(column)
+
+        index = _index_name(table, column, 'trgm')
+        query = ('SELECT i.indisvalid FROM pg_index i '
+                 'JOIN pg_class c ON c.oid = i.indexrelid '
+                 'JOIN pg_namespace n ON n.oid = c.relnamespace '
+                 'WHERE n.nspname = %s AND c.relname = %s')
+        res = self.execute_sql(query, (repo, index))
+        if res['row_count'] > 0:
+            if res['tuples'][0][0]:
+                return False
+            self._drop_index(repo, index)
+
+        query = ('CREATE INDEX CONCURRENTLY %s ON %s.%s '
+                 'USING gin (%s gin_trgm_ops)') % (
+            _quote_identifier(index), repo, table, _quote_identifier(column))
+        try:
+            self.execute_sql(query)
+        except Exception as e:
+            try:
+                self._drop_index(repo, index)
+            except Exception:
+                # the build's error is the one worth reporting
+                pass
+            raise e
+        return True
+
+    def _drop_index(self, repo, index):
+        query = 'DROP INDEX CONCURRENTLY IF EXISTS %s.%s' % (
+            repo, _quote_identifier(index))
+        self.execute_sql(query)
+
+    def list_query_tables(self, query):
+        """
+        Returns the (schema, table) pairs that query reads from or writes to,
+        views expanded, without executing it.
+
+        Raises ProgrammingError if the query can't be planned, which also
+        covers insufficient privileges on the tables it references.
+        """
+        query = query.strip().rstrip(';')
+        return self._cached_catalog(
+            ('list_query_tables', query),
+            lambda: self._list_query_tables(query))
+
+    def _list_query_tables(self, query):
+        res = self.execute_sql('EXPLAIN (VERBOSE, FORMAT JSON) %s' % query)
+        plans = [entry['Plan'] for entry in res['tuples'][0][0]]
+
+        tables = set()
+        while plans:
+            plan = plans.pop()
+            if 'Relation Name' in plan:
+                tables.add((plan['Schema'], plan['Relation Name']))
+            plans.extend(plan.get('Plans', []))
+        return sorted(tables)
+
+    def get_table_versions(self, tables):
+        """
+        Returns a tuple that changes whenever one of the (schema, table)
+        pairs in tables is written to, truncated or rewritten, or None if
+        some of them aren't tracked by the statistics collector.
+
+        The modification counters lag behind commits by up to half a second.
+        """
+        if not tables:
+            return None
+        names = ['%s.%s' % (schema, table) for schema, table in tables]
+        query = ('SELECT schemaname, relname, pg_relation_filenode(relid), '
+                 'n_tup_ins, n_tup_upd, n_tup_del '
+                 'FROM pg_stat_user_tables '
+                 'WHERE schemaname || \'.\' || relname = ANY(%s) '
+                 'ORDER BY schemaname, relname')
+        res = self.execute_sql(query, (names,))
+        if res['row_count'] != len(set(names)):
+            return None
+        return tuple(tuple(row) for row in res['tuples'])
+
     def limit_and_offset_select_query(self, query, limit, offset):
         query = query.strip().rstrip(';')
 
@@ -540,12 +810,115 @@ class PGBackend:
 
         return {'select_query': select_query, 'query': query}
 
+    def keyset_select_query(self, query, order_by, last_values, limit):
+        """
+        Wraps a select query so it returns the limit rows that follow
+        last_values in order_by order.
+
+        Unlike OFFSET, the database can seek straight to the first row of the
+        page (e.g. through the primary key index), so deep pages cost the same
+        as the first one. Returns the query and the params to execute it with.
+        """
+        query = query.strip().rstrip(';')
+        params = None
+
+        select_query = False
+        if (query.split()[0]).lower() == 'select':
+            select_query = True
+
+        if select_query:
+            columns = ', '.join(_quote_identifier(c) for c in order_by)
+            where = ''
+            if last_values:
+                # the query is passed through mogrify, so literal percent
+                # signs in it need escaping.
+                query = query.replace('%', '%%')
+                where = 'WHERE (%s) > (%s) ' % (
+                    columns, ', '.join(['%s'] * len(last_values)))
+                params = tuple(last_values)
+
+            query = ('select * from ( %s ) '
+                     'as BXCQWVPEMWVKFBEBNKZSRPYBSB '
+                     '%sORDER BY %s LIMIT %s;'
+                     % (query, where, columns, int(limit)))
+
+        return {'select_query': select_query, 'query': query, 'params': params}
+
+    def get_primary_key(self, repo, table):
+        """
+        Returns the table's primary key columns in key order, or an empty
+        list if it doesn't have one.
+        """
+        self._check_for_injections(repo)
+        self._validate_table_name(table)
+
+        query = ('SELECT kcu.column_name '
+                 'FROM information_schema.table_constraints tc '
+                 'JOIN information_schema.key_column_usage kcu '
+                 'ON tc.constraint_name = kcu.constraint_name '
+                 'AND tc.table_schema = kcu.table_schema '
+                 'AND tc.table_name = kcu.table_name '
+                 'WHERE tc.constraint_type = \'PRIMARY KEY\' '
+                 'AND tc.table_schema = %s AND tc.table_name = %s '
+                 'ORDER BY kcu.ordinal_position;')
+        params = (repo, table)
+        res = self.execute_sql(query, params)
+        return [t[0] for t in res['tuples']]
+
     def select_table_query(self, repo_base, repo, table):
         dh_table_name = '%s.%s.%s' % (repo_base, repo, table)
         query = 'SELECT * FROM %s;' % (dh_table_name)
         return query
 
-    def execute_sql(self, query, params=None):
+    def execute_sql(self, query, params=None, stream=False, batch_size=None):
+        """
+        Executes a query and returns a dict with status, row_count, tuples and
+        fields.
+
+        If stream=True and the query is a select query, the rows are read
+        through a server-side cursor in batches of batch_size, and 'tuples' is
+        a generator instead of a list. 'row_count' is -1 in that case, since
+        the number of rows isn't known until the generator is exhausted. The
+        connection can't be used for anything else until the generator is
+        exhausted or closed.
+        """
+        if stream and (query.split()[0]).lower() == 'select':
+            return self._execute_sql_stream(query, params, batch_size)
+
+        cur = self.connection.cursor()
+        try:
+            return self._execute_statement(cur, query, params)
+        finally:
+            cur.close()
+
+    def execute_batch(self, statements):
+        """
+        Executes (query, params) pairs in order, in a single transaction, and
+        returns a list of their results, as execute_sql would.
+
+        If a statement fails, the transaction is rolled back, and its error is
+        raised with the index of the statement as statement_index.
+        """
+        # Transactions need autocommit turned off until the batch is done.
+        self.connection.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
+        cur = self.connection.cursor()
+        results = []
+        try:
+            for query, params in statements:
+                results.append(self._execute_statement(cur, query, params))
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            e.statement_index = len(results)
+            raise
+        finally:
+            cur.close()
+            self.connection.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return results
+
+    def _execute_statement(self, cur, query, params=None):
         result = {
             'status': False,
             'row_count': 0,
@@ -554,7 +927,6 @@ class PGBackend:
         }
 
         query = query.strip()
-        cur = self.connection.cursor()
 
         try:
             sql_query = cur.mogrify(query, params)
@@ -567,6 +939,11 @@ class PGBackend:
             # Django.
             _convert_pg_exception(e)
 
+        # DDL run through any backend clears the repo_base's cached catalog
+        # queries, e.g. after create_table, delete_view or rename_repo.
+        if query and query.split(None, 1)[0].lower() in CATALOG_STATEMENTS:
+            _invalidate_catalog(self.repo_base)
+
         # if cur.execute() failed, this will print it.
         try:
             result['tuples'] = cur.fetchall()
@@ -581,9 +958,76 @@ class PGBackend:
             result['fields'] = [
                 {'name': col[0], 'type': col[1]} for col in cur.description]
 
-        cur.close()
         return result
 
+    def _execute_sql_stream(self, query, params=None, batch_size=None):
+        if batch_size is None:
+            batch_size = STREAM_BATCH_SIZE
+
+        result = {
+            'status': False,
+            'row_count': -1,
+            'tuples': [],
+            'fields': []
+        }
+
+        query = query.strip()
+        cur = self.connection.cursor()
+        try:
+            sql_query = cur.mogrify(query, params)
+            if self.row_level_security:
+                sql_query = self.query_rewriter.apply_row_level_security(
+                    sql_query)
+        except psycopg2.Error as e:
+            _convert_pg_exception(e)
+        finally:
+            cur.close()
+
+        # Named cursors only live inside a transaction, so autocommit is
+        # turned off until the stream is closed.
+        self.connection.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
+        cur = self.connection.cursor(name='dh_stream_%s' % uuid4().hex)
+        cur.itersize = batch_size
+
+        try:
+            cur.execute(sql_query)
+            # The description of a named cursor is only available after the
+            # first fetch.
+            first_batch = cur.fetchmany(batch_size)
+        except psycopg2.Error as e:
+            self._close_stream(cur)
+            _convert_pg_exception(e)
+
+        result['status'] = True
+        if cur.description:
+            result['fields'] = [
+                {'name': col[0], 'type': col[1]} for col in cur.description]
+        result['tuples'] = self._stream_rows(cur, first_batch, batch_size)
+        return result
+
+    def _stream_rows(self, cur, batch, batch_size):
+        try:
+            while batch:
+                for row in batch:
+                    yield row
+                batch = cur.fetchmany(batch_size)
+        except psycopg2.Error as e:
+            _convert_pg_exception(e)
+        finally:
+            self._close_stream(cur)
+
+    def _close_stream(self, cur):
+        # Closing a named cursor and rolling back the read-only transaction
+        # releases the server-side portal, then autocommit is restored for
+        # subsequent queries on this connection.
+        if not cur.closed:
+            cur.close()
+        if self.connection and not self.connection.closed:
+            self.connection.rollback()
+            self.connection.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+
     def user_exists(self, username):
         query = "SELECT 1 FROM pg_roles WHERE rolname=%s"
         params = (username,)
@@ -680,8 +1124,14 @@ class PGBackend:
                 self.execute_sql(query, params)
 
         # Make sure to close all extant connections to this database or the
-        # drop will fail.
+        # drop will fail. Other processes' pools may hold idle connections
+        # to it too, so end their backends as well.
         _close_all_connections(database)
+        _invalidate_catalog(database)
+        query = ('SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+                 'WHERE datname = %s AND pid <> pg_backend_pid();')
+        params = (database,)
+        self.execute_sql(query, params)
 
         # drop database
         query = 'DROP DATABASE %s;'
@@ -769,8 +1219,54 @@ class PGBackend:
         res = self.execute_sql(query, params)
         return res['tuples'][0][0]
 
+    def get_privileges(self, login):
+        """
+        returns every privilege that login has in the repo_base (database),
+        on it, its repos (schemas), their tables and views, and the columns
+        that have privileges of their own, as a list of
+        (repo, table, column, privileges) tuples. repo, table and column are
+        None where they don't apply, e.g. (None, None, None, ['CONNECT']) for
+        the repo_base. Columns that aren't listed have their table's
+        privileges.
+        """
+        query = (
+            "SELECT NULL::text, NULL::text, NULL::text, "
+            "ARRAY(SELECT p FROM unnest(%s::text[]) p "
+            "WHERE has_database_privilege(%s, current_database(), p)) "
+            "UNION ALL "
+            "SELECT n.nspname::text, NULL, NULL, "
+            "ARRAY(SELECT p FROM unnest(%s::text[]) p "
+            "WHERE has_schema_privilege(%s, n.oid, p)) "
+            "FROM pg_namespace n "
+            "WHERE n.nspname !~ '^pg_' AND n.nspname <> 'information_schema' "
+            "UNION ALL "
+            "SELECT n.nspname::text, c.relname::text, NULL, "
+            "ARRAY(SELECT p FROM unnest(%s::text[]) p "
+            "WHERE has_table_privilege(%s, c.oid, p)) "
+            "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relkind IN ('r', 'v', 'm', 'f') "
+            "AND n.nspname !~ '^pg_' AND n.nspname <> 'information_schema' "
+            "UNION ALL "
+            "SELECT n.nspname::text, c.relname::text, a.attname::text, "
+            "ARRAY(SELECT p FROM unnest(%s::text[]) p "
+            "WHERE has_column_privilege(%s, c.oid, a.attnum, p)) "
+            "FROM pg_attribute a "
+            "JOIN pg_class c ON c.oid = a.attrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE a.attacl IS NOT NULL AND a.attnum > 0 "
+            "AND NOT a.attisdropped "
+            "AND n.nspname !~ '^pg_' AND n.nspname <> 'information_schema';"
+        )
+        params = (
+            list(BASE_PRIVILEGES), login,
+            list(REPO_PRIVILEGES), login,
+            list(TABLE_PRIVILEGES), login,
+            list(COLUMN_PRIVILEGES), login)
+        res = self.execute_sql(query, params)
+        return res['tuples']
+
     def export_table(self, table_name, file_path, file_format='CSV',
-                     delimiter=',', header=True):
+                     delimiter=',', header=True, progress=None):
         words = table_name.split('.')
         for word in words[:-1]:
             self._check_for_injections(word)
@@ -784,10 +1280,11 @@ class PGBackend:
             file_path,
             file_format=file_format,
             delimiter=delimiter,
-            header=header)
+            header=header,
+            progress=progress)
 
     def export_view(self, view_name, file_path, file_format='CSV',
-                    delimiter=',', header=True):
+                    delimiter=',', header=True, progress=None):
         words = view_name.split('.')
         for word in words[:-1]:
             self._check_for_injections(word)
@@ -801,14 +1298,21 @@ class PGBackend:
             file_path,
             file_format=file_format,
             delimiter=delimiter,
-            header=header)
+            header=header,
+            progress=progress)
 
     def export_query(self, query, file_path, file_format='CSV',
-                     delimiter=',', header=True):
+                     delimiter=',', header=True, progress=None):
         """
         Runs a query as the current user and saves the result to a file.
 
-        query can be a sql query or table reference.
+        query can be a sql query or table reference. If given, progress is
+        called with the number of bytes written after every write.
+
+        file_format is anything COPY can write, e.g. CSV, or one of the
+        columnar formats, ARROW or PARQUET. Those are streamed from a
+        server-side cursor and written with pyarrow, and ignore delimiter and
+        header.
         """
         header_option = 'HEADER' if header else ''
         query = query.split(';')[0].strip()
@@ -816,17 +1320,17 @@ class PGBackend:
         self._check_for_injections(file_format)
         self._check_for_injections(header_option)
 
-        meta_query = 'COPY (%s) TO STDOUT WITH %s %s DELIMITER %s;'
-        params = (AsIs(query), AsIs(file_format),
-                  AsIs(header_option), delimiter)
-
         cur = self.connection.cursor()
-        query = cur.mogrify(meta_query, params)
+        if not columnar.is_columnar(file_format):
+            meta_query = 'COPY (%s) TO STDOUT WITH %s %s DELIMITER %s;'
+            params = (AsIs(query), AsIs(file_format),
+                      AsIs(header_option), delimiter)
+            query = cur.mogrify(meta_query, params)
 
         # Store pending exports in a temporary location so they're aren't
         # discoverable while being exported.
         tmp_path = '/tmp/user_exports/{0}-{1}'.format(
-            uuid4().hex, hashlib.sha256(query).hexdigest())
+            uuid4().hex, hashlib.sha256(_utf8(query)).hexdigest())
         try:
             os.makedirs('/tmp/user_exports')
         except OSError as e:
@@ -835,11 +1339,20 @@ class PGBackend:
 
         try:
             with open(tmp_path, 'w') as f:
-                cur.copy_expert(query, f)
+                if columnar.is_columnar(file_format):
+                    self._export_columnar(query, f, file_format, progress)
+                else:
+                    if progress is not None:
+                        f = _ProgressFile(f, progress)
+                    cur.copy_expert(query, f)
         except psycopg2.Error as e:
             # Delete the temporary files of failed exports.
             os.remove(tmp_path)
             _convert_pg_exception(e)
+        except Exception:
+            # e.g. progress cancelling the export
+            os.remove(tmp_path)
+            raise
         finally:
             cur.close()
         # Move successful exports into the user's data folder.
@@ -847,10 +1360,27 @@ class PGBackend:
         # different filesystems, so use shutil.move() instead.
         shutil.move(tmp_path, file_path)
 
+    def _export_columnar(self, query, f, file_format, progress=None):
+        result = self._execute_sql_stream(
+            query, batch_size=COLUMNAR_BATCH_SIZE)
+        rows = result['tuples']
+        try:
+            columnar.write_rows(result['fields'], rows, f, file_format,
+                                COLUMNAR_BATCH_SIZE, progress)
+        finally:
+            # releases the server-side cursor if writing stopped early
+            rows.close()
+
     def import_file(self, table_name, file_path, file_format='CSV',
                     delimiter=',', header=True, encoding='ISO-8859-1',
-                    quote_character='"'):
+                    quote_character='"', progress=None):
+        """
+        Loads a file into an existing table, dropping the table on failure.
 
+        The database server reads the file itself, unless progress is given.
+        Then the file is streamed to the server, and progress is called with
+        the number of bytes read after every read.
+        """
         header_option = 'HEADER' if header else ''
 
         words = table_name.split('.')
@@ -860,10 +1390,20 @@ class PGBackend:
         self._check_for_injections(file_format)
 
         query = 'COPY %s FROM %s WITH %s %s DELIMITER %s ENCODING %s QUOTE %s;'
-        params = (AsIs(table_name), file_path, AsIs(file_format),
+        source = file_path if progress is None else AsIs('STDIN')
+        params = (AsIs(table_name), source, AsIs(file_format),
                   AsIs(header_option), delimiter, encoding, quote_character)
         try:
-            self.execute_sql(query, params)
+            if progress is None:
+                self.execute_sql(query, params)
+            else:
+                with open(file_path, 'rb') as f:
+                    cur = self.connection.cursor()
+                    try:
+                        cur.copy_expert(cur.mogrify(query, params),
+                                        _ProgressFile(f, progress))
+                    finally:
+                        cur.close()
         except Exception as e:
             self.execute_sql('DROP TABLE IF EXISTS %s', (AsIs(table_name),))
             raise ImportError(e)
@@ -872,40 +1412,123 @@ class PGBackend:
             # RogerTangos 2015-12-09
             # return self.import_file_w_dbtruck(table_name, file_path)
 
-    def import_rows(self, repo, table, rows, delimiter=',', header=False):
-        # if there was a header, remove it
-        if header:
-            rows = rows[1:len(rows)]
+    def copy_rows(self, repo, table, columns, rows):
+        """
+        Loads rows into the given columns of an existing table, with a single
+        COPY ... FROM STDIN.
 
-        query = 'INSERT INTO %s.%s values '
-        params = [AsIs(repo), AsIs(table)]
+        rows are sequences of unicode strings, or None for NULL. Postgres
+        parses each value as its column's type, so a bad value rejects the
+        whole COPY with a DataError, and no rows are loaded. Returns the
+        number of rows loaded.
+        """
+        self._check_for_injections(repo)
+        self._validate_table_name(table)
 
-        # prepare query
-        all_row_array = []
+        if self.row_level_security:
+            # COPY bypasses the query rewriter, so check the user's insert
+            # policies the same way an INSERT would. Raises if denied.
+            self.query_rewriter.apply_row_level_security(
+                'INSERT INTO %s.%s VALUES (NULL)' % (repo, table))
+
+        # NULLs are unquoted empty fields, and every other value is quoted,
+        # so empty strings stay empty strings.
+        data = io.BytesIO()
         for row in rows:
+            data.write(','.join(
+                '' if value is None else
+                '"%s"' % _utf8(value).replace('"', '""')
+                for value in row) + '\n')
+        data.seek(0)
 
-            # split the string into an array
-            row = row.split(delimiter)
+        cur = self.connection.cursor()
+        try:
+            cur.copy_expert(cur.mogrify(
+                'COPY %s.%s (%s) FROM STDIN WITH (FORMAT csv, ENCODING %s)',
+                (AsIs(repo), AsIs(table),
+                 AsIs(', '.join(_quote_identifier(c) for c in columns)),
+                 'UTF8')), data)
+            return cur.rowcount
+        finally:
+            cur.close()
 
-            # add the objects to params
-            params += row
+    def import_rows(self, repo, table, rows, delimiter=',', header=False,
+                    batch_size=None, stop_on_error=True):
+        """
+        Loads delimited lines of text into an existing table.
 
-            # turn every item in the array into a %s
-            # and make a string out of it
-            row_array = ['%s' for c in row]
-            row_array = ', '.join(row_array)
-            row_array = '(' + row_array + ')'
+        rows can be any iterable of lines. They are streamed into the table
+        with COPY ... FROM STDIN, batch_size rows at a time, and every batch
+        is committed on its own, so memory use doesn't grow with the number
+        of rows.
 
-            all_row_array.append(row_array)
+        Returns a dict with the overall status, the number of rows loaded and
+        an error entry for every batch that failed. Raises ImportError on the
+        first failed batch, unless stop_on_error is False.
+        """
+        self._check_for_injections(repo)
+        self._validate_table_name(table)
 
-        all_row_string = ', '.join(all_row_array)
+        if batch_size is None:
+            batch_size = COPY_BATCH_SIZE
 
-        # finalize the query and params
-        query += all_row_string
-        params = tuple(params)
+        if self.row_level_security:
+            # COPY bypasses the query rewriter, so check the user's insert
+            # policies the same way an INSERT would. Raises if denied.
+            self.query_rewriter.apply_row_level_security(
+                'INSERT INTO %s.%s VALUES (NULL)' % (repo, table))
+
+        # if there was a header, skip it
+        rows = iter(rows)
+        first_row = 1
+        if header:
+            next(rows, None)
+            first_row = 2
 
-        res = self.execute_sql(query, params)
-        return res['status']
+        result = {
+            'status': True,
+            'row_count': 0,
+            'errors': []
+        }
+
+        cur = self.connection.cursor()
+        query = cur.mogrify(
+            'COPY %s.%s FROM STDIN WITH (FORMAT csv, ENCODING %s)',
+            (AsIs(repo), AsIs(table), 'UTF8'))
+
+        try:
+            for batch_number, batch in enumerate(_batches(rows, batch_size)):
+                # Quote every value so that empty strings aren't read as
+                # NULLs, matching what an INSERT of the same values does.
+                data = io.BytesIO()
+                writer = csv.writer(data, quoting=csv.QUOTE_ALL)
+                for row in batch:
+                    writer.writerow([_utf8(v) for v in row.split(delimiter)])
+                data.seek(0)
+
+                last_row = first_row + len(batch) - 1
+                try:
+                    cur.copy_expert(query, data)
+                except psycopg2.Error as e:
+                    error = {
+                        'batch': batch_number,
+                        'first_row': first_row,
+                        'last_row': last_row,
+                        'error': (e.pgerror or str(e)).strip()
+                    }
+                    result['status'] = False
+                    result['errors'].append(error)
+                    if stop_on_error:
+                        raise ImportError(
+                            'Failed to import rows %s to %s: %s' % (
+                                first_row, last_row, error['error']))
+                else:
+                    result['row_count'] += len(batch)
+                first_row = last_row + 1
+        finally:
+            cur.close()
+
+        return result
 
     def import_file_w_dbtruck(self, table_name, file_path):
         # dbtruck is not tested for safety. At all. It's currently disabled
@@ -1280,6 +1903,56 @@ class PGBackend:
         res = self.execute_sql(query, params)
         return res['status']
 
+    def list_security_policy_tables(self):
+        '''
+        Returns the (repo_base, repo, table) of every table that has security
+        policies in the policy table.
+        '''
+        query = ('SELECT DISTINCT repo_base, repo, table_name '
+                 'FROM %s.%s ORDER BY repo_base, repo, table_name')
+        params = (AsIs(settings.POLICY_SCHEMA), AsIs(settings.POLICY_TABLE))
+        res = self.execute_sql(query, params)
+        return res['tuples']
+
+    def sync_row_level_security(self, repo, table, policies):
+        '''
+        Replaces the native Postgres policies that DataHub manages on
+        repo.table with ones compiled from policies, a list of
+        (policy, policy_type, grantee) tuples from the policy table, and
+        enables row level security on the table if there are any, or
+        disables it if there aren't.
+
+        Must be run by the table's owner, on PostgreSQL 9.5 or later.
+        '''
+        self._check_for_injections(repo)
+        self._validate_table_name(table)
+        table_name = '%s.%s' % (repo, table)
+
+        query = ('SELECT polname FROM pg_policy '
+                 'WHERE polrelid = %s::regclass AND polname LIKE %s')
+        params = (table_name, NATIVE_POLICY_PREFIX.replace('_', '\\_') + '%')
+        res = self.execute_sql(query, params)
+        existing = [row[0] for row in res['tuples']]
+
+        grantees = list(set(policy[2] for policy in policies))
+        query = 'SELECT rolname FROM pg_roles WHERE rolname = ANY(%s)'
+        roles = [row[0] for row in
+                 self.execute_sql(query, (grantees,))['tuples']]
+
+        statements = [('DROP POLICY %s ON %s;',
+                       (AsIs(_quote_identifier(name)), AsIs(table_name)))
+                      for name in existing]
+        if policies:
+            statements.extend(_compile_native_policies(
+                table_name, policies, roles))
+            statements.append(('ALTER TABLE %s ENABLE ROW LEVEL SECURITY;',
+                               (AsIs(table_name),)))
+        else:
+            statements.append(('ALTER TABLE %s DISABLE ROW LEVEL SECURITY;',
+                               (AsIs(table_name),)))
+        self.execute_batch(statements)
+        return True
+
     def can_user_access_rls_table(self,
                                   username,
                                   permissions=['SELECT', 'UPDATE', 'INSERT']):
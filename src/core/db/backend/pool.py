@@ -0,0 +1,279 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+'''
+Connection pooling for PGBackend.
+
+Every distinct (user, password, repo_base) gets its own ConnectionPool, but
+all pools share one ConnectionPoolManager, which caps the total number of
+open connections, reuses idle connections, and closes connections and pools
+that have sat idle for too long.
+'''
+
+PoolKey = namedtuple('PoolKey', 'user, password, repo_base')
+
+
+class ConnectionPool(object):
+    """
+    The connections for a single set of credentials.
+
+    Connections are checked out and returned through the manager that owns
+    the pool, so that the manager's limits and counters stay accurate.
+    """
+
+    def __init__(self, manager, key, **connect_kwargs):
+        self.manager = manager
+        self.key = key
+        self.connect_kwargs = connect_kwargs
+        self.closed = False
+        self.in_use = 0
+        # (time returned, connection) pairs, most recently returned last
+        self.idle = []
+        self.last_used = time.time()
+
+    def getconn(self):
+        return self.manager.getconn(self)
+
+    def putconn(self, conn, close=False):
+        self.manager.putconn(self, conn, close=close)
+
+    def closeall(self):
+        self.manager.close_pool(self)
+
+
+class ConnectionPoolManager(object):
+    """
+    Hands out pooled connections while enforcing global limits.
+
+    At most max_connections connections are open across all pools, and at
+    most max_pool_connections are checked out of any single pool. When the
+    global limit is reached, the least recently used idle connection is
+    closed to make room. If no connection is idle, callers wait up to
+    wait_timeout seconds for one to be returned before PoolError is raised.
+
+    Idle connections and unused pools are closed after idle_timeout seconds.
+
+    hits, misses, waits and evictions count connections reused from a pool,
+    newly opened connections, checkouts that had to wait, and idle
+    connections closed by the manager.
+    """
+
+    def __init__(self, max_connections=100, max_pool_connections=10,
+                 idle_timeout=300, wait_timeout=10, connect=None):
+        self.max_connections = max_connections
+        self.max_pool_connections = max_pool_connections
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self._connect = connect or psycopg2.connect
+
+        self.open_connections = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+        # pools in least to most recently used order
+        self._pools = OrderedDict()
+        self._condition = threading.Condition()
+        self._next_sweep = time.time() + idle_timeout
+
+    def __len__(self):
+        return len(self._pools)
+
+    def __contains__(self, key):
+        return key in self._pools
+
+    def __getitem__(self, key):
+        return self._pools[key]
+
+    def get_pool(self, key, create_if_missing=True, **connect_kwargs):
+        """
+        Returns the pool for key, creating it from connect_kwargs if needed.
+
+        Returns None if there is no open pool and create_if_missing is False.
+        """
+        with self._condition:
+            pool = self._pools.get(key)
+            if pool is None or pool.closed:
+                if not create_if_missing:
+                    return None
+                pool = ConnectionPool(self, key, **connect_kwargs)
+                self._pools[key] = pool
+            return pool
+
+    def getconn(self, pool):
+        """
+        Checks a connection out of pool.
+
+        Raises PoolError if the pool is closed, or if no connection became
+        available within wait_timeout seconds.
+        """
+        deadline = None
+        with self._condition:
+            self._sweep()
+            while True:
+                if pool.closed:
+                    raise PoolError('connection pool is closed')
+
+                if pool.idle:
+                    conn = pool.idle.pop()[1]
+                    if conn.closed:
+                        # dropped by the server while it sat idle
+                        self.open_connections -= 1
+                        continue
+                    pool.in_use += 1
+                    self.hits += 1
+                    self._touch(pool)
+                    return conn
+
+                if (pool.in_use < self.max_pool_connections and
+                        (self.open_connections < self.max_connections or
+                         self._evict_lru_connection())):
+                    # reserve the slot, then connect outside of the lock
+                    pool.in_use += 1
+                    self.open_connections += 1
+                    self.misses += 1
+                    self._touch(pool)
+                    break
+
+                now = time.time()
+                if deadline is None:
+                    deadline = now + self.wait_timeout
+                    self.waits += 1
+                if now >= deadline:
+                    raise PoolError('connection pool exhausted')
+                self._condition.wait(deadline - now)
+
+        try:
+            return self._connect(**pool.connect_kwargs)
+        except Exception:
+            with self._condition:
+                pool.in_use -= 1
+                self.open_connections -= 1
+                # waiters may be waiting on different pools' limits
+                self._condition.notify_all()
+            raise
+
+    def putconn(self, pool, conn, close=False):
+        """
+        Returns a connection to pool, or closes it if close is True.
+
+        Like psycopg2's pools, connections left in a transaction are rolled
+        back, and connections in an unknown state are closed.
+        """
+        if not close and not pool.closed and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        if close or pool.closed:
+            _close_quietly(conn)
+
+        with self._condition:
+            pool.in_use -= 1
+            self._touch(pool)
+            if not conn.closed and self._pools.get(pool.key) is not pool:
+                # another pool has replaced this one since it was dropped,
+                # so nothing would ever reuse or expire the connection
+                _close_quietly(conn)
+            if conn.closed:
+                self.open_connections -= 1
+            else:
+                pool.idle.append((time.time(), conn))
+            # waiters may be waiting on different pools' limits
+            self._condition.notify_all()
+
+    def close_pool(self, pool):
+        """Closes pool's idle connections, and the rest as they return."""
+        with self._condition:
+            self._close_pool(pool)
+            self._condition.notify_all()
+
+    def close_pools(self, predicate):
+        """Closes every pool whose key satisfies predicate(key)."""
+        with self._condition:
+            for pool in [p for k, p in self._pools.items() if predicate(k)]:
+                self._close_pool(pool)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'pools': len(self._pools),
+                'open_connections': self.open_connections,
+                'idle_connections': sum(
+                    len(p.idle) for p in self._pools.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'evictions': self.evictions,
+            }
+
+    def _touch(self, pool):
+        # Moves pool to the most recently used end. A pool that was dropped
+        # while idle, but that a caller still held, is registered again,
+        # unless it was closed or another pool has since taken its place.
+        pool.last_used = time.time()
+        current = self._pools.get(pool.key)
+        if current is pool:
+            del self._pools[pool.key]
+        if current is pool or (current is None and not pool.closed):
+            self._pools[pool.key] = pool
+
+    def _close_pool(self, pool):
+        pool.closed = True
+        for returned_at, conn in pool.idle:
+            _close_quietly(conn)
+            self.open_connections -= 1
+        pool.idle = []
+        if self._pools.get(pool.key) is pool:
+            del self._pools[pool.key]
+
+    def _evict_lru_connection(self):
+        # Closes the least recently returned idle connection of the least
+        # recently used pool that has one. Returns False if none are idle.
+        for pool in list(self._pools.values()):
+            if pool.idle:
+                returned_at, conn = pool.idle.pop(0)
+                _close_quietly(conn)
+                self.open_connections -= 1
+                self.evictions += 1
+                if not pool.idle and not pool.in_use:
+                    del self._pools[pool.key]
+                return True
+        return False
+
+    def _sweep(self):
+        # Closes connections and pools that have been idle for longer than
+        # idle_timeout. Runs at most once every idle_timeout seconds.
+        now = time.time()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.idle_timeout
+
+        expired = now - self.idle_timeout
+        for pool in list(self._pools.values()):
+            while pool.idle and pool.idle[0][0] < expired:
+                returned_at, conn = pool.idle.pop(0)
+                _close_quietly(conn)
+                self.open_connections -= 1
+                self.evictions += 1
+            if not pool.idle and not pool.in_use and pool.last_used < expired:
+                del self._pools[pool.key]
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
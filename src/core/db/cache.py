@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+
+'''
+In-process caches for database metadata.
+
+Each Django/Thrift worker process keeps its own caches, so anything cached
+here must either be invalidated by the code that changes it, or tolerate
+being stale for at most the cache's ttl in other processes.
+'''
+
+
+class LRUCache(object):
+    """
+    A thread-safe least recently used cache with an optional time to live.
+
+    Keys must be hashable. Entries older than ttl seconds are treated as
+    missing. clear() drops every entry and bumps the cache's generation, so
+    callers can fold the generation into derived cache keys to invalidate
+    them as well.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, _missing)
+            if entry is _missing or self._expired(entry):
+                self.misses += 1
+                return default
+
+            # re-insert to mark the entry as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time(), value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, predicate):
+        """Removes every entry whose key satisfies predicate(key)."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        return {'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'generation': self.generation}
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.time() - entry[0] > self.ttl
+
+
+_missing = object()
@@ -0,0 +1,148 @@
+import json
+
+'''
+Writing query results in columnar formats.
+
+Rows are converted to Apache Arrow record batches as they're read, so that
+results larger than memory can be exported, and written either as an Arrow
+IPC file (the format Feather v2 uses) or as Parquet, compressed and with
+column statistics.
+
+pyarrow is only imported when a columnar export is asked for, so that the
+rest of DataHub doesn't need it.
+'''
+
+# Export formats written with pyarrow rather than COPY.
+FORMATS = ('ARROW', 'PARQUET')
+
+PARQUET_COMPRESSION = 'snappy'
+
+# Postgres type oid: Arrow type name, for the types with a lossless Arrow
+# equivalent. Everything else, e.g. numeric, json and arrays, is written as
+# its text representation.
+_ARROW_TYPES = {
+    16: 'bool_',
+    17: 'binary',
+    20: 'int64',
+    21: 'int16',
+    23: 'int32',
+    700: 'float32',
+    701: 'float64',
+    1082: 'date32',
+}
+_TIMESTAMP = 1114
+_TIMESTAMPTZ = 1184
+
+
+def is_columnar(file_format):
+    return file_format.upper() in FORMATS
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError('pyarrow must be installed to export to Arrow or '
+                         'Parquet.')
+    return pyarrow
+
+
+def _to_text(value):
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return unicode(value)
+
+
+def _to_utc(value):
+    # Arrow stores timezone-aware timestamps as naive UTC.
+    offset = value.utcoffset()
+    if offset is not None:
+        value = (value - offset).replace(tzinfo=None)
+    return value
+
+
+def _column(pa, type_code):
+    # Returns the Arrow type of a Postgres type, and the conversion applied
+    # to its values first, if any.
+    if type_code in _ARROW_TYPES:
+        arrow_type = getattr(pa, _ARROW_TYPES[type_code])()
+        convert = bytes if type_code == 17 else None
+        return arrow_type, convert
+    if type_code == _TIMESTAMP:
+        return pa.timestamp('us'), None
+    if type_code == _TIMESTAMPTZ:
+        return pa.timestamp('us', tz='UTC'), _to_utc
+    return pa.string(), _to_text
+
+
+def write_rows(fields, rows, f, file_format, batch_size, progress=None):
+    """
+    Writes rows to the open file f as an Arrow IPC or Parquet file.
+
+    fields are the {'name', 'type'} dicts execute_sql returns, where type is
+    the Postgres type oid. If given, progress is called with the number of
+    bytes written after every batch of batch_size rows.
+
+    Raises ValueError if pyarrow isn't installed or file_format isn't
+    columnar.
+    """
+    pa = _pyarrow()
+    file_format = file_format.upper()
+    if file_format not in FORMATS:
+        raise ValueError('Unknown columnar format: %s' % file_format)
+
+    columns = [_column(pa, field['type']) for field in fields]
+    schema = pa.schema([pa.field(field['name'], arrow_type)
+                        for field, (arrow_type, _) in zip(fields, columns)])
+
+    if file_format == 'PARQUET':
+        writer = pa.parquet.ParquetWriter(
+            f, schema, compression=PARQUET_COMPRESSION,
+            write_statistics=True)
+
+        def write(batch):
+            writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer = pa.RecordBatchFileWriter(f, schema)
+        write = writer.write_batch
+
+    written = 0
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) < batch_size:
+                continue
+            write(_record_batch(pa, schema, columns, batch))
+            batch = []
+            written = _report(f, progress, written)
+        if batch:
+            write(_record_batch(pa, schema, columns, batch))
+    finally:
+        writer.close()
+    _report(f, progress, written)
+
+
+def _record_batch(pa, schema, columns, rows):
+    arrays = []
+    for i, (arrow_type, convert) in enumerate(columns):
+        values = [row[i] for row in rows]
+        if convert is not None:
+            values = [None if v is None else convert(v) for v in values]
+        arrays.append(pa.array(values, type=arrow_type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _report(f, progress, written):
+    # Calls progress with the bytes written since written, and returns the
+    # number written so far.
+    if progress is None:
+        return written
+    position = f.tell()
+    progress(position - written)
+    return position
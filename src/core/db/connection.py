@@ -109,23 +109,52 @@ class DataHubConnection:
     def get_schema(self, repo, table):
         return self.backend.get_schema(repo=repo, table=table)
 
-    def explain_query(self, query):
-        return self.backend.explain_query(query=query)
+    def explain_query(self, query, params=None):
+        return self.backend.explain_query(query=query, params=params)
+
+    def create_trigram_index(self, repo, table, column):
+        return self.backend.create_trigram_index(
+            repo=repo, table=table, column=column)
+
+    def list_query_tables(self, query):
+        return self.backend.list_query_tables(query=query)
+
+    def get_table_versions(self, tables):
+        return self.backend.get_table_versions(tables=tables)
 
     def limit_and_offset_select_query(self, query, limit, offset):
         return self.backend.limit_and_offset_select_query(
             query=query, limit=limit, offset=offset)
 
+    def keyset_select_query(self, query, order_by, last_values, limit):
+        return self.backend.keyset_select_query(
+            query=query, order_by=order_by, last_values=last_values,
+            limit=limit)
+
+    def get_primary_key(self, repo, table):
+        return self.backend.get_primary_key(repo=repo, table=table)
+
     def select_table_query(self, repo_base, repo, table):
         return self.backend.select_table_query(
             repo_base=repo_base, repo=repo, table=table)
 
+    def copy_rows(self, repo, table, columns, rows):
+        return self.backend.copy_rows(
+            repo=repo, table=table, columns=columns, rows=rows)
+
     def import_rows(
-            self, repo, table, rows, delimiter=',', header=False):
-        return self.backend.import_rows(repo, table, rows, delimiter, header)
+            self, repo, table, rows, delimiter=',', header=False,
+            batch_size=None, stop_on_error=True):
+        return self.backend.import_rows(
+            repo, table, rows, delimiter, header,
+            batch_size=batch_size, stop_on_error=stop_on_error)
+
+    def execute_sql(self, query, params=None, stream=False, batch_size=None):
+        return self.backend.execute_sql(
+            query, params, stream=stream, batch_size=batch_size)
 
-    def execute_sql(self, query, params=None):
-        return self.backend.execute_sql(query, params)
+    def execute_batch(self, statements):
+        return self.backend.execute_batch(statements=statements)
 
     def has_base_privilege(self, login, privilege):
         return self.backend.has_base_privilege(
@@ -143,6 +172,9 @@ class DataHubConnection:
         return self.backend.has_column_privilege(
             login=login, table=table, column=column, privilege=privilege)
 
+    def get_privileges(self, login):
+        return self.backend.get_privileges(login=login)
+
     '''
     The following methods works only in superuser mode
     '''
@@ -179,7 +211,7 @@ class DataHubConnection:
 
     def import_file(self, table_name, file_path, file_format='CSV',
                     delimiter=',', header=True, encoding='ISO-8859-1',
-                    quote_character='"'):
+                    quote_character='"', progress=None):
         return self.backend.import_file(
             table_name=table_name,
             file_path=file_path,
@@ -187,34 +219,38 @@ class DataHubConnection:
             delimiter=delimiter,
             header=header,
             encoding=encoding,
-            quote_character=quote_character)
+            quote_character=quote_character,
+            progress=progress)
 
     def export_table(self, table_name, file_path, file_format='CSV',
-                     delimiter=',', header=True):
+                     delimiter=',', header=True, progress=None):
         return self.backend.export_table(
             table_name=table_name,
             file_path=file_path,
             file_format=file_format,
             delimiter=delimiter,
-            header=header)
+            header=header,
+            progress=progress)
 
     def export_view(self, view_name, file_path, file_format='CSV',
-                    delimiter=',', header=True):
+                    delimiter=',', header=True, progress=None):
         return self.backend.export_view(
             view_name=view_name,
             file_path=file_path,
             file_format=file_format,
             delimiter=delimiter,
-            header=header)
+            header=header,
+            progress=progress)
 
     def export_query(self, query, file_path, file_format='CSV',
-                     delimiter=',', header=True):
+                     delimiter=',', header=True, progress=None):
         return self.backend.export_query(
             query=query,
             file_path=file_path,
             file_format=file_format,
             delimiter=delimiter,
-            header=header)
+            header=header,
+            progress=progress)
 
     def list_collaborators(self, repo):
         return self.backend.list_collaborators(repo)
@@ -299,6 +335,13 @@ class DataHubConnection:
     def remove_security_policy(self, policy_id):
         return self.backend.remove_security_policy(policy_id)
 
+    def list_security_policy_tables(self):
+        return self.backend.list_security_policy_tables()
+
+    def sync_row_level_security(self, repo, table, policies):
+        return self.backend.sync_row_level_security(
+            repo=repo, table=table, policies=policies)
+
     def can_user_access_rls_table(self,
                                   username,
                                   permissions=['SELECT', 'UPDATE', 'INSERT']):
@@ -0,0 +1,226 @@
+import Queue
+import csv
+import io
+import itertools
+import re
+import threading
+
+import psycopg2
+
+'''
+Typed, parallel loading of delimited files into tables.
+
+Column types are inferred from a sample of the file's first rows. The rows
+are then checked against those types as the file is parsed, and loaded in
+batches with COPY ... FROM STDIN over several connections at once. Rows that
+don't fit, or that Postgres rejects, are set aside with the reason why
+instead of failing the whole import.
+'''
+
+# Column types, from the most to the least specific. Single word names, so
+# that they pass the backend's identifier checks.
+COLUMN_TYPES = ('boolean', 'integer', 'bigint', 'float8', 'date',
+                'timestamp', 'timestamptz', 'text')
+
+_BOOLEANS = frozenset(['true', 'false', 't', 'f', 'yes', 'no', 'y', 'n'])
+_INTEGER_RE = re.compile(r'^[+-]?\d+$')
+_FLOAT_RE = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$')
+_DATE = r'\d{4}-\d{1,2}-\d{1,2}'
+_TIME = r'[ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?'
+_DATE_RE = re.compile(r'^%s$' % _DATE)
+_TIMESTAMP_RE = re.compile(r'^%s(%s)?$' % (_DATE, _TIME))
+_TIMESTAMPTZ_RE = re.compile(
+    r'^%s(%s\s*(Z|[+-]\d{2}(:?\d{2})?)?)?$' % (_DATE, _TIME))
+
+
+def _is_integer(value, bits):
+    return (bool(_INTEGER_RE.match(value)) and
+            -2 ** (bits - 1) <= int(value) < 2 ** (bits - 1))
+
+
+# type: whether a non-empty, stripped value can be loaded as that type
+TYPE_CHECKS = {
+    'boolean': lambda v: v.lower() in _BOOLEANS,
+    'integer': lambda v: _is_integer(v, 32),
+    'bigint': lambda v: _is_integer(v, 64),
+    'float8': lambda v: bool(_FLOAT_RE.match(v)),
+    'date': lambda v: bool(_DATE_RE.match(v)),
+    'timestamp': lambda v: bool(_TIMESTAMP_RE.match(v)),
+    'timestamptz': lambda v: bool(_TIMESTAMPTZ_RE.match(v)),
+    'text': lambda v: True,
+}
+
+
+def infer_types(rows, ncolumns):
+    """
+    Returns the most specific type that fits every value of each of the
+    ncolumns columns of rows. Empty values fit any type, and columns with
+    only empty values are text.
+    """
+    candidates = [list(COLUMN_TYPES) for i in range(ncolumns)]
+    for row in rows:
+        for i, value in enumerate(row[:ncolumns]):
+            value = value.strip()
+            if value and len(candidates[i]) > 1:
+                candidates[i] = [
+                    t for t in candidates[i] if TYPE_CHECKS[t](value)]
+    return [c[0] if len(c) < len(COLUMN_TYPES) else 'text'
+            for c in candidates]
+
+
+def convert_row(row, types):
+    """
+    Returns row with empty values replaced by None, for NULL.
+
+    Raises ValueError if the row has the wrong number of values, or a value
+    that doesn't fit its column's type.
+    """
+    if len(row) != len(types):
+        raise ValueError('Expected %d values, found %d.' % (
+            len(types), len(row)))
+
+    values = []
+    for value, column_type in zip(row, types):
+        if value == '' or (column_type != 'text' and not value.strip()):
+            values.append(None)
+            continue
+        if not TYPE_CHECKS[column_type](value.strip()):
+            raise ValueError('Invalid %s: %s' % (column_type, value))
+        values.append(value)
+    return values
+
+
+class ParallelLoader(object):
+    """
+    Loads rows into a table over several connections at once.
+
+    connect() must return a context manager for a DataHubConnection, and is
+    called once per loading thread. Rows that can't be loaded are written to
+    a rejects table, made by calling create_rejects_table() the first time
+    one is rejected, with the line they came from and the reason why.
+    """
+
+    def __init__(self, connect, repo, table, columns, types,
+                 create_rejects_table, connections=4, batch_size=10000,
+                 delimiter=','):
+        self.connect = connect
+        self.repo = repo
+        self.table = table
+        self.columns = columns
+        self.types = types
+        self.create_rejects_table = create_rejects_table
+        self.connections = connections
+        self.batch_size = batch_size
+        self.delimiter = delimiter
+
+        self.row_count = 0
+        self.rejected = 0
+        self.rejects_table = None
+
+        self._lock = threading.Lock()
+        self._error = None
+        self._queue = Queue.Queue(maxsize=connections * 2)
+
+    def load(self, rows):
+        """
+        Loads rows, (line number, values) pairs, and returns the number of
+        rows loaded.
+
+        Raises the first error that isn't about a particular row, e.g. a
+        lost connection, after the loading threads have stopped.
+        """
+        threads = [threading.Thread(target=self._work)
+                   for i in range(self.connections)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for batch in self._batches(rows):
+                if self._error is not None:
+                    break
+                self._queue.put(batch)
+        finally:
+            # one sentinel per thread, then wait for them to finish
+            for thread in threads:
+                self._queue.put(None)
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+        return self.row_count
+
+    def _batches(self, rows):
+        # Checks the rows against the column types as they're read, so that
+        # most bad rows never reach the database.
+        while True:
+            good, bad = [], []
+            for line_number, values in itertools.islice(
+                    rows, self.batch_size):
+                try:
+                    good.append((line_number, convert_row(values, self.types)))
+                except ValueError as e:
+                    bad.append((line_number, values, e.args[0]))
+            if not good and not bad:
+                return
+            yield good, bad
+
+    def _work(self):
+        try:
+            with self.connect() as conn:
+                while True:
+                    batch = self._queue.get()
+                    if batch is None:
+                        return
+                    if self._error is None:
+                        self._load_batch(conn, *batch)
+        except Exception as e:
+            with self._lock:
+                self._error = self._error or e
+            # keep taking batches, so that load() doesn't block on put()
+            while self._queue.get() is not None:
+                pass
+
+    def _load_batch(self, conn, good, bad):
+        loaded = self._copy(conn, good, bad)
+        with self._lock:
+            self.row_count += loaded
+        if bad:
+            self._reject(conn, bad)
+
+    def _copy(self, conn, rows, bad):
+        # Loads rows, bisecting batches that Postgres rejects to find the
+        # rows at fault, which are added to bad. Returns the number loaded.
+        if not rows:
+            return 0
+        try:
+            conn.copy_rows(self.repo, self.table, self.columns,
+                           [values for line_number, values in rows])
+            return len(rows)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            if len(rows) == 1:
+                line_number, values = rows[0]
+                error = (e.pgerror or str(e)).decode('utf-8', 'replace')
+                bad.append((line_number, values, error))
+                return 0
+        middle = len(rows) // 2
+        return (self._copy(conn, rows[:middle], bad) +
+                self._copy(conn, rows[middle:], bad))
+
+    def _reject(self, conn, bad):
+        with self._lock:
+            if self.rejects_table is None:
+                self.rejects_table = self.create_rejects_table()
+            self.rejected += len(bad)
+
+        rows = []
+        for line_number, values, error in bad:
+            line = io.BytesIO()
+            csv.writer(line, delimiter=self.delimiter).writerow(
+                [v.encode('utf-8') if v else '' for v in values])
+            rows.append((unicode(line_number),
+                         line.getvalue().rstrip('\r\n').decode('utf-8'),
+                         error.strip()))
+        conn.copy_rows(self.repo, self.rejects_table,
+                       ['line_number', 'line', 'error'], rows)
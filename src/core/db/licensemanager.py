@@ -3,28 +3,12 @@ from collections import namedtuple
 from config import settings
 import os
 import core.db.connection
+from core.db.superuser import superuser_connection as _superuser_connection
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 
-class _superuser_connection():
-    superuser_con = None
-
-    def __init__(self, repo_base=None):
-        self.repo_base = repo_base
-
-    def __enter__(self):
-        self.superuser_con = core.db.connection.DataHubConnection(
-            user=settings.DATABASES['default']['USER'],
-            password=settings.DATABASES['default']['PASSWORD'],
-            repo_base=self.repo_base)
-        return self.superuser_con
-
-    def __exit__(self, type, value, traceback):
-        self.superuser_con.close_connection()
-
-
 class LicenseManager:
 
     def __init__(self, username, repo_base):
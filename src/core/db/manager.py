@@ -2,40 +2,51 @@ import six
 import hashlib
 import os
 import errno
+import fcntl
 import re
-import codecs
 import csv
+import json
+import base64
+import itertools
+import time
 from shutil import rmtree
+from uuid import uuid4
 
 from django.contrib.auth.models import User
+from django.utils import timezone
+from psycopg2 import ProgrammingError
 
 from config import settings
+from core.db import importer
+from core.db.cache import LRUCache
 from core.db.connection import DataHubConnection
 from core.db.rlsmanager import RowLevelSecurityManager
+from core.db import superuser
 from core.db.errors import PermissionDenied
 from inventory.models import (
     App, Card, Collaborator,
     DataHubLegacyUser, LicenseView)
+from refiner.distill import inference
+from refiner.distill.extractor import Extractor, iter_records
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 
-class _superuser_connection():
-    superuser_con = None
+# Logins' privileges in repo_bases, keyed on (login, repo_base). See
+# _Privileges.
+_privilege_cache = LRUCache(max_size=settings.PRIVILEGE_CACHE_SIZE,
+                            ttl=settings.PRIVILEGE_CACHE_TTL)
 
-    def __init__(self, repo_base=None):
-        self.repo_base = repo_base
+# Privileges that _Privileges can answer has_*_privilege() checks for.
+# Anything else, like grant options, is checked in the database.
+_KNOWN_PRIVILEGES = frozenset([
+    'CREATE', 'CONNECT', 'TEMPORARY', 'USAGE', 'SELECT', 'INSERT', 'UPDATE',
+    'DELETE', 'TRUNCATE', 'REFERENCES', 'TRIGGER'])
 
-    def __enter__(self):
-        self.superuser_con = DataHubConnection(
-            user=settings.DATABASES['default']['USER'],
-            password=settings.DATABASES['default']['PASSWORD'],
-            repo_base=self.repo_base)
-        return self.superuser_con
 
-    def __exit__(self, type, value, traceback):
-        self.superuser_con.close_connection()
+def _superuser_connection(repo_base=None):
+    return superuser.superuser_connection(repo_base, DataHubConnection)
 
 
 class DataHubManager:
@@ -96,7 +107,9 @@ class DataHubManager:
         Raises ValueError on an invalid repo name.
         Raises ProgrammingError on permission denied.
         """
-        return self.user_con.create_repo(repo=repo)
+        res = self.user_con.create_repo(repo=repo)
+        _invalidate_privileges(self.repo_base)
+        return res
 
     def list_repos(self):
         """
@@ -128,6 +141,7 @@ class DataHubManager:
             Collaborator.objects.filter(
                 repo_name=repo, repo_base=self.repo_base).update(
                     repo_name=new_name)
+        _invalidate_privileges(self.repo_base)
 
         return success
 
@@ -172,6 +186,7 @@ class DataHubManager:
 
         # finally, delete the actual schema
         res = self.user_con.delete_repo(repo=repo, force=force)
+        _invalidate_privileges(self.repo_base)
         DataHubManager.delete_user_data_folder(self.repo_base, repo)
         return res
 
@@ -330,26 +345,86 @@ class DataHubManager:
         """
         return self.user_con.get_schema(repo=repo, table=table)
 
-    def explain_query(self, query):
+    def explain_query(self, query, params=None):
         """
         Returns the result of calling EXPLAIN on the query.
 
         Raises ProgrammingError on query syntax errors.
         Raises ProgrammingError on insufficient repo permissions.
         """
-        return self.user_con.explain_query(query)
+        return self.user_con.explain_query(query, params)
+
+    def create_trigram_index(self, repo, table, column):
+        """
+        Creates a trigram index on a table's text column, for substring
+        filters, unless it already has one. Returns whether it was created.
 
-    def execute_sql(self, query, params=None):
+        Raises ProgrammingError on insufficient repo permissions, or if the
+        pg_trgm extension isn't installed.
+        Raises ValueError on invalid names.
+        """
+        return self.user_con.create_trigram_index(repo, table, column)
+
+    def list_query_tables(self, query):
+        """
+        Lists the (repo, table) pairs that a query references, without
+        executing it.
+
+        Raises ProgrammingError on query syntax errors.
+        Raises ProgrammingError on insufficient repo permissions.
+        """
+        return self.user_con.list_query_tables(query)
+
+    def get_query_version(self, query):
+        """
+        Returns a value that changes whenever the tables a query references
+        are written to, or None if those writes can't be tracked.
+
+        Raises ProgrammingError on query syntax errors.
+        Raises ProgrammingError on insufficient repo permissions.
+        """
+        tables = self.list_query_tables(query)
+        return self.user_con.get_table_versions(tables)
+
+    def execute_sql(self, query, params=None, stream=False, batch_size=None):
         """
         Executes the query and returns its result.
 
+        Pass stream=True to read the rows of a select query through a
+        server-side cursor, batch_size rows at a time. The result has the same
+        keys, but 'tuples' is a generator and 'row_count' is -1. The manager's
+        connection is busy until the generator is exhausted or closed.
+
         Raises ProgrammingError on query syntax errors.
         Raises ProgrammingError on insufficient repo permissions.
         Raises LookupError on invalid role or repo.
         Raises ValueError on invalid query parameters.
         Raises other psycopg2 errors depending on the query.
         """
-        return self.user_con.execute_sql(query=query, params=params)
+        return self.user_con.execute_sql(
+            query=query, params=params, stream=stream, batch_size=batch_size)
+
+    def execute_batch(self, statements):
+        """
+        Executes (query, params) pairs in order, on one connection and in a
+        single transaction, and returns a list of their results.
+
+        Nothing is committed unless every statement succeeds. The error of the
+        statement that failed is raised, with its index in statements as
+        statement_index.
+
+        Raises the same errors as execute_sql.
+        """
+        return self.user_con.execute_batch(statements=statements)
+
+    def execute_many(self, query, params_list):
+        """
+        Executes a query once for each of params_list, in a single
+        transaction, and returns a list of the results.
+
+        Raises the same errors as execute_batch.
+        """
+        return self.execute_batch([(query, params) for params in params_list])
 
     def add_collaborator(
             self, repo, collaborator, db_privileges,
@@ -444,10 +519,12 @@ class DataHubManager:
         #         db_privileges=db_privileges,
         #         license_id=license_id)
         # else:
-        return self.user_con.add_collaborator(
+        res = self.user_con.add_collaborator(
             repo=repo,
             collaborator=collaborator,
             db_privileges=db_privileges)
+        _invalidate_privileges(self.repo_base)
+        return res
 
     def delete_collaborator(self, repo, collaborator):
         """
@@ -485,6 +562,7 @@ class DataHubManager:
 
             result = conn.delete_collaborator(
                 repo=repo, collaborator=collaborator)
+        _invalidate_privileges(self.repo_base)
         return result
 
     def create_license_view(self, repo, table, view_params, license_id):
@@ -685,21 +763,158 @@ class DataHubManager:
         """
         Gets the contents of a file in a repo.
 
+        Reads the whole file into memory. Use get_file_path to stream it.
+
+        Raises LookupError if the file does not exist.
+        Raises PermissionDenied on insufficient privileges.
+        """
+        with open(self.get_file_path(repo, file_name)) as f:
+            return f.read()
+
+    def get_file_path(self, repo, file_name):
+        """
+        Gets the path of a file in a repo, to be read from.
+
+        Raises LookupError if the file does not exist.
         Raises PermissionDenied on insufficient privileges.
         """
         DataHubManager.has_repo_file_privilege(
             self.username, self.repo_base, repo, 'read')
 
         file_path = user_data_path(self.repo_base, repo, file_name)
-        file = open(file_path).read()
-        return file
+        if not os.path.isfile(file_path):
+            raise LookupError('File not found: %s' % file_name)
+        return file_path
+
+    def start_upload(self, repo, file_name, size):
+        """
+        Starts a resumable upload of a file of size bytes to a repo.
+
+        The file is sent in any number of chunks with append_upload, and
+        appears in the repo, replacing any file with that name, once all size
+        bytes have arrived. Returns the upload, as described by
+        describe_upload.
+
+        Raises ValueError on an invalid file name or size.
+        Raises PermissionDenied on insufficient privileges.
+        """
+        DataHubManager.has_repo_file_privilege(
+            self.username, self.repo_base, repo, 'write')
+
+        size = int(size)
+        if size < 0:
+            raise ValueError('Invalid upload size.')
+        file_name = clean_file_name(file_name)
+        user_data_path(self.repo_base, repo, file_name)
+        _expire_uploads(self.repo_base, repo)
+
+        upload_id = uuid4().hex
+        upload_path = _upload_path(self.repo_base, repo, upload_id)
+        try:
+            os.makedirs(os.path.dirname(upload_path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        with open(upload_path + '.json', 'w') as f:
+            json.dump({'file_name': file_name, 'size': size}, f)
+        open(upload_path, 'wb').close()
+
+        if size == 0:
+            return self._finish_upload(repo, upload_id)
+        return self.describe_upload(repo, upload_id)
+
+    def describe_upload(self, repo, upload_id):
+        """
+        Describes a resumable upload: its file_name, its size, the offset
+        to send the next chunk from, and whether it's complete.
+
+        Raises LookupError on unknown or finished uploads.
+        Raises PermissionDenied on insufficient privileges.
+        """
+        DataHubManager.has_repo_file_privilege(
+            self.username, self.repo_base, repo, 'write')
+
+        upload_path = _upload_path(self.repo_base, repo, upload_id)
+        try:
+            with open(upload_path + '.json') as f:
+                upload = json.load(f)
+            upload['offset'] = os.path.getsize(upload_path)
+        except (IOError, OSError):
+            raise LookupError('Upload not found.')
+        upload['upload_id'] = upload_id
+        upload['complete'] = False
+        return upload
+
+    def append_upload(self, repo, upload_id, offset, data, chunk_size=65536):
+        """
+        Appends the bytes read from the file-like data to an upload.
+
+        offset must be the upload's current offset, so that a chunk that was
+        only partly received can be resent from where it was cut off. Returns
+        the upload, as described by describe_upload.
+
+        Raises ValueError if offset is wrong, or if the upload would grow
+        past its size.
+        Raises LookupError on unknown or finished uploads.
+        Raises PermissionDenied on insufficient privileges.
+        """
+        upload = self.describe_upload(repo, upload_id)
+        upload_path = _upload_path(self.repo_base, repo, upload_id)
+        with _open_upload(upload_path) as f:
+            # the offset is checked under the lock, so that concurrent
+            # requests can't both append from it
+            upload['offset'] = os.fstat(f.fileno()).st_size
+            if offset != upload['offset']:
+                raise ValueError(
+                    'The upload continues from byte %d, not %d.' % (
+                        upload['offset'], offset))
+
+            for chunk in iter(lambda: data.read(chunk_size), b''):
+                offset += len(chunk)
+                if offset > upload['size']:
+                    f.truncate(upload['offset'])
+                    raise ValueError('The upload is larger than its size.')
+                f.write(chunk)
+            f.flush()
+
+            if offset == upload['size']:
+                return self._finish_upload(repo, upload_id)
+        upload['offset'] = offset
+        return upload
+
+    def cancel_upload(self, repo, upload_id):
+        """
+        Cancels an upload, deleting what was received of it.
+
+        Raises LookupError on unknown or finished uploads.
+        Raises PermissionDenied on insufficient privileges.
+        """
+        self.describe_upload(repo, upload_id)
+        upload_path = _upload_path(self.repo_base, repo, upload_id)
+        with _open_upload(upload_path):
+            os.remove(upload_path)
+            os.remove(upload_path + '.json')
+
+    def _finish_upload(self, repo, upload_id):
+        upload = self.describe_upload(repo, upload_id)
+        upload_path = _upload_path(self.repo_base, repo, upload_id)
+
+        DataHubManager.create_user_data_folder(self.repo_base, repo)
+        # both live in /user_data, so the file appears all at once
+        os.rename(upload_path, user_data_path(
+            self.repo_base, repo, upload['file_name']))
+        os.remove(upload_path + '.json')
+
+        upload['complete'] = True
+        return upload
 
     def export_table(self, repo, table, file_name, file_format='CSV',
-                     delimiter=',', header=True):
+                     delimiter=',', header=True, progress=None):
         """
         Exports a table to a file in the same repo.
 
-        Defaults to CSV format with header row.
+        Defaults to CSV format with header row. If given, progress is called
+        with the number of bytes written after every write.
 
         Raises LookupError on invalid repo or table.
         Raises ProgrammingError on invalid combinations of file_format,
@@ -731,14 +946,17 @@ class DataHubManager:
             file_path=file_path,
             file_format=file_format,
             delimiter=delimiter,
-            header=header)
+            header=header,
+            progress=progress)
 
-    def export_view(self, repo, view, file_format='CSV',
-                    delimiter=',', header=True):
+    def export_view(self, repo, view, file_name=None, file_format='CSV',
+                    delimiter=',', header=True, progress=None):
         """
         Exports a view to a file in the same repo.
 
-        Defaults to CSV format with header row.
+        file_name defaults to the name of the view. Defaults to CSV format
+        with header row. If given, progress is called with the number of bytes
+        written after every write.
 
         Raises LookupError on invalid repo or view.
         Raises ProgrammingError on invalid combinations of file_format,
@@ -757,7 +975,7 @@ class DataHubManager:
         DataHubManager.create_user_data_folder(self.repo_base, repo)
 
         # define the file path for the new view
-        file_name = clean_file_name(view)
+        file_name = clean_file_name(file_name or view)
         file_path = user_data_path(
             self.repo_base, repo, file_name, file_format)
 
@@ -769,7 +987,8 @@ class DataHubManager:
             file_path=file_path,
             file_format=file_format,
             delimiter=delimiter,
-            header=header)
+            header=header,
+            progress=progress)
 
     def update_card(self, repo, card_name, new_query=None,
                     new_name=None, public=None):
@@ -789,9 +1008,10 @@ class DataHubManager:
             repo_base=self.repo_base, repo_name=repo, card_name=card_name)
         # update the card
         if new_query is not None:
-            # Queries for cards must work
+            # Queries for cards must work. Planning the query checks its
+            # syntax and privileges without running it.
             try:
-                self.execute_sql(new_query)
+                self.list_query_tables(new_query)
             except Exception:
                 raise PermissionDenied(
                     'Either missing required privileges or bad query')
@@ -828,6 +1048,17 @@ class DataHubManager:
 
         return card
 
+    def record_card_refresh(self, card, result_size):
+        """
+        Records that a card's results were just computed, and their size.
+
+        Leaves the card's timestamp, which tracks edits to the card, alone.
+        """
+        card.last_refreshed = timezone.now()
+        card.result_size = result_size
+        Card.objects.filter(id=card.id).update(
+            last_refreshed=card.last_refreshed, result_size=result_size)
+
     def create_card(self, repo, card_name, query):
         """
         Creates a card in a repo from a given query.
@@ -849,9 +1080,10 @@ class DataHubManager:
                 'underscores are allowed in card names')
 
         # to create a card, the user must be able to successfully execute
-        # the query from their own database user.
+        # the query from their own database user. Planning the query checks
+        # its syntax and privileges without running it.
         try:
-            self.execute_sql(query)
+            self.list_query_tables(query)
         except Exception:
             raise PermissionDenied(
                 'Either missing required privileges or bad query')
@@ -862,11 +1094,13 @@ class DataHubManager:
 
         return card
 
-    def export_card(self, repo, file_name, card_name, file_format='CSV'):
+    def export_card(self, repo, file_name, card_name, file_format='CSV',
+                    progress=None):
         """
         Exports the results of a card to a new file in the repo.
 
-        Any existing file with that name is overwritten.
+        Any existing file with that name is overwritten. If given, progress is
+        called with the number of bytes written after every write.
 
         Raises PermissionDenied on insufficient privileges or bad query.
         """
@@ -878,10 +1112,11 @@ class DataHubManager:
         query = card.query
 
         # to export a card, the user must be able to successfully execute
-        # the query from their own database user.
+        # the query from their own database user. Planning the query checks
+        # that before anything is written.
         try:
-            self.execute_sql(query)
-        except Exception:
+            self.list_query_tables(query)
+        except ProgrammingError:
             raise PermissionDenied(
                 'Either missing required privileges or bad query')
 
@@ -892,9 +1127,14 @@ class DataHubManager:
         file_path = user_data_path(
             self.repo_base, repo, file_name, file_format)
 
-        self.user_con.export_query(query=query,
-                                   file_path=file_path,
-                                   file_format=file_format)
+        try:
+            self.user_con.export_query(query=query,
+                                       file_path=file_path,
+                                       file_format=file_format,
+                                       progress=progress)
+        except ProgrammingError:
+            raise PermissionDenied(
+                'Either missing required privileges or bad query')
 
     def delete_card(self, repo, card_name):
         """
@@ -978,6 +1218,72 @@ class DataHubManager:
 
         return result
 
+    def keyset_paginate_query(self, query, rows_per_page, order_by,
+                              page_token=None):
+        """
+        Pages through a select query by seeking past the last row of the
+        previous page instead of using an offset, so every page costs about
+        as much as the first one.
+
+        order_by is a list of columns that uniquely identify a row of the
+        query's result, e.g. a table's primary key. page_token is the
+        next_page_token returned with the previous page, or None for the first
+        page. next_page_token is None on the last page.
+
+        Raises ValueError if order_by is empty or not part of the result, or
+        if page_token doesn't belong to this query and order_by.
+        """
+        if not order_by:
+            raise ValueError('order_by must name at least one column.')
+        order_by = list(order_by)
+
+        last_values = None
+        if page_token:
+            last_values = _decode_page_token(page_token, query, order_by)
+
+        # Fetch one extra row to find out whether there is a next page.
+        res = self.user_con.keyset_select_query(
+            query=query, order_by=order_by, last_values=last_values,
+            limit=rows_per_page + 1)
+        select_query = res['select_query']
+
+        res = self.execute_sql(res['query'], res['params'])
+
+        next_page_token = None
+        if select_query or res['row_count'] > 0:
+            column_names = [field['name'] for field in res['fields']]
+            rows = res['tuples']
+            if select_query and len(rows) > rows_per_page:
+                rows = rows[:rows_per_page]
+                try:
+                    key_indexes = [column_names.index(c) for c in order_by]
+                except ValueError:
+                    raise ValueError(
+                        'order_by columns must be part of the query result.')
+                last_values = [rows[-1][i] for i in key_indexes]
+                next_page_token = _encode_page_token(
+                    query, order_by, last_values)
+        else:
+            column_names = ['status']
+            rows = [['success' if res['status'] else res['error']]]
+
+        return {
+            'column_names': column_names,
+            'rows': rows,
+            'select_query': select_query,
+            'order_by': order_by,
+            'next_page_token': next_page_token,
+        }
+
+    def get_primary_key(self, repo, table):
+        """
+        Returns a list of the table's primary key columns, in key order.
+
+        Returns an empty list if the table has no primary key.
+        Raises ValueError if repo or table have invalid characters.
+        """
+        return self.user_con.get_primary_key(repo=repo, table=table)
+
     def select_table_query(self, repo, table):
         """
         Return a database query for selecting the table.
@@ -987,11 +1293,27 @@ class DataHubManager:
         return self.user_con.select_table_query(
             repo_base=self.repo_base, repo=repo, table=table)
 
-    def import_rows(self, repo, table, rows, delimiter=',', header=False):
+    def import_rows(self, repo, table, rows, delimiter=',', header=False,
+                    batch_size=None, stop_on_error=True):
+        """
+        Creates a table of text columns and loads delimited lines into it.
+
+        rows can be any iterable of lines, e.g. a generator over a large file.
+        Rows are bulk loaded with COPY in batches of batch_size rows.
+
+        Returns a dict with status, row_count and a list of failed batches.
+        Raises ValueError if there are no rows.
+        Raises ImportError if a batch fails and stop_on_error is True.
+        """
         delimiter = delimiter.decode('string_escape')
 
+        rows = iter(rows)
+        first_row = next(rows, None)
+        if first_row is None:
+            raise ValueError('There are no rows to import.')
+
         # column names are the extracted
-        columns = rows[0].split(delimiter)
+        columns = first_row.split(delimiter)
         if not header:
             # if there's not a header, they're replaced with the word 'col'
             columns = ['col' for c in columns]
@@ -1002,7 +1324,10 @@ class DataHubManager:
         self.create_table(repo=repo, table=table, params=params)
 
         # now, insert the data and return the result
-        return self.user_con.import_rows(repo, table, rows, delimiter, header)
+        rows = itertools.chain([first_row], rows)
+        return self.user_con.import_rows(
+            repo, table, rows, delimiter, header,
+            batch_size=batch_size, stop_on_error=stop_on_error)
 
     """
     Static methods that don't require permissions
@@ -1194,6 +1519,8 @@ class DataHubManager:
             collaborator.delete()
 
         DataHubManager.delete_user_data_folder(repo_base)
+        # a connection to the database would keep it from being dropped
+        superuser.release(repo_base)
         with _superuser_connection() as conn:
             result = conn.remove_database(repo_base, revoke_collaborators)
         return result
@@ -1210,7 +1537,31 @@ class DataHubManager:
     @staticmethod
     def import_file(username, repo_base, repo, table, file_name,
                     file_format='CSV', delimiter=',', header=True,
-                    encoding='ISO-8859-1', quote_character='"'):
+                    encoding='ISO-8859-1', quote_character='"',
+                    progress=None):
+        """
+        Creates a table from a delimited file in the repo's files, and loads
+        the file into it.
+
+        Column types are inferred from the file's first
+        IMPORT_SAMPLE_ROWS rows. Rows that don't fit them, or that the
+        database rejects, are written to a <table>_rejects table, with their
+        line number and the reason why, rather than failing the import.
+        progress, if given, is called with the number of bytes read as the
+        file is read.
+
+        Returns a dict of the table, its columns and the rows loaded and
+        rejected.
+
+        Raises PermissionDenied on insufficient permissions.
+        Raises ValueError if the table already exists, or file_format isn't
+        CSV.
+        Raises ImportError if the file couldn't be loaded. The table and its
+        rejects table are dropped.
+        """
+        if file_format.upper() != 'CSV':
+            raise ValueError('Only CSV files can be imported.')
+
         # check for permissions
         delimiter = delimiter.decode('string_escape')
 
@@ -1224,46 +1575,151 @@ class DataHubManager:
         else:
             table_name = table
         table_name = clean_str(table_name, 'table')
-        dh_table_name = '%s.%s.%s' % (repo_base, repo, table_name)
 
-        # open the file
-        f = codecs.open(file_path, 'r', 'ISO-8859-1')
-        data = csv.reader(f, delimiter=delimiter)
+        with open(file_path, 'rb') as f:
+            lines = _counted_lines(f, progress)
+            reader = csv.reader(lines, delimiter=str(delimiter),
+                                quotechar=str(quote_character))
+            data = ((reader.line_num, [c.decode(encoding) for c in cells])
+                    for cells in reader)
 
-        # create a table for the data
-        cells = data.next()
-        columns = [clean_str(str(i), 'col') for i in range(0, len(cells))]
-        if header:
-            columns = map(lambda x: clean_str(x, 'col'), cells)
-        columns = rename_duplicates(columns)
+            # name the columns after the header, or number them
+            try:
+                line_number, cells = next(data)
+            except StopIteration:
+                raise ValueError('%s is empty.' % file_name)
+            columns = [clean_str(str(i), 'col') for i in range(len(cells))]
+            if header:
+                columns = [clean_str(c, 'col') for c in cells]
+            else:
+                data = itertools.chain([(line_number, cells)], data)
+            columns = rename_duplicates(columns)
+
+            return DataHubManager._load_table(
+                username, repo_base, repo, table_name, columns, data,
+                delimiter=str(delimiter))
 
-        params = [{'column_name': c, 'data_type': 'text'} for c in columns]
+    @staticmethod
+    def refine_file(username, repo_base, repo, table, file_name,
+                    training_input, training_output, record_separator='\n',
+                    header=None, encoding='ISO-8859-1', progress=None):
+        """
+        Creates a table from a file in the repo's files, e.g. a log, with
+        the fields that the refiner learns to extract from the training
+        examples, and loads each record's fields into it.
 
-        with DataHubManager(user=username, repo_base=repo_base) as manager:
-            manager.create_table(
-                repo=repo,
-                table=table_name,
-                params=params)
+        training_input is a JSON list of example records, and
+        training_output a JSON list of the fields of each. Records are
+        separated by record_separator, and header, if given, names the
+        fields. Column types are inferred, and rows rejected, as in
+        import_file. progress, if given, is called with the number of bytes
+        read as the file is read.
 
-        # populate the newly created table with data from the csv
-        with _superuser_connection(repo_base) as conn:
-            result = conn.import_file(
-                table_name=dh_table_name,
-                file_path=file_path,
-                file_format=file_format,
-                delimiter=delimiter,
-                header=header,
-                encoding=encoding,
-                quote_character=quote_character)
-        return result
+        Returns a dict of the table, its columns and the rows loaded and
+        rejected.
+
+        Raises PermissionDenied on insufficient permissions.
+        Raises ValueError if the table already exists, there are no fields
+        to extract, or file_name is invalid.
+        Raises ImportError if the file couldn't be loaded. The table and its
+        rejects table are dropped.
+        """
+        DataHubManager.has_repo_db_privilege(
+            username, repo_base, repo, 'CREATE')
+        DataHubManager.has_repo_file_privilege(
+            username, repo_base, repo, 'read')
+
+        file_path = user_data_path(repo_base, repo, file_name)
+        if table == '':
+            table_name, _ = os.path.splitext(file_name)
+        else:
+            table_name = table
+        table_name = clean_str(table_name, 'table')
+
+        o_fields_structure, _ = inference.learn_mapping(
+            training_input, training_output)
+        extractor = Extractor(o_fields_structure)
+        columns = header or [str(i) for i in range(len(extractor.patterns))]
+        if not columns:
+            raise ValueError('There are no fields to extract.')
+        if len(columns) != len(extractor.patterns):
+            raise ValueError('Expected %d column names, found %d.' % (
+                len(extractor.patterns), len(columns)))
+        columns = rename_duplicates([clean_str(c, 'col') for c in columns])
+
+        with open(file_path, 'rb') as f:
+            records = iter_records(f, record_separator, progress=progress)
+            fields = extractor.extract_all(
+                records, processes=settings.REFINE_PROCESSES,
+                chunk_size=settings.REFINE_CHUNK_SIZE)
+            data = ((i + 1, [v.decode(encoding, 'replace') for v in values])
+                    for i, values in enumerate(fields))
+            return DataHubManager._load_table(
+                username, repo_base, repo, table_name, columns, data)
+
+    @staticmethod
+    def _load_table(username, repo_base, repo, table_name, columns, data,
+                    delimiter=','):
+        # Creates a table of columns, with types inferred from a sample of
+        # data's (line number, values) pairs, and loads them into it.
+        sample = list(itertools.islice(data, settings.IMPORT_SAMPLE_ROWS))
+        types = importer.infer_types(
+            [cells for line_number, cells in sample], len(columns))
+
+        params = [{'column_name': c, 'data_type': t}
+                  for c, t in zip(columns, types)]
+        with DataHubManager(user=username, repo_base=repo_base) as m:
+            m.create_table(repo=repo, table=table_name, params=params)
+            tables = set(m.list_tables(repo))
+
+        def create_rejects_table():
+            rejects_table = '%s_rejects' % table_name
+            suffix = itertools.count(1)
+            while rejects_table in tables:
+                rejects_table = '%s_rejects%d' % (table_name, next(suffix))
+            with DataHubManager(user=username, repo_base=repo_base) as m:
+                m.create_table(repo=repo, table=rejects_table, params=[
+                    {'column_name': 'line_number', 'data_type': 'bigint'},
+                    {'column_name': 'line', 'data_type': 'text'},
+                    {'column_name': 'error', 'data_type': 'text'}])
+            return rejects_table
+
+        loader = importer.ParallelLoader(
+            connect=lambda: _superuser_connection(repo_base),
+            repo=repo, table=table_name, columns=columns, types=types,
+            create_rejects_table=create_rejects_table,
+            connections=settings.IMPORT_CONNECTIONS,
+            batch_size=settings.IMPORT_BATCH_SIZE,
+            delimiter=delimiter)
+        try:
+            loader.load(itertools.chain(sample, data))
+        except Exception as e:
+            with _superuser_connection(repo_base) as conn:
+                conn.delete_table(repo=repo, table=table_name, force=True)
+                if loader.rejects_table is not None:
+                    conn.delete_table(
+                        repo=repo, table=loader.rejects_table, force=True)
+            raise ImportError(e)
+
+        return {
+            'table': table_name,
+            'columns': [{'column_name': c, 'data_type': t}
+                        for c, t in zip(columns, types)],
+            'row_count': loader.row_count,
+            'rejected': loader.rejected,
+            'rejects_table': loader.rejects_table,
+        }
 
     """ Access Privilege Checks """
 
     @staticmethod
     def has_base_privilege(login, repo_base, privilege):
-        with _superuser_connection(repo_base) as conn:
-            result = conn.has_base_privilege(
-                login=login, privilege=privilege)
+        result = _privileges_for(login, repo_base).has_db_privilege(
+            (None, None, None), privilege)
+        if result is None:
+            with _superuser_connection(repo_base) as conn:
+                result = conn.has_base_privilege(
+                    login=login, privilege=privilege)
         return result
 
     @staticmethod
@@ -1277,9 +1733,12 @@ class DataHubManager:
         """
         repo = repo.lower()
         repo_base = repo_base.lower()
-        with _superuser_connection(repo_base) as conn:
-            result = conn.has_repo_db_privilege(
-                login=login, repo=repo, privilege=privilege)
+        result = _privileges_for(login, repo_base).has_db_privilege(
+            (repo, None, None), privilege)
+        if result is None:
+            with _superuser_connection(repo_base) as conn:
+                result = conn.has_repo_db_privilege(
+                    login=login, repo=repo, privilege=privilege)
         if not result:
             raise PermissionDenied()
 
@@ -1296,37 +1755,195 @@ class DataHubManager:
         if login == repo_base:
             return
 
-        # Check if the current user or the public user has the privilege on
-        # this repo.
-        # The anonymous user is never explicitly shared with, so we don't need
-        # to check for that.
-        permitted_collaborators = Collaborator.objects.filter(
-            repo_base=repo_base,
-            repo_name=repo,
-            file_permission__contains=privilege,
-            user__username__in=[settings.PUBLIC_ROLE, login])
-        if not next((c for c in permitted_collaborators), None):
+        if not _privileges_for(login, repo_base).has_file_privilege(
+                repo, privilege):
             raise PermissionDenied()
 
     @staticmethod
     def has_table_privilege(login, repo_base, table, privilege):
-        # a straightforward call to the DB, since it manages this
-        with _superuser_connection(repo_base) as conn:
-            result = conn.has_table_privilege(
-                login=login, table=table, privilege=privilege)
+        result = _privileges_for(login, repo_base).has_db_privilege(
+            _table_key(table), privilege)
+        if result is None:
+            with _superuser_connection(repo_base) as conn:
+                result = conn.has_table_privilege(
+                    login=login, table=table, privilege=privilege)
         return result
 
     @staticmethod
     def has_column_privilege(login, repo_base, table, column, privilege):
-        # a straightforward call to the DB, since it manages this
-        with _superuser_connection(repo_base) as conn:
-            result = conn.has_column_privilege(login=login,
-                                               table=table,
-                                               column=column,
-                                               privilege=privilege)
+        key = _table_key(table)
+        result = None
+        if key is not None:
+            # columns without privileges of their own have their table's
+            privileges = _privileges_for(login, repo_base)
+            column_key = (key[0], key[1], column)
+            if column_key in privileges.db_privileges():
+                key = column_key
+            result = privileges.has_db_privilege(key, privilege)
+        if result is None:
+            with _superuser_connection(repo_base) as conn:
+                result = conn.has_column_privilege(login=login,
+                                                   table=table,
+                                                   column=column,
+                                                   privilege=privilege)
         return result
 
 
+class _Privileges(object):
+    """
+    A login's privileges in a repo_base.
+
+    Its privileges on the repo_base, repos, tables, views and columns are
+    fetched in one catalog query, and its file privileges in one Collaborator
+    query, the first time each is needed. Checks on objects that didn't exist
+    then return None, so that the caller can ask the database.
+    """
+
+    def __init__(self, login, repo_base):
+        self.login = login
+        self.repo_base = repo_base
+        self._db_privileges = None
+        self._file_privileges = None
+
+    def db_privileges(self):
+        # {(repo, table, column): privileges}, with None for the parts that
+        # don't apply, e.g. (None, None, None) for the repo_base.
+        if self._db_privileges is None:
+            with _superuser_connection(self.repo_base) as conn:
+                rows = conn.get_privileges(login=self.login)
+            self._db_privileges = dict(
+                ((repo, table, column), frozenset(privileges))
+                for repo, table, column, privileges in rows)
+        return self._db_privileges
+
+    def file_privileges(self):
+        # {repo: file permission strings of the login's and the public
+        # user's collaborator objects}
+        # The anonymous user is never explicitly shared with, so we don't need
+        # to check for that.
+        if self._file_privileges is None:
+            collaborators = Collaborator.objects.filter(
+                repo_base=self.repo_base,
+                user__username__in=[settings.PUBLIC_ROLE, self.login])
+            file_privileges = {}
+            for c in collaborators:
+                file_privileges.setdefault(c.repo_name, []).append(
+                    c.file_permission)
+            self._file_privileges = file_privileges
+        return self._file_privileges
+
+    def has_db_privilege(self, key, privilege):
+        """
+        Returns whether the login has any of privilege, as passed to
+        has_*_privilege(), e.g. 'SELECT, INSERT', on the object that key
+        names, or None if that isn't known.
+        """
+        if key is None:
+            return None
+        names = [p.strip().upper() for p in privilege.split(',')]
+        names = ['TEMPORARY' if p == 'TEMP' else p for p in names]
+        if not _KNOWN_PRIVILEGES.issuperset(names):
+            return None
+        granted = self.db_privileges().get(key)
+        if granted is None:
+            return None
+        return any(p in granted for p in names)
+
+    def has_file_privilege(self, repo, privilege):
+        return any(privilege in p
+                   for p in self.file_privileges().get(repo, []))
+
+
+def _privileges_for(login, repo_base):
+    key = (login, repo_base)
+    privileges = _privilege_cache.get(key)
+    if privileges is None:
+        privileges = _Privileges(login, repo_base)
+        _privilege_cache.set(key, privileges)
+    return privileges
+
+
+def _invalidate_privileges(repo_base):
+    _privilege_cache.invalidate(lambda key: key[1] == repo_base)
+
+
+def _table_key(table):
+    # The (repo, table, None) key of a qualified table name, or None for
+    # names that depend on the search path or quoting.
+    parts = table.split('.')
+    if len(parts) != 2 or '"' in table:
+        return None
+    return (parts[0].lower(), parts[1].lower(), None)
+
+
+def _counted_lines(f, progress=None):
+    # Yields the lines of f, calling progress with the size of each.
+    for line in f:
+        if progress is not None:
+            progress(len(line))
+        yield line
+
+
+def _upload_path(repo_base, repo, upload_id):
+    """
+    Returns the path that an upload is received at, before it's complete.
+
+    Uploads are kept outside of the repo's folder, so that they aren't listed
+    as files until they're complete.
+
+    Raises LookupError on invalid upload ids.
+    """
+    if not re.match(r'^[0-9a-f]{32}$', upload_id):
+        raise LookupError('Upload not found.')
+    return os.path.join(
+        user_data_path(repo_base), '.uploads',
+        os.path.basename(user_data_path(repo_base, repo)), upload_id)
+
+
+def _open_upload(upload_path):
+    """
+    Opens an upload for appending, with an exclusive lock on it until it's
+    closed, so that only one request at a time writes to it.
+
+    Raises LookupError if the upload doesn't exist, e.g. because another
+    request finished or cancelled it while this one waited for the lock.
+    """
+    try:
+        # not created if missing, unlike open(upload_path, 'ab')
+        f = os.fdopen(os.open(upload_path, os.O_WRONLY | os.O_APPEND), 'ab')
+    except OSError:
+        raise LookupError('Upload not found.')
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    if not os.path.exists(upload_path + '.json'):
+        f.close()
+        raise LookupError('Upload not found.')
+    return f
+
+
+def _expire_uploads(repo_base, repo):
+    """
+    Deletes the repo's uploads that haven't received any bytes for
+    UPLOAD_EXPIRY seconds.
+    """
+    folder = os.path.dirname(_upload_path(repo_base, repo, '0' * 32))
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return
+    expired = time.time() - settings.UPLOAD_EXPIRY
+    for name in names:
+        if not re.match(r'^[0-9a-f]{32}$', name):
+            continue
+        upload_path = os.path.join(folder, name)
+        try:
+            if os.path.getmtime(upload_path) < expired:
+                os.remove(upload_path)
+                os.remove(upload_path + '.json')
+        except OSError:
+            # finished, cancelled or expired by another request meanwhile
+            pass
+
+
 def user_data_path(repo_base, repo='', file_name='', file_format=None):
     """
     Returns an absolute path to a file or repo in a user's data folder.
@@ -1336,8 +1953,9 @@ def user_data_path(repo_base, repo='', file_name='', file_format=None):
     user_data_path('foo', repo='bar', file_name='baz')
         => '/user_data/foo/bar/baz'
 
-    Raises ValueError on non-string input, if repo_base is '', or if file_name
-    is provided without repo.
+    Raises ValueError on non-string input, if repo_base is '', if file_name
+    is provided without repo, or if any part could name a file outside of
+    repo_base's folder, e.g. 'x/../../etc/passwd'.
     """
     if len(repo_base) == 0:
         raise ValueError('Invalid repo_base.')
@@ -1345,18 +1963,58 @@ def user_data_path(repo_base, repo='', file_name='', file_format=None):
         raise ValueError('Must pass in repo when providing file_name.')
     parts = [repo_base, repo, file_name]
     for p in parts:
-        if (not isinstance(p, six.string_types) or p.startswith('.')):
+        if (not isinstance(p, six.string_types) or p.startswith('.') or
+                '/' in p or '\\' in p or '..' in p or '\0' in p):
             raise ValueError('Invalid path component.')
     path = os.path.abspath(os.path.join(os.sep, 'user_data', *parts))
 
     if file_format:
-        if re.match('[^0-9a-zA-Z_-]', file_format):
+        if re.search('[^0-9a-zA-Z_-]', file_format):
             raise ValueError('Invalid file format specified.')
         path = '%s.%s' % (path, file_format)
 
+    root = os.path.join(os.sep, 'user_data', repo_base)
+    if path != root and not path.startswith(root + os.sep):
+        raise ValueError('Invalid path component.')
+
     return path
 
 
+def _page_token_digest(query, order_by):
+    return hashlib.sha1(
+        json.dumps([query.strip(), order_by])).hexdigest()[:16]
+
+
+def _encode_page_token(query, order_by, last_values):
+    """
+    Returns an opaque token for the page following the row whose order_by
+    columns hold last_values.
+    """
+    token = json.dumps({'q': _page_token_digest(query, order_by),
+                        'k': last_values}, default=six.text_type)
+    return base64.urlsafe_b64encode(token)
+
+
+def _decode_page_token(token, query, order_by):
+    """
+    Returns the last_values stored in a page token.
+
+    Raises ValueError if the token is malformed or was issued for a different
+    query or order_by.
+    """
+    try:
+        token = json.loads(base64.urlsafe_b64decode(str(token)))
+        digest = token['q']
+        last_values = token['k']
+    except (TypeError, ValueError, KeyError, UnicodeError):
+        raise ValueError('Invalid page token.')
+
+    if (digest != _page_token_digest(query, order_by) or
+            len(last_values) != len(order_by)):
+        raise ValueError('Page token does not match the query.')
+    return last_values
+
+
 def clean_file_name(text):
     # remove leading periods
     return re.sub('^\.+', '', text)
@@ -1,9 +1,16 @@
 import sqlparse
 
 from inventory.models import Collaborator
+from core.db.cache import LRUCache
 from core.db.rlsmanager import RowLevelSecurityManager
 from config import settings
 
+# Rewritten queries, keyed on the policy cache generation, repo_base, user and
+# the query text. Clearing the policy cache changes the generation, so stale
+# rewrites are never returned after a policy changes.
+_rewrite_cache = LRUCache(max_size=settings.RLS_REWRITE_CACHE_SIZE,
+                          ttl=settings.RLS_CACHE_TTL)
+
 
 class SQLQueryRewriter:
 
@@ -122,6 +129,21 @@ class SQLQueryRewriter:
         return result % processed_subquery
 
     def apply_row_level_security(self, query):
+        '''
+        Returns the query rewritten to only touch rows the user may access.
+
+        Results are cached, so repeated queries skip both parsing and the
+        policy lookups.
+        '''
+        cache_key = (RowLevelSecurityManager.policy_cache_generation(),
+                     self.repo_base, self.user, query)
+        result = _rewrite_cache.get(cache_key)
+        if result is None:
+            result = self._apply_row_level_security(query)
+            _rewrite_cache.set(cache_key, result)
+        return result
+
+    def _apply_row_level_security(self, query):
         token = unicode(sqlparse.parse(query)[0].tokens[0]).lower()
         if token == "insert":
             return self.apply_row_level_security_insert(query)
@@ -1,28 +1,20 @@
 from collections import namedtuple
 
+from django.contrib.auth.models import User
+
 from config import settings
 import os
 import core.db.connection
+from core.db.superuser import superuser_connection as _superuser_connection
+from core.db.cache import LRUCache
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-
-class _superuser_connection():
-    superuser_con = None
-
-    def __init__(self, repo_base=None):
-        self.repo_base = repo_base
-
-    def __enter__(self):
-        self.superuser_con = core.db.connection.DataHubConnection(
-            user=settings.DATABASES['default']['USER'],
-            password=settings.DATABASES['default']['PASSWORD'],
-            repo_base=self.repo_base)
-        return self.superuser_con
-
-    def __exit__(self, type, value, traceback):
-        self.superuser_con.close_connection()
+# Policies looked up by the query rewriter, keyed on
+# (repo_base, repo, table, policy_type, grantee).
+_policy_cache = LRUCache(max_size=settings.RLS_POLICY_CACHE_SIZE,
+                         ttl=settings.RLS_CACHE_TTL)
 
 
 class RowLevelSecurityManager:
@@ -50,6 +42,20 @@ class RowLevelSecurityManager:
     static methods don't require permissions
     """
 
+    # Caching policy lookups
+    @staticmethod
+    def clear_policy_cache():
+        '''
+        Drops all cached security policies. Called whenever the policy table
+        changes. This also invalidates rewritten queries cached by
+        SQLQueryRewriter, which are keyed on policy_cache_generation().
+        '''
+        _policy_cache.clear()
+
+    @staticmethod
+    def policy_cache_generation():
+        return _policy_cache.generation
+
     # Creating the schema & table
     @staticmethod
     def create_security_policy_schema():
@@ -123,6 +129,8 @@ class RowLevelSecurityManager:
                 repo=repo,
                 table=table)
 
+        RowLevelSecurityManager.clear_policy_cache()
+
     @staticmethod
     def remove_user_from_policy_table(username):
         username = username.lower()
@@ -131,6 +139,8 @@ class RowLevelSecurityManager:
             for policy in policies:
                 conn.remove_security_policy(policy[0])
 
+        RowLevelSecurityManager.clear_policy_cache()
+
     @staticmethod
     def can_user_access_rls_table(username,
                                   permissions=['SELECT', 'UPDATE', 'INSERT']):
@@ -157,6 +167,10 @@ class RowLevelSecurityManager:
         '''
         Looks for security policies matching what the user specified in
         the input.
+
+        Lookups by repo_base, repo, table, policy_type and grantee alone are
+        what the query rewriter issues for every table reference, so those
+        are served from the policy cache when possible.
         '''
         repo_base = repo_base.lower()
 
@@ -177,6 +191,14 @@ class RowLevelSecurityManager:
         if grantor:
             grantor = grantor.lower()
 
+        cache_key = None
+        if (repo and table and policy_type and grantee and
+                not (policy_id or policy or grantor)):
+            cache_key = (repo_base, repo, table, policy_type, grantee)
+            cached_policies = _policy_cache.get(cache_key)
+            if cached_policies is not None:
+                return list(cached_policies)
+
         with _superuser_connection(settings.POLICY_DB) as conn:
             res = conn.find_security_policies(
                 repo_base=repo_base,
@@ -200,6 +222,9 @@ class RowLevelSecurityManager:
 
             tuple_policies.append(tuple_policy)
 
+        if cache_key is not None:
+            _policy_cache.set(cache_key, tuple(tuple_policies))
+
         return tuple_policies
 
     @staticmethod
@@ -249,7 +274,7 @@ class RowLevelSecurityManager:
                             'policies on %s.%s.' % (grantor, repo, table))
 
         with _superuser_connection(settings.POLICY_DB) as conn:
-            return conn.create_security_policy(
+            result = conn.create_security_policy(
                 policy=policy,
                 policy_type=policy_type,
                 grantee=grantee,
@@ -258,6 +283,22 @@ class RowLevelSecurityManager:
                 repo=repo,
                 table=table)
 
+        RowLevelSecurityManager.clear_policy_cache()
+        try:
+            RowLevelSecurityManager.sync_native_policies(
+                repo_base, repo, table)
+        except Exception:
+            # e.g. a policy that isn't a valid expression
+            for created in RowLevelSecurityManager.find_security_policies(
+                    repo_base=repo_base, repo=repo, table=table,
+                    policy=policy, policy_type=policy_type, grantee=grantee,
+                    grantor=grantor, safe=False):
+                with _superuser_connection(settings.POLICY_DB) as conn:
+                    conn.remove_security_policy(created.id)
+            RowLevelSecurityManager.clear_policy_cache()
+            raise
+        return result
+
     @staticmethod
     def remove_security_policy(
             policy_id, username=None, repo_base=None, safe=True):
@@ -284,7 +325,12 @@ class RowLevelSecurityManager:
                             'policies on %s' % (username, policy.grantor))
 
         with _superuser_connection(settings.POLICY_DB) as conn:
-            return conn.remove_security_policy(policy_id)
+            result = conn.remove_security_policy(policy_id)
+
+        RowLevelSecurityManager.clear_policy_cache()
+        RowLevelSecurityManager.sync_native_policies(
+            policy.repo_base, policy.repo, policy.table)
+        return result
 
     @staticmethod
     def update_security_policy(policy_id, new_policy, new_policy_type,
@@ -315,5 +361,62 @@ class RowLevelSecurityManager:
                             % (username, policy.repo_base))
 
         with _superuser_connection(settings.POLICY_DB) as conn:
-            return conn.update_security_policy(
+            result = conn.update_security_policy(
                 policy_id, new_policy, new_policy_type, new_grantee)
+
+        RowLevelSecurityManager.clear_policy_cache()
+        try:
+            RowLevelSecurityManager.sync_native_policies(
+                policy.repo_base, policy.repo, policy.table)
+        except Exception:
+            # put the policy back the way it was
+            with _superuser_connection(settings.POLICY_DB) as conn:
+                conn.update_security_policy(
+                    policy_id, policy.policy, policy.policy_type,
+                    policy.grantee)
+            RowLevelSecurityManager.clear_policy_cache()
+            raise
+        return result
+
+    # Native row level security
+    @staticmethod
+    def sync_native_policies(repo_base, repo, table, force=False):
+        '''
+        Compiles the security policies on repo_base.repo.table into native
+        Postgres row level security policies on the table, if
+        settings.RLS_BACKEND is 'native'.
+
+        With force, the table is synced whatever the setting, and if it isn't
+        'native', the table's native policies are dropped instead.
+        '''
+        native = settings.RLS_BACKEND == 'native'
+        if not (native or force):
+            return False
+
+        policies = []
+        if native:
+            policies = [
+                (p.policy, p.policy_type, p.grantee)
+                for p in RowLevelSecurityManager.find_security_policies(
+                    repo_base=repo_base, repo=repo, table=table, safe=False)]
+
+        # Only the table's owner can define its policies, and running as them
+        # keeps policies from doing anything the owner couldn't.
+        owner = User.objects.get(username=repo_base)
+        conn = core.db.connection.DataHubConnection(
+            user=owner.username, password=owner.password,
+            repo_base=repo_base)
+        try:
+            return conn.sync_row_level_security(repo, table, policies)
+        finally:
+            conn.close_connection()
+
+    @staticmethod
+    def list_security_policy_tables():
+        '''
+        Returns the (repo_base, repo, table) of every table with security
+        policies.
+        '''
+        with _superuser_connection(settings.POLICY_DB) as conn:
+            result = conn.list_security_policy_tables()
+        return result
@@ -0,0 +1,166 @@
+import logging
+import threading
+
+import core.db.connection
+from config import settings
+
+'''
+Superuser connections, shared by DataHubManager, RowLevelSecurityManager and
+LicenseManager.
+
+Outside of a session, each superuser_connection() block checks a connection
+out of the pool, and returns it when the block exits. Between begin_session()
+and end_session(), e.g. for the length of a request (see
+browser.middleware.SuperuserSessionMiddleware) or a job, the first block for
+each repo_base checks one out, and later blocks on the same thread, nested or
+not, reuse it until the session ends.
+
+Sessions are per thread, so threads never share a connection. A connection
+that a block raised from goes back to its pool, which rolls back whatever
+transaction it was left in, instead of being reused by the session.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStats(object):
+    """
+    Counts of superuser connections opened, blocks that reused an already
+    open connection, and connections given back early after errors.
+    """
+
+    def __init__(self):
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def as_dict(self):
+        return {'opened': self.opened,
+                'reused': self.reused,
+                'discarded': self.discarded}
+
+
+class _Session(object):
+
+    def __init__(self):
+        # repo_base: [connection, number of blocks using it]
+        self.connections = {}
+        self.stats = SessionStats()
+
+
+_local = threading.local()
+
+# Totals for the process, across all sessions and blocks outside of them.
+_lock = threading.Lock()
+_totals = SessionStats()
+_sessions = 0
+
+
+def begin_session():
+    """
+    Starts sharing superuser connections on this thread. Ends the previous
+    session first, if it's still open, since threads are reused across
+    requests.
+    """
+    global _sessions
+    if getattr(_local, 'session', None) is not None:
+        end_session()
+    _local.session = _Session()
+    with _lock:
+        _sessions += 1
+
+
+def end_session():
+    """
+    Returns the session's connections to their pools, and returns the
+    session's stats, or None if there was no session.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        return None
+    _local.session = None
+    for connection, _ in session.connections.values():
+        connection.close_connection()
+    summary = session.stats.as_dict()
+    logger.debug('superuser connections: opened=%(opened)d '
+                 'reused=%(reused)d discarded=%(discarded)d', summary)
+    return summary
+
+
+def release(repo_base):
+    """
+    Returns this thread's session connection to repo_base to its pool, if
+    there is one, e.g. so that the database can be dropped.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        return
+    entry = session.connections.pop(repo_base, None)
+    if entry is not None:
+        entry[0].close_connection()
+
+
+def stats():
+    """Returns the process's totals, and the number of sessions begun."""
+    with _lock:
+        totals = _totals.as_dict()
+        totals['sessions'] = _sessions
+    return totals
+
+
+class superuser_connection():
+    """
+    A context manager for a superuser DataHubConnection to repo_base.
+
+    connection_class defaults to core.db.connection.DataHubConnection.
+    """
+
+    def __init__(self, repo_base=None, connection_class=None):
+        self.repo_base = repo_base
+        self.connection_class = connection_class
+        self.session = None
+        self.superuser_con = None
+
+    def __enter__(self):
+        self.session = getattr(_local, 'session', None)
+        entry = None
+        if self.session is not None:
+            entry = self.session.connections.get(self.repo_base)
+
+        if entry is not None:
+            entry[1] += 1
+            self._count('reused')
+        else:
+            connection_class = (self.connection_class or
+                                core.db.connection.DataHubConnection)
+            entry = [connection_class(
+                user=settings.DATABASES['default']['USER'],
+                password=settings.DATABASES['default']['PASSWORD'],
+                repo_base=self.repo_base), 1]
+            if self.session is not None:
+                self.session.connections[self.repo_base] = entry
+            self._count('opened')
+        self.superuser_con = entry[0]
+        return self.superuser_con
+
+    def __exit__(self, type, value, traceback):
+        if self.session is None:
+            self.superuser_con.close_connection()
+            return
+
+        entry = self.session.connections.get(self.repo_base)
+        if entry is None or entry[0] is not self.superuser_con:
+            # released while in use
+            return
+        entry[1] -= 1
+        if type is not None and entry[1] == 0:
+            del self.session.connections[self.repo_base]
+            self.superuser_con.close_connection()
+            self._count('discarded')
+
+    def _count(self, name):
+        if self.session is not None:
+            setattr(self.session.stats, name,
+                    getattr(self.session.stats, name) + 1)
+        with _lock:
+            setattr(_totals, name, getattr(_totals, name) + 1)
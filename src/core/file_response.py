@@ -0,0 +1,142 @@
+import mimetypes
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+'''
+Serving repo files over HTTP.
+
+Files are streamed from disk rather than read into memory, and single byte
+ranges (Range, If-Range) and conditional GETs (If-None-Match,
+If-Modified-Since) are supported, so that interrupted downloads of large
+files can be resumed and unchanged files aren't sent again.
+'''
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _RangeFile(object):
+    """
+    Reads at most length bytes of a file, from its current position.
+
+    Doesn't expose fileno(), so WSGI servers can't sendfile() past the end
+    of the range.
+    """
+
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def etag(stat):
+    """A strong ETag that changes whenever the file is replaced or written."""
+    return '"%x-%x-%x"' % (stat.st_ino, int(stat.st_mtime * 1000000),
+                           stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    Returns the (start, end) bytes, inclusive, of a Range header, or None if
+    the header can't be parsed or asks for several ranges, in which case the
+    whole file is sent.
+
+    Raises ValueError if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        # the last end bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable.')
+    return start, end
+
+
+def _not_modified(request, tag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        return '*' in tags or tag in tags
+
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def _range_applies(request, tag, mtime):
+    # If-Range asks for the range only if the file hasn't changed since the
+    # client got the rest of it.
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == tag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def file_response(request, file_path, file_name=None, as_attachment=True):
+    """
+    Returns a response streaming the file at file_path, or the byte range of
+    it that the request asks for.
+
+    Raises IOError/OSError if the file can't be read.
+    """
+    file_name = file_name or os.path.basename(file_path)
+    stat = os.stat(file_path)
+    size = stat.st_size
+    tag = etag(stat)
+
+    if _not_modified(request, tag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and _range_applies(request, tag, stat.st_mtime):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % size
+                return response
+
+        content_type = mimetypes.guess_type(file_name)[0]
+        f = open(file_path, 'rb')
+        if byte_range is None:
+            response = FileResponse(
+                f, content_type=content_type or 'application/octet-stream')
+            response['Content-Length'] = size
+        else:
+            start, end = byte_range
+            f.seek(start)
+            response = FileResponse(
+                _RangeFile(f, end - start + 1), status=206,
+                content_type=content_type or 'application/octet-stream')
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+
+        response['Accept-Ranges'] = 'bytes'
+        if as_attachment:
+            response['Content-Disposition'] = (
+                'attachment; filename="%s"' % file_name)
+
+    response['ETag'] = tag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
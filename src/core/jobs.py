@@ -0,0 +1,323 @@
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.db import connection
+from django.utils import timezone
+
+from config import settings
+from core.db import superuser
+from core.db.manager import (
+    DataHubManager, clean_file_name, user_data_path)
+from inventory.models import Job
+
+'''
+Background jobs for long running exports and imports.
+
+Requests queue a job as a row of inventory.Job, and return its id right away.
+Worker processes, started with `manage.py runjobs`, claim queued jobs from
+that table and run them on a pool of threads. Any number of workers can share
+the queue: a job is claimed by atomically moving it from queued to running,
+so only one worker ever runs it.
+
+Running jobs record how many bytes they've written or read, and stop at the
+next progress update after their cancellation is requested. Workers keep a
+heartbeat on the jobs they're running, so that jobs left running by a worker
+that died are failed by the other workers.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _export_table(job, progress, table, file_name=None, file_format='CSV',
+                  delimiter=',', header=True):
+    file_name = file_name or table
+    with DataHubManager(user=job.username, repo_base=job.repo_base) as m:
+        m.export_table(
+            repo=job.repo_name, table=table, file_name=file_name,
+            file_format=file_format, delimiter=delimiter, header=header,
+            progress=progress)
+    return '%s.%s' % (clean_file_name(file_name), file_format)
+
+
+def _export_view(job, progress, view, file_name=None, file_format='CSV',
+                 delimiter=',', header=True):
+    file_name = file_name or view
+    with DataHubManager(user=job.username, repo_base=job.repo_base) as m:
+        m.export_view(
+            repo=job.repo_name, view=view, file_name=file_name,
+            file_format=file_format, delimiter=delimiter, header=header,
+            progress=progress)
+    return '%s.%s' % (clean_file_name(file_name), file_format)
+
+
+def _export_card(job, progress, card_name, file_name=None,
+                 file_format='CSV'):
+    file_name = file_name or card_name
+    with DataHubManager(user=job.username, repo_base=job.repo_base) as m:
+        m.export_card(
+            repo=job.repo_name, file_name=file_name, card_name=card_name,
+            file_format=file_format, progress=progress)
+    return '%s.%s' % (clean_file_name(file_name), file_format)
+
+
+def _import_file(job, progress, file_name, table='', file_format='CSV',
+                 delimiter=',', header=True, encoding='ISO-8859-1',
+                 quote_character='"'):
+    progress.total = os.path.getsize(
+        user_data_path(job.repo_base, job.repo_name, file_name))
+    DataHubManager.import_file(
+        username=job.username, repo_base=job.repo_base, repo=job.repo_name,
+        table=table, file_name=file_name, file_format=file_format,
+        delimiter=delimiter, header=header, encoding=encoding,
+        quote_character=quote_character, progress=progress)
+    return None
+
+
+def _refine_file(job, progress, file_name, training_input, training_output,
+                 table='', record_separator='\n', header=None,
+                 encoding='ISO-8859-1'):
+    progress.total = os.path.getsize(
+        user_data_path(job.repo_base, job.repo_name, file_name))
+    DataHubManager.refine_file(
+        username=job.username, repo_base=job.repo_base, repo=job.repo_name,
+        table=table, file_name=file_name, training_input=training_input,
+        training_output=training_output, record_separator=record_separator,
+        header=header, encoding=encoding, progress=progress)
+    return None
+
+
+# job kind: handler(job, progress, **params), returning the name of the file
+# the job wrote to the repo, if any.
+JOB_HANDLERS = {
+    'export_table': _export_table,
+    'export_view': _export_view,
+    'export_card': _export_card,
+    'import_file': _import_file,
+    'refine_file': _refine_file,
+}
+
+
+def submit_job(username, repo_base, repo, kind, **params):
+    """
+    Queues a job to run in the background, and returns it.
+
+    The user's privileges are checked now, to fail early, and again when the
+    job runs.
+
+    Raises ValueError on an unknown kind of job, or an invalid file_name.
+    Raises PermissionDenied on insufficient privileges.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError('Unknown kind of job: %s' % kind)
+
+    if kind == 'export_card':
+        DataHubManager.has_repo_file_privilege(
+            username, repo_base, repo, 'write')
+    else:
+        DataHubManager.has_repo_db_privilege(
+            username, repo_base, repo, 'CREATE')
+    if kind == 'refine_file':
+        DataHubManager.has_repo_file_privilege(
+            username, repo_base, repo, 'read')
+        user_data_path(repo_base, repo, params['file_name'])
+
+    return Job.objects.create(
+        username=username, repo_base=repo_base, repo_name=repo, kind=kind,
+        params=json.dumps(params))
+
+
+def cancel_job(job):
+    """
+    Cancels a job. Queued jobs are cancelled right away, and running jobs
+    at their next progress update. Returns the updated job.
+    """
+    if not Job.objects.filter(id=job.id, status=Job.QUEUED).update(
+            status=Job.CANCELLED, cancel_requested=True,
+            finished=timezone.now()):
+        Job.objects.filter(id=job.id, status=Job.RUNNING).update(
+            cancel_requested=True)
+    return Job.objects.get(id=job.id)
+
+
+def claim_job(worker, batch_size=10):
+    """
+    Claims the oldest queued job for worker, and returns it, or None if no
+    job is queued.
+    """
+    queued = (Job.objects.filter(status=Job.QUEUED)
+              .order_by('id').values_list('id', flat=True)[:batch_size])
+    for job_id in queued:
+        # only one worker's update can move a job out of the queue
+        now = timezone.now()
+        if Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker, started=now,
+                heartbeat=now):
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def beat(worker):
+    """Marks the jobs that worker's threads are running as still alive."""
+    Job.objects.filter(
+        status=Job.RUNNING, worker__startswith=worker + ':').update(
+        heartbeat=timezone.now())
+
+
+def fail_stale_jobs(timeout=settings.JOB_STALE_TIMEOUT):
+    """
+    Fails running jobs whose heartbeat is more than timeout seconds old, or
+    cancels them if their cancellation was requested. Their worker must have
+    died, and since they may have been partly done, they aren't retried.
+
+    Returns the number of jobs stopped.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        heartbeat__lt=now - datetime.timedelta(seconds=timeout))
+    stopped = stale.filter(cancel_requested=True).update(
+        status=Job.CANCELLED, finished=now)
+    stopped += stale.update(
+        status=Job.FAILED, error='The worker running this job stopped.',
+        finished=now)
+    if stopped:
+        logger.warning('Stopped %d jobs left running by dead workers',
+                       stopped)
+    return stopped
+
+
+class JobProgress(object):
+    """
+    The progress callback passed to job handlers.
+
+    Called with the number of bytes processed since the last call. Saves the
+    running total at most every interval seconds, and raises JobCancelled at
+    that point if the job's cancellation was requested.
+    """
+
+    def __init__(self, job, interval=settings.JOB_PROGRESS_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self.progress = 0
+        self.total = None
+        self._next_update = time.time() + interval
+
+    def __call__(self, n):
+        self.progress += n
+        now = time.time()
+        if now >= self._next_update:
+            self._next_update = now + self.interval
+            self.update()
+
+    def update(self):
+        Job.objects.filter(id=self.job.id).update(
+            progress=self.progress, total=self.total,
+            heartbeat=timezone.now())
+        if self.cancel_requested():
+            raise JobCancelled()
+
+    def cancel_requested(self):
+        return Job.objects.filter(
+            id=self.job.id, cancel_requested=True).exists()
+
+
+def run_job(job):
+    """Runs a claimed job, recording its result, or why it failed."""
+    progress = JobProgress(job)
+    status, result, error = Job.SUCCEEDED, None, None
+    superuser.begin_session()
+    try:
+        progress.update()
+        result = JOB_HANDLERS[job.kind](
+            job, progress, **json.loads(job.params))
+    except Exception as e:
+        # Cancelling a job may surface as whatever error the interrupted
+        # COPY raised.
+        if isinstance(e, JobCancelled) or progress.cancel_requested():
+            status = Job.CANCELLED
+        else:
+            status, error = Job.FAILED, str(e) or e.__class__.__name__
+    finally:
+        superuser.end_session()
+
+    Job.objects.filter(id=job.id).update(
+        status=status, result=result, error=error,
+        progress=progress.progress, total=progress.total,
+        finished=timezone.now())
+
+
+class JobWorker(object):
+    """
+    Runs queued jobs on threads threads until stop() is called.
+
+    Idle threads check the queue every poll_interval seconds. Every
+    heartbeat_interval seconds, the worker marks its running jobs as alive,
+    and fails other workers' stale jobs.
+    """
+
+    def __init__(self, threads=settings.JOB_WORKER_THREADS,
+                 poll_interval=settings.JOB_POLL_INTERVAL,
+                 heartbeat_interval=settings.JOB_HEARTBEAT_INTERVAL):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.name = '%s:%d' % (socket.gethostname(), os.getpid())
+        self._stopping = threading.Event()
+
+    def run(self):
+        workers = [threading.Thread(target=self._work, args=(i,))
+                   for i in range(self.threads)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        next_beat = 0
+        try:
+            # join() with a timeout, so that KeyboardInterrupt gets through
+            while any(worker.is_alive() for worker in workers):
+                if time.time() >= next_beat:
+                    next_beat = time.time() + self.heartbeat_interval
+                    self._beat()
+                for worker in workers:
+                    worker.join(1)
+        except KeyboardInterrupt:
+            self.stop()
+            for worker in workers:
+                worker.join()
+        finally:
+            connection.close()
+
+    def stop(self):
+        """Stops once the jobs that are running finish."""
+        self._stopping.set()
+
+    def _beat(self):
+        try:
+            beat(self.name)
+            fail_stale_jobs()
+        except Exception:
+            logger.exception('Job worker %s failed to beat', self.name)
+
+    def _work(self, i):
+        name = '%s:%d' % (self.name, i)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    job = claim_job(name)
+                    if job is not None:
+                        run_job(job)
+                        continue
+                except Exception:
+                    logger.exception('Job worker %s failed', name)
+                self._stopping.wait(self.poll_interval)
+        finally:
+            # each thread has its own Django database connection
+            connection.close()
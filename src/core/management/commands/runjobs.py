@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from config import settings
+from core.jobs import JobWorker
+
+
+class Command(BaseCommand):
+    help = ("Runs queued export and import jobs until interrupted. "
+            "Start more of these to run more jobs at once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=settings.JOB_WORKER_THREADS,
+            help='Number of jobs to run at once.')
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help='Seconds between checks for new jobs when idle.')
+
+    def handle(self, *args, **options):
+        worker = JobWorker(threads=options['threads'],
+                           poll_interval=options['poll_interval'])
+        print('Running jobs as %s' % worker.name)
+        worker.run()
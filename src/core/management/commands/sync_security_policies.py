@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from config import settings
+from core.db.rlsmanager import RowLevelSecurityManager
+
+
+class Command(BaseCommand):
+    help = ("Compiles every table's row level security policies into native "
+            "Postgres policies when RLS_BACKEND is 'native', or drops them "
+            "otherwise. Run after changing RLS_BACKEND.")
+
+    def handle(self, *args, **options):
+        native = settings.RLS_BACKEND == 'native'
+        failures = 0
+        for repo_base, repo, table in (
+                RowLevelSecurityManager.list_security_policy_tables()):
+            try:
+                RowLevelSecurityManager.sync_native_policies(
+                    repo_base, repo, table, force=True)
+            except Exception as e:
+                # e.g. the table was deleted, but its policies weren't
+                failures += 1
+                print('Failed {0}.{1}.{2}: {3}'.format(
+                    repo_base, repo, table, e))
+                continue
+            print('{0} {1}.{2}.{3}'.format(
+                'Synced' if native else 'Dropped native policies on',
+                repo_base, repo, table))
+        print('{0} tables failed.'.format(failures))
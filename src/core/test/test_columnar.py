@@ -0,0 +1,81 @@
+import datetime
+import io
+import unittest
+
+from psycopg2.tz import FixedOffsetTimezone
+from mock import Mock
+
+from django.test import TestCase
+
+from core.db.columnar import write_rows
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class ColumnarExports(TestCase):
+    """Tests writing rows as Arrow IPC and Parquet files."""
+
+    fields = [{'name': 'id', 'type': 23},
+              {'name': 'name', 'type': 25},
+              {'name': 'price', 'type': 1700},
+              {'name': 'day', 'type': 1082},
+              {'name': 'at', 'type': 1184}]
+    rows = [
+        (1, 'caf\xc3\xa9', 1.5, datetime.date(2016, 1, 2),
+         datetime.datetime(2016, 1, 2, 4, 0,
+                           tzinfo=FixedOffsetTimezone(offset=60))),
+        (2, None, None, None, None),
+        (3, 'c', 3, datetime.date(2016, 1, 4), None),
+    ]
+
+    def write(self, file_format, progress=None):
+        f = io.BytesIO()
+        write_rows(self.fields, iter(self.rows), f, file_format,
+                   batch_size=2, progress=progress)
+        f.seek(0)
+        return f
+
+    def check(self, table):
+        self.assertEqual(
+            [str(field.type) for field in table.schema],
+            ['int32', 'string', 'string', 'date32[day]',
+             'timestamp[us, tz=UTC]'])
+        columns = table.drop(['at']).to_pydict()
+        self.assertEqual(columns['id'], [1, 2, 3])
+        self.assertEqual(columns['name'], [u'caf\xe9', None, u'c'])
+        self.assertEqual(columns['price'], [u'1.5', None, u'3'])
+        self.assertEqual(columns['day'][1], None)
+
+        # timestamps with time zones are stored as UTC microseconds
+        at = table.column('at').chunk(0).cast(pyarrow.int64()).to_pylist()
+        self.assertEqual(at[0], 1451703600000000)
+
+    def test_arrow(self):
+        progress = Mock()
+        f = self.write('arrow', progress)
+
+        self.check(pyarrow.ipc.open_file(f).read_all())
+        # called after each batch, and once more for the file's footer
+        self.assertEqual(progress.call_count, 2)
+        self.assertEqual(sum(c[0][0] for c in progress.call_args_list),
+                         len(f.getvalue()))
+
+    def test_parquet(self):
+        f = self.write('PARQUET')
+        metadata = pyarrow.parquet.ParquetFile(f).metadata
+
+        # a row group per batch, with column statistics
+        self.assertEqual(metadata.num_row_groups, 2)
+        statistics = metadata.row_group(0).column(0).statistics
+        self.assertEqual((statistics.min, statistics.max), (1, 2))
+        f.seek(0)
+        self.check(pyarrow.parquet.read_table(f))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.write('CSV')
@@ -3,12 +3,16 @@ from mock import Mock, \
                  patch, \
                  mock_open
 import itertools
+import psycopg2
 
 from django.test import TestCase
 
 from config.settings import PUBLIC_ROLE
 from core.db.backend.pg import connection_pools, \
                                _pool_for_credentials, \
+                               _catalog_cache, \
+                               _index_name, \
+                               COLUMNAR_BATCH_SIZE, \
                                PGBackend
 
 
@@ -31,8 +35,8 @@ class PoolHelperFunctions(MockingMixin, TestCase):
     """Tests helper functions in pg.py, but not in the PGBackend class."""
 
     def setUp(self):
-        self.mock_ThreadedConnectionPool = self.create_patch(
-            'core.db.backend.pg.ThreadedConnectionPool')
+        self.mock_connect = self.create_patch(
+            'core.db.backend.pool.psycopg2.connect')
 
     def test_pool_for_credentials(self):
         n = len(connection_pools)
@@ -113,6 +117,12 @@ class PGBackendHelperMethods(MockingMixin, TestCase):
             except ValueError:
                 self.fail('_validate_table_name failed to verify a good name')
 
+    @patch('core.db.backend.pg.settings.RLS_BACKEND', 'native')
+    def test_native_row_level_security_skips_query_rewriter(self):
+        backend = PGBackend(self.username, self.password,
+                            repo_base=self.username)
+        self.assertFalse(backend.row_level_security)
+
     def test_check_open_connections(self):
         mock_get_conn = self.mock_pool_for_cred.return_value.getconn
         mock_set_isol_level = mock_get_conn.return_value.set_isolation_level
@@ -144,6 +154,99 @@ class PGBackendHelperMethods(MockingMixin, TestCase):
         self.assertEqual(res['status'], True)
         self.assertEqual(res['row_count'], 1000)
 
+    def test_execute_batch_commits_once(self):
+        mock_cursor = self.backend.connection.cursor
+        mock_cursor.return_value.fetchall.return_value = []
+        mock_cursor.return_value.rowcount = 1
+        mock_query_rewriter = MagicMock()
+        mock_query_rewriter.apply_row_level_security.side_effect = lambda x: x
+        self.backend.query_rewriter = mock_query_rewriter
+
+        res = self.backend.execute_batch(
+            [('INSERT INTO repo.table VALUES (%s)', (i,)) for i in range(3)])
+
+        # one cursor and one transaction for the whole batch
+        self.assertEqual(len(res), 3)
+        self.assertEqual(mock_cursor.call_count, 1)
+        self.assertEqual(mock_cursor.return_value.execute.call_count, 3)
+        self.assertEqual(self.backend.connection.commit.call_count, 1)
+        self.assertFalse(self.backend.connection.rollback.called)
+
+    def test_execute_batch_rolls_back_on_error(self):
+        mock_cursor = self.backend.connection.cursor
+        mock_cursor.return_value.execute.side_effect = [
+            None, psycopg2.IntegrityError('duplicate key')]
+        mock_query_rewriter = MagicMock()
+        mock_query_rewriter.apply_row_level_security.side_effect = lambda x: x
+        self.backend.query_rewriter = mock_query_rewriter
+
+        with self.assertRaises(psycopg2.IntegrityError) as context:
+            self.backend.execute_batch(
+                [('INSERT INTO repo.table VALUES (1)', None)] * 3)
+
+        self.assertEqual(context.exception.statement_index, 1)
+        self.assertTrue(self.backend.connection.rollback.called)
+        self.assertFalse(self.backend.connection.commit.called)
+
+    def test_execute_sql_ddl_clears_catalog_cache(self):
+        _catalog_cache.set((self.username, 'foo', 'list_repos'), ('repo',))
+        _catalog_cache.set(('other', 'foo', 'list_repos'), ('repo',))
+
+        mock_query_rewriter = MagicMock()
+        mock_query_rewriter.apply_row_level_security.side_effect = lambda x: x
+        self.backend.query_rewriter = mock_query_rewriter
+
+        self.backend.execute_sql('SELECT * FROM repo.table')
+        self.assertTrue((self.username, 'foo', 'list_repos') in _catalog_cache)
+
+        self.backend.execute_sql('CREATE TABLE repo.table (id int)')
+        self.assertFalse(
+            (self.username, 'foo', 'list_repos') in _catalog_cache)
+        self.assertTrue(('other', 'foo', 'list_repos') in _catalog_cache)
+
+    def test_execute_sql_stream_uses_named_cursor(self):
+        query = 'SELECT * FROM repo.table'
+
+        mock_cursor = self.backend.connection.cursor
+        mock_fetchmany = mock_cursor.return_value.fetchmany
+        mock_fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+        mock_cursor.return_value.closed = False
+        mock_cursor.return_value.description = (('id', 23),)
+        self.backend.connection.closed = False
+
+        mock_query_rewriter = MagicMock()
+        mock_query_rewriter.apply_row_level_security.side_effect = lambda x: x
+        self.backend.query_rewriter = mock_query_rewriter
+
+        res = self.backend.execute_sql(query, stream=True, batch_size=2)
+
+        # the server-side cursor is named and fetches batch_size rows
+        self.assertTrue('name' in mock_cursor.call_args[1])
+        self.assertEqual(mock_fetchmany.call_args[0][0], 2)
+        self.assertEqual(res['row_count'], -1)
+        self.assertEqual(res['fields'], [{'name': 'id', 'type': 23}])
+
+        # the transaction is only released once the rows are consumed
+        self.assertFalse(self.backend.connection.rollback.called)
+        self.assertEqual(list(res['tuples']), [(1,), (2,), (3,)])
+        self.assertTrue(self.backend.connection.rollback.called)
+        self.assertTrue(mock_cursor.return_value.close.called)
+
+    def test_execute_sql_stream_ignores_non_select_queries(self):
+        query = 'CREATE SCHEMA repo'
+
+        mock_cursor = self.backend.connection.cursor
+        mock_cursor.return_value.fetchall.return_value = []
+
+        mock_query_rewriter = MagicMock()
+        mock_query_rewriter.apply_row_level_security.side_effect = lambda x: x
+        self.backend.query_rewriter = mock_query_rewriter
+
+        self.backend.execute_sql(query, stream=True)
+
+        self.assertFalse('name' in mock_cursor.call_args[1])
+        self.assertTrue(mock_cursor.return_value.execute.called)
+
 
 class SchemaListCreateDeleteShare(MockingMixin, TestCase):
     """
@@ -186,6 +289,9 @@ class SchemaListCreateDeleteShare(MockingMixin, TestCase):
         self.mock_as_is = self.create_patch('core.db.backend.pg.AsIs')
         self.mock_as_is.side_effect = lambda x: x
 
+        # catalog queries are cached across backends
+        _catalog_cache.clear()
+
         # create an instance of PGBackend
         self.backend = PGBackend(self.username,
                                  self.password,
@@ -240,6 +346,20 @@ class SchemaListCreateDeleteShare(MockingMixin, TestCase):
 
         self.assertEqual(res, ['test_table'])
 
+    def test_catalog_queries_are_cached(self):
+        self.mock_execute_sql.return_value = {
+            'status': True, 'row_count': 1, 'tuples': [('repo',)],
+            'fields': [{'type': 1043, 'name': 'repo_name'}]}
+
+        self.assertEqual(self.backend.list_repos(), ['repo'])
+        self.assertEqual(self.backend.list_repos(), ['repo'])
+        self.assertEqual(self.mock_execute_sql.call_count, 1)
+
+        # other users may see different repos
+        other = PGBackend('other', 'password', repo_base=self.username)
+        other.list_repos()
+        self.assertEqual(self.mock_execute_sql.call_count, 2)
+
     def test_rename_repo(self):
         alter_repo_sql = 'ALTER SCHEMA %s RENAME TO %s'
         self.mock_execute_sql.return_value = {
@@ -655,6 +775,198 @@ class SchemaListCreateDeleteShare(MockingMixin, TestCase):
         self.assertEqual(self.mock_check_for_injections.call_count, 1)
         self.assertEqual(self.mock_validate_table_name.call_count, 1)
 
+    def test_list_query_tables(self):
+        plan = {'Node Type': 'Hash Join', 'Plans': [
+            {'Node Type': 'Seq Scan', 'Schema': 'repo',
+             'Relation Name': 'b'},
+            {'Node Type': 'Hash', 'Plans': [
+                {'Node Type': 'Seq Scan', 'Schema': 'repo',
+                 'Relation Name': 'a'}]}]}
+        self.mock_execute_sql.return_value = {
+            'status': True, 'row_count': 1, 'tuples': [([{'Plan': plan}],)],
+            'fields': [{'type': 114, 'name': 'QUERY PLAN'}]}
+
+        query = 'SELECT * FROM repo.a JOIN repo.b ON a.id = b.id;'
+        res = self.backend.list_query_tables(query)
+        self.assertEqual(res, [('repo', 'a'), ('repo', 'b')])
+        self.assertEqual(
+            self.mock_execute_sql.call_args[0][0],
+            'EXPLAIN (VERBOSE, FORMAT JSON) '
+            'SELECT * FROM repo.a JOIN repo.b ON a.id = b.id')
+
+        # the tables are cached until the next DDL statement
+        self.backend.list_query_tables(query)
+        self.assertEqual(self.mock_execute_sql.call_count, 1)
+
+    def test_get_table_versions(self):
+        self.mock_execute_sql.return_value = {
+            'status': True, 'row_count': 2,
+            'tuples': [('repo', 'a', 16384, 10, 0, 1),
+                       ('repo', 'b', 16390, 3, 2, 0)],
+            'fields': []}
+
+        res = self.backend.get_table_versions([('repo', 'a'), ('repo', 'b')])
+        self.assertEqual(res, (('repo', 'a', 16384, 10, 0, 1),
+                               ('repo', 'b', 16390, 3, 2, 0)))
+        self.assertEqual(self.mock_execute_sql.call_args[0][1],
+                         (['repo.a', 'repo.b'],))
+
+        # tables the statistics collector doesn't track can't be versioned
+        self.assertEqual(
+            self.backend.get_table_versions(
+                [('repo', 'a'), ('repo', 'b'), ('repo', 'c')]), None)
+        self.assertEqual(self.backend.get_table_versions([]), None)
+
+    def test_create_trigram_index(self):
+        self.mock_execute_sql.return_value = {
+            'status': True, 'row_count': 0, 'tuples': [], 'fields': []}
+        index = _index_name('table', 'name', 'trgm')
+
+        self.assertTrue(
+            self.backend.create_trigram_index('repo', 'table', 'name'))
+        self.assertEqual(self.mock_execute_sql.call_args_list[0][0][1],
+                         ('repo', index))
+        self.assertEqual(
+            self.mock_execute_sql.call_args[0][0],
+            'CREATE INDEX CONCURRENTLY "%s" ON repo.table '
+            'USING gin ("name" gin_trgm_ops)' % index)
+
+        # columns that already have one aren't indexed again
+        self.mock_execute_sql.reset_mock()
+        self.mock_execute_sql.return_value = {
+            'status': True, 'row_count': 1, 'tuples': [(True,)],
+            'fields': []}
+        self.assertFalse(
+            self.backend.create_trigram_index('repo', 'table', 'name'))
+        self.assertEqual(self.mock_execute_sql.call_count, 1)
+
+        self.mock_check_for_injections.assert_called_with('repo')
+        self.mock_validate_table_name.assert_called_with('name')
+
+    def test_create_trigram_index_drops_invalid_indexes(self):
+        index = _index_name('table', 'name', 'trgm')
+        drop_query = 'DROP INDEX CONCURRENTLY IF EXISTS repo."%s"' % index
+
+        # left behind by a build that failed
+        self.mock_execute_sql.return_value = {
+            'status': True, 'row_count': 1, 'tuples': [(False,)],
+            'fields': []}
+        self.assertTrue(
+            self.backend.create_trigram_index('repo', 'table', 'name'))
+        queries = [c[0][0] for c in self.mock_execute_sql.call_args_list]
+        self.assertEqual(queries[1], drop_query)
+        self.assertTrue(queries[2].startswith('CREATE INDEX CONCURRENTLY'))
+
+        # and by this build, if it fails
+        self.mock_execute_sql.reset_mock()
+        self.mock_execute_sql.side_effect = [
+            {'status': True, 'row_count': 0, 'tuples': [], 'fields': []},
+            psycopg2.ProgrammingError('operator class does not exist'),
+            {'status': True, 'row_count': 0, 'tuples': [], 'fields': []}]
+        with self.assertRaises(psycopg2.ProgrammingError):
+            self.backend.create_trigram_index('repo', 'table', 'name')
+        self.assertEqual(
+            self.mock_execute_sql.call_args[0][0], drop_query)
+
+    def test_index_names_are_distinct_and_fit(self):
+        self.assertNotEqual(_index_name('a_b', 'c', 'trgm'),
+                            _index_name('a', 'b_c', 'trgm'))
+        long_name = _index_name('t' * 63, 'c' * 63, 'trgm')
+        self.assertEqual(len(long_name), 63)
+        self.assertTrue(long_name.endswith('_trgm'))
+        self.assertNotEqual(long_name, _index_name('t' * 63, 'd' * 63, 'trgm'))
+
+    def test_sync_row_level_security(self):
+        mock_execute_batch = self.create_patch(
+            'core.db.backend.pg.PGBackend.execute_batch')
+        self.mock_execute_sql.side_effect = [
+            {'tuples': [('dh_select',)]},
+            {'tuples': [('bob',)]}]
+        policies = [
+            ("owner = USERNAME", 'select', 'bob'),
+            ("public = true", 'select', 'ALL'),
+            ("INSERT='True'", 'insert', 'ALL'),
+            ("id > 1", 'update', 'bob'),
+            ("id < 10", 'update', 'bob'),
+            ("id > 0", 'select', 'no_such_user')]
+
+        self.assertTrue(self.backend.sync_row_level_security(
+            'repo', 'table', policies))
+        self.assertEqual(
+            self.mock_execute_sql.call_args_list[0][0][1],
+            ('repo.table', 'dh\\_%'))
+        self.assertEqual(
+            sorted(self.mock_execute_sql.call_args_list[1][0][1][0]),
+            ['ALL', 'bob', 'no_such_user'])
+
+        statements = [query % params
+                      for query, params in mock_execute_batch.call_args[0][0]]
+        self.assertEqual(statements, [
+            'DROP POLICY "dh_select" ON repo.table;',
+            'CREATE POLICY dh_select_0 ON repo.table FOR SELECT TO "bob" '
+            'USING ((owner = current_user) OR (public = true));',
+            "CREATE POLICY dh_select ON repo.table FOR SELECT TO PUBLIC USING "
+            "(((public = true)) AND current_user <> ALL (['bob']::name[]));",
+            'CREATE POLICY dh_insert ON repo.table FOR INSERT TO PUBLIC '
+            'WITH CHECK (true);',
+            'CREATE POLICY dh_update_0 ON repo.table FOR UPDATE TO "bob" '
+            'USING ((id > 1) AND (id < 10));',
+            "CREATE POLICY dh_update ON repo.table FOR UPDATE TO PUBLIC USING "
+            "((true) AND current_user <> ALL (['bob']::name[]));",
+            'CREATE POLICY dh_delete ON repo.table FOR DELETE TO PUBLIC '
+            'USING (true);',
+            'ALTER TABLE repo.table ENABLE ROW LEVEL SECURITY;'])
+
+        # tables without policies have row level security turned off
+        self.mock_execute_sql.side_effect = [
+            {'tuples': [('dh_select',)]}, {'tuples': []}]
+        self.backend.sync_row_level_security('repo', 'table', [])
+        statements = [query % params
+                      for query, params in mock_execute_batch.call_args[0][0]]
+        self.assertEqual(statements, [
+            'DROP POLICY "dh_select" ON repo.table;',
+            'ALTER TABLE repo.table DISABLE ROW LEVEL SECURITY;'])
+
+    def test_keyset_select_query(self):
+        query = "SELECT * FROM repo.table WHERE name LIKE 'a%';"
+        res = self.backend.keyset_select_query(
+            query, order_by=['id', 'Name'], last_values=None, limit=11)
+        self.assertEqual(res['params'], None)
+        self.assertEqual(
+            res['query'],
+            "select * from ( SELECT * FROM repo.table WHERE name LIKE 'a%' ) "
+            "as BXCQWVPEMWVKFBEBNKZSRPYBSB "
+            "ORDER BY \"id\", \"Name\" LIMIT 11;")
+
+        res = self.backend.keyset_select_query(
+            query, order_by=['id', 'Name'], last_values=[4, 'b'], limit=11)
+        self.assertEqual(res['params'], (4, 'b'))
+        self.assertEqual(
+            res['query'],
+            "select * from ( SELECT * FROM repo.table WHERE name LIKE 'a%%' ) "
+            "as BXCQWVPEMWVKFBEBNKZSRPYBSB "
+            "WHERE (\"id\", \"Name\") > (%s, %s) "
+            "ORDER BY \"id\", \"Name\" LIMIT 11;")
+
+        res = self.backend.keyset_select_query(
+            'DELETE FROM repo.table', order_by=['id'], last_values=[4],
+            limit=11)
+        self.assertFalse(res['select_query'])
+        self.assertEqual(res['query'], 'DELETE FROM repo.table')
+
+    def test_get_primary_key(self):
+        self.mock_execute_sql.return_value = {
+            'status': True, 'row_count': 2,
+            'tuples': [('id',), ('version',)]}
+
+        res = self.backend.get_primary_key('repo', 'table')
+
+        self.assertEqual(res, ['id', 'version'])
+        self.assertEqual(
+            self.mock_execute_sql.call_args[0][1], ('repo', 'table'))
+        self.assertEqual(self.mock_check_for_injections.call_count, 1)
+        self.assertEqual(self.mock_validate_table_name.call_count, 1)
+
     def test_create_public_user_no_create_db(self):
         create_user_query = ('CREATE ROLE %s WITH LOGIN '
                              'NOCREATEDB NOCREATEROLE NOCREATEUSER '
@@ -760,14 +1072,23 @@ class SchemaListCreateDeleteShare(MockingMixin, TestCase):
         self.assertEqual(
             self.mock_execute_sql.call_args_list[1][0][1], revoke_params_2)
 
+        # other processes' connections are ended
+        terminate_query = (
+            'SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+            'WHERE datname = %s AND pid <> pg_backend_pid();')
+        self.assertEqual(
+            self.mock_execute_sql.call_args_list[2][0][0], terminate_query)
+        self.assertEqual(
+            self.mock_execute_sql.call_args_list[2][0][1], (self.username,))
+
         # drop statement stuff
         drop_query = 'DROP DATABASE %s;'
         drop_params = (self.username,)
 
         self.assertEqual(
-            self.mock_execute_sql.call_args_list[2][0][0], drop_query)
+            self.mock_execute_sql.call_args_list[3][0][0], drop_query)
         self.assertEqual(
-            self.mock_execute_sql.call_args_list[2][0][1], drop_params)
+            self.mock_execute_sql.call_args_list[3][0][1], drop_params)
         self.assertEqual(self.mock_as_is.call_count, 5)
         self.assertEqual(self.mock_check_for_injections.call_count, 1)
 
@@ -1069,6 +1390,30 @@ class SchemaListCreateDeleteShare(MockingMixin, TestCase):
             query=('COPY (text before semicolon) '
                    'TO STDOUT WITH CSV  DELIMITER \',\';'))
 
+    @patch('core.db.backend.pg.os.makedirs')
+    @patch('core.db.backend.pg.shutil.move')
+    @patch('core.db.backend.pg.columnar.write_rows')
+    def test_export_query_columnar(self, mock_write_rows, *args):
+        self.backend.connection = Mock()
+        rows = Mock()
+        fields = [{'name': 'id', 'type': 23}]
+        mock_stream = self.create_patch(
+            'core.db.backend.pg.PGBackend._execute_sql_stream')
+        mock_stream.return_value = {'fields': fields, 'tuples': rows}
+
+        with patch("__builtin__.open", mock_open()):
+            self.backend.export_query('myquery; more', 'file_path',
+                                      'PARQUET', ',', True)
+
+        # rows are streamed from a server-side cursor, not copied out
+        mock_stream.assert_called_once_with(
+            'myquery', batch_size=COLUMNAR_BATCH_SIZE)
+        self.assertEqual(mock_write_rows.call_args[0][:2], (fields, rows))
+        self.assertEqual(mock_write_rows.call_args[0][3], 'PARQUET')
+        self.assertFalse(
+            self.backend.connection.cursor.return_value.copy_expert.called)
+        self.assertTrue(rows.close.called)
+
     def test_import_file_with_header(self):
         query = 'COPY %s FROM %s WITH %s %s DELIMITER %s ENCODING %s QUOTE %s;'
         table_name = 'user_name.repo_name.table_name'
@@ -1090,6 +1435,22 @@ class SchemaListCreateDeleteShare(MockingMixin, TestCase):
         self.assertEqual(self.mock_check_for_injections. call_count, 3)
         self.assertEqual(self.mock_validate_table_name.call_count, 1)
 
+    def test_import_file_with_progress_streams_the_file(self):
+        self.backend.connection = Mock()
+        mock_cursor = self.backend.connection.cursor.return_value
+        mock_cursor.copy_expert.side_effect = (
+            lambda query, f: f.read(4) and f.read(4))
+        progress = Mock()
+
+        with patch("__builtin__.open", mock_open(read_data='a,b\n1,2\n')):
+            self.backend.import_file('repo.table', 'file_path',
+                                     progress=progress)
+
+        self.assertEqual(mock_cursor.mogrify.call_args[0][1][:3],
+                         ('repo.table', 'STDIN', 'CSV'))
+        self.assertEqual(progress.call_count, 2)
+        self.assertFalse(self.mock_execute_sql.called)
+
     def test_import_table_with_no_header(self):
         table_name = 'table_name'
         file_path = 'file_path'
@@ -1105,6 +1466,57 @@ class SchemaListCreateDeleteShare(MockingMixin, TestCase):
                                  header, encoding, quote_character)
         self.assertEqual(self.mock_execute_sql.call_args[0][1], params)
 
+    def test_import_rows_copies_in_batches(self):
+        self.backend.connection = Mock()
+        self.backend.query_rewriter = Mock()
+        mock_cursor = self.backend.connection.cursor.return_value
+        mock_cursor.mogrify.return_value = 'copy query'
+        copied = []
+        mock_cursor.copy_expert.side_effect = (
+            lambda query, data: copied.append(data.read()))
+
+        rows = ['a,b', '1,2', '3,', u'5,\xe9', '7,8']
+        res = self.backend.import_rows(
+            'repo', 'table', iter(rows), header=True, batch_size=3)
+
+        mock_cursor.mogrify.assert_called_once_with(
+            'COPY %s.%s FROM STDIN WITH (FORMAT csv, ENCODING %s)',
+            ('repo', 'table', 'UTF8'))
+        self.assertEqual(mock_cursor.copy_expert.call_args[0][0],
+                         'copy query')
+        self.assertEqual(copied, [
+            '"1","2"\r\n"3",""\r\n"5","\xc3\xa9"\r\n',
+            '"7","8"\r\n'])
+        self.assertEqual(
+            res, {'status': True, 'row_count': 4, 'errors': []})
+        self.assertTrue(
+            self.backend.query_rewriter.apply_row_level_security.called)
+        self.assertEqual(self.mock_check_for_injections.call_count, 1)
+        self.assertEqual(self.mock_validate_table_name.call_count, 1)
+        self.assertTrue(mock_cursor.close.called)
+
+    def test_import_rows_reports_failed_batches(self):
+        self.backend.connection = Mock()
+        self.backend.query_rewriter = Mock()
+        mock_cursor = self.backend.connection.cursor.return_value
+        error = psycopg2.DataError('extra data after last expected column')
+        mock_cursor.copy_expert.side_effect = [None, error, None]
+
+        rows = ['1', '2', '3,4', '5', '6']
+        res = self.backend.import_rows(
+            'repo', 'table', rows, batch_size=2, stop_on_error=False)
+
+        self.assertEqual(res['status'], False)
+        self.assertEqual(res['row_count'], 3)
+        self.assertEqual(res['errors'], [{
+            'batch': 1, 'first_row': 3, 'last_row': 4,
+            'error': 'extra data after last expected column'}])
+
+        mock_cursor.copy_expert.side_effect = [None, error, None]
+        with self.assertRaises(ImportError):
+            self.backend.import_rows('repo', 'table', rows, batch_size=2)
+        self.assertEqual(mock_cursor.copy_expert.call_count, 5)
+
     def test_import_file_w_dbtruck(self):
         # DBTruck is not tested for safety/security... At all.
         # The method does so little
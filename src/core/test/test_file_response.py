@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+from django.test import TestCase, RequestFactory
+
+from core.file_response import file_response, parse_range
+
+
+class FileResponseTests(TestCase):
+    """Tests streaming files with range and conditional requests."""
+
+    def setUp(self):
+        fd, self.file_path = tempfile.mkstemp(suffix='.csv')
+        os.write(fd, b'0123456789')
+        os.close(fd)
+        self.addCleanup(os.remove, self.file_path)
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        request = self.factory.get('/', **headers)
+        return file_response(request, self.file_path, 'data.csv')
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-4', 10), (0, 4))
+        self.assertEqual(parse_range('bytes=5-', 10), (5, 9))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=8-100', 10), (8, 9))
+        # unsupported ranges get the whole file
+        self.assertEqual(parse_range('bytes=0-1,4-5', 10), None)
+        self.assertEqual(parse_range('lines=0-1', 10), None)
+        with self.assertRaises(ValueError):
+            parse_range('bytes=10-', 10)
+
+    def test_whole_file(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="data.csv"')
+        self.assertTrue(response['ETag'])
+
+    def test_range(self):
+        response = self.get(HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        response = self.get(HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_conditional_requests(self):
+        tag = self.get()['ETag']
+        last_modified = self.get()['Last-Modified']
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=tag).status_code, 304)
+        self.assertEqual(
+            self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(
+            self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+        # ranges of a file that has changed get the whole file instead
+        response = self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        response = self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE=tag)
+        self.assertEqual(response.status_code, 206)
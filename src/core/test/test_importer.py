@@ -0,0 +1,97 @@
+import threading
+
+import psycopg2
+from mock import MagicMock
+
+from django.test import TestCase
+
+from core.db.importer import infer_types, convert_row, ParallelLoader
+
+
+class TypeInference(TestCase):
+    """Tests inferring column types from sample rows."""
+
+    def test_infer_types(self):
+        rows = [
+            ['1', '2147483648', '1.5', 'true', '2016-01-02',
+             '2016-01-02 03:04:05', '2016-01-02T03:04:05+01:00', 'a'],
+            ['-2', '3', '2', 'F', '2016-1-2',
+             '2016-01-02', '2016-01-02 03:04Z', '1'],
+            ['', '', '1e-3', '', '', '', '', ''],
+        ]
+        self.assertEqual(
+            infer_types(rows, 9),
+            ['integer', 'bigint', 'float8', 'boolean', 'date', 'timestamp',
+             'timestamptz', 'text', 'text'])
+
+    def test_convert_row(self):
+        types = ['integer', 'text', 'float8']
+        self.assertEqual(convert_row([' 1 ', '', ' '], types),
+                         [' 1 ', None, None])
+        self.assertEqual(convert_row(['1', ' ', '2.5'], types),
+                         ['1', ' ', '2.5'])
+
+        with self.assertRaises(ValueError):
+            convert_row(['x', '', ''], types)
+        with self.assertRaises(ValueError):
+            convert_row(['1', ''], types)
+
+
+class ParallelLoading(TestCase):
+    """Tests loading rows in batches, and rejecting bad ones."""
+
+    def setUp(self):
+        self.loaded = []
+        self.rejects = []
+        self.lock = threading.Lock()
+
+        def copy_rows(repo, table, columns, rows):
+            if table == 'table_rejects':
+                with self.lock:
+                    self.rejects.extend(rows)
+            elif any(row[0] == '13' for row in rows):
+                # the database rejects the batch with the bad row in it
+                raise psycopg2.DataError('bad value')
+            else:
+                with self.lock:
+                    self.loaded.extend(rows)
+
+        conn = MagicMock()
+        conn.__enter__.return_value.copy_rows.side_effect = copy_rows
+        self.create_rejects_table = MagicMock(return_value='table_rejects')
+        self.loader = ParallelLoader(
+            connect=lambda: conn, repo='repo', table='table',
+            columns=['a', 'b'], types=['integer', 'text'],
+            create_rejects_table=self.create_rejects_table,
+            connections=3, batch_size=4)
+
+    def test_load(self):
+        rows = [(i, [unicode(i), u'x']) for i in range(1, 21)]
+        rows.insert(5, (99, [u'y', u'x']))
+
+        self.assertEqual(self.loader.load(iter(rows)), 19)
+        self.assertEqual(sorted(int(r[0]) for r in self.loaded),
+                         [i for i in range(1, 21) if i != 13])
+
+        # the row that didn't fit its column type and the one the database
+        # rejected are written to the rejects table
+        self.assertEqual(self.loader.rejected, 2)
+        self.assertEqual(self.loader.rejects_table, 'table_rejects')
+        self.assertEqual(self.create_rejects_table.call_count, 1)
+        self.assertEqual(sorted(r[:2] for r in self.rejects),
+                         [(u'13', u'13,x'), (u'99', u'y,x')])
+
+    def test_no_rejects(self):
+        rows = [(i, [unicode(i), u'x']) for i in range(1, 5)]
+
+        self.assertEqual(self.loader.load(iter(rows)), 4)
+        self.assertEqual(self.loader.rejected, 0)
+        self.assertIsNone(self.loader.rejects_table)
+        self.assertFalse(self.create_rejects_table.called)
+
+    def test_fatal_error(self):
+        self.loader.connect = MagicMock(side_effect=psycopg2.OperationalError)
+        rows = [(i, [unicode(i), u'x']) for i in range(1, 41)]
+
+        with self.assertRaises(psycopg2.OperationalError):
+            self.loader.load(iter(rows))
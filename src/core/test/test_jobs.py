@@ -0,0 +1,151 @@
+import datetime
+import json
+
+from mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.db.errors import PermissionDenied
+from core.jobs import (
+    JobCancelled, JobProgress, beat, cancel_job, claim_job, fail_stale_jobs,
+    run_job, submit_job)
+from inventory.models import Job
+
+
+class JobTests(TestCase):
+    """Tests queueing, claiming, running and cancelling jobs."""
+
+    def setUp(self):
+        self.mock_manager = self.create_patch('core.jobs.DataHubManager')
+
+    def create_patch(self, name):
+        # helper method for creating patches
+        patcher = patch(name)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def submit(self, kind='export_table', **params):
+        params = params or {'table': 'table', 'file_name': 'out'}
+        return submit_job('username', 'repo_base', 'repo', kind, **params)
+
+    def test_submit_job_checks_privileges(self):
+        job = self.submit()
+
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(json.loads(job.params),
+                         {'table': 'table', 'file_name': 'out'})
+        self.mock_manager.has_repo_db_privilege.assert_called_once_with(
+            'username', 'repo_base', 'repo', 'CREATE')
+
+        self.mock_manager.has_repo_db_privilege.side_effect = (
+            PermissionDenied())
+        with self.assertRaises(PermissionDenied):
+            self.submit()
+        with self.assertRaises(ValueError):
+            self.submit('drop_everything')
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_submit_refine_file_checks_file(self):
+        params = {'table': 'table', 'file_name': 'server.log',
+                  'training_input': '[]', 'training_output': '[]'}
+        self.submit('refine_file', **params)
+        self.mock_manager.has_repo_file_privilege.assert_called_once_with(
+            'username', 'repo_base', 'repo', 'read')
+
+        params['file_name'] = '../other_repo/server.log'
+        with self.assertRaises(ValueError):
+            self.submit('refine_file', **params)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_jobs_are_claimed_once_in_order(self):
+        first, second = self.submit(), self.submit()
+
+        self.assertEqual(claim_job('worker').id, first.id)
+        self.assertEqual(claim_job('worker').id, second.id)
+        self.assertEqual(claim_job('worker'), None)
+
+        first = Job.objects.get(id=first.id)
+        self.assertEqual(first.status, Job.RUNNING)
+        self.assertEqual(first.worker, 'worker')
+        self.assertTrue(first.started)
+
+    def test_run_job_records_result_and_progress(self):
+        def export_table(progress, **kwargs):
+            progress(100)
+            progress(50)
+        manager = self.mock_manager.return_value.__enter__.return_value
+        manager.export_table.side_effect = export_table
+
+        self.submit()
+        run_job(claim_job('worker'))
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, 'out.CSV')
+        self.assertEqual(job.progress, 150)
+        self.assertTrue(job.finished)
+        self.assertEqual(manager.export_table.call_args[1]['table'], 'table')
+
+    def test_run_job_records_errors(self):
+        manager = self.mock_manager.return_value.__enter__.return_value
+        manager.export_table.side_effect = LookupError('No such table.')
+
+        self.submit()
+        run_job(claim_job('worker'))
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.error, 'No such table.')
+        self.assertEqual(job.result, None)
+
+    def test_cancel_queued_job(self):
+        job = cancel_job(self.submit())
+
+        self.assertEqual(job.status, Job.CANCELLED)
+        self.assertEqual(claim_job('worker'), None)
+
+    def test_cancel_running_job(self):
+        self.submit()
+        job = claim_job('worker')
+
+        def export_table(progress, **kwargs):
+            cancel_job(job)
+            progress.update()
+        manager = self.mock_manager.return_value.__enter__.return_value
+        manager.export_table.side_effect = export_table
+        run_job(job)
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.CANCELLED)
+        self.assertTrue(job.cancel_requested)
+
+    def test_progress_is_saved_at_intervals(self):
+        job = self.submit()
+        progress = JobProgress(job, interval=0)
+        progress(10)
+        self.assertEqual(Job.objects.get().progress, 10)
+
+        progress = JobProgress(job, interval=60)
+        progress(5)
+        self.assertEqual(Job.objects.get().progress, 10)
+
+        Job.objects.filter(id=job.id).update(cancel_requested=True)
+        with self.assertRaises(JobCancelled):
+            progress.update()
+        self.assertEqual(Job.objects.get().progress, 5)
+
+    def test_stale_running_jobs_are_stopped(self):
+        first, second, third = self.submit(), self.submit(), self.submit()
+        first, second = claim_job('dead:0'), claim_job('alive:0')
+        cancel_job(claim_job('dead:1'))
+        Job.objects.update(
+            heartbeat=timezone.now() - datetime.timedelta(minutes=5))
+        beat('alive')
+
+        self.assertEqual(fail_stale_jobs(timeout=60), 2)
+        self.assertEqual(Job.objects.get(id=first.id).status, Job.FAILED)
+        self.assertEqual(Job.objects.get(id=second.id).status, Job.RUNNING)
+        self.assertEqual(Job.objects.get(id=third.id).status, Job.CANCELLED)
+        self.assertEqual(fail_stale_jobs(timeout=60), 0)
@@ -1,5 +1,13 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from config import settings
 from core.db.manager import DataHubManager, \
-                            PermissionDenied
+                            PermissionDenied, user_data_path, \
+                            _privilege_cache, _open_upload, _upload_path
 
 from django.db.models import signals
 from django.contrib.auth.models import User
@@ -7,6 +15,7 @@ from django.test import TestCase
 
 import factory
 from mock import patch, MagicMock
+from psycopg2 import ProgrammingError
 
 
 class Initialization(TestCase):
@@ -211,6 +220,345 @@ class BasicOperations(TestCase):
         self.assertEqual(con_get_schema.call_args[1]['repo'], 'reponame')
         self.assertEqual(con_get_schema.call_args[1]['table'], 'tablename')
 
+    def test_keyset_paginate_query(self):
+        con_keyset = self.mock_connection.return_value.keyset_select_query
+        con_keyset.return_value = {
+            'select_query': True, 'query': 'keyset query', 'params': None}
+        con_execute_sql = self.mock_connection.return_value.execute_sql
+        con_execute_sql.return_value = {
+            'status': True, 'row_count': 3,
+            'fields': [{'name': 'id'}, {'name': 'words'}],
+            'tuples': [(1, 'a'), (2, 'b'), (3, 'c')]}
+
+        query = 'SELECT * FROM repo.table'
+        res = self.manager.keyset_paginate_query(
+            query, rows_per_page=2, order_by=['id'])
+
+        # one extra row is fetched to detect the next page
+        self.assertEqual(con_keyset.call_args[1]['limit'], 3)
+        self.assertEqual(con_keyset.call_args[1]['last_values'], None)
+        self.assertEqual(res['rows'], [(1, 'a'), (2, 'b')])
+        self.assertEqual(res['column_names'], ['id', 'words'])
+        self.assertTrue(res['next_page_token'])
+
+        # the token seeks past the last row of the previous page
+        con_execute_sql.return_value['tuples'] = [(3, 'c')]
+        res = self.manager.keyset_paginate_query(
+            query, rows_per_page=2, order_by=['id'],
+            page_token=res['next_page_token'])
+        self.assertEqual(con_keyset.call_args[1]['last_values'], [2])
+        self.assertEqual(res['rows'], [(3, 'c')])
+        self.assertEqual(res['next_page_token'], None)
+
+    def test_keyset_paginate_query_rejects_foreign_tokens(self):
+        con_keyset = self.mock_connection.return_value.keyset_select_query
+        con_keyset.return_value = {
+            'select_query': True, 'query': 'keyset query', 'params': None}
+        self.mock_connection.return_value.execute_sql.return_value = {
+            'status': True, 'row_count': 2,
+            'fields': [{'name': 'id'}], 'tuples': [(1,), (2,)]}
+
+        res = self.manager.keyset_paginate_query(
+            'SELECT * FROM repo.table', rows_per_page=1, order_by=['id'])
+
+        with self.assertRaises(ValueError):
+            self.manager.keyset_paginate_query(
+                'SELECT * FROM repo.other_table', rows_per_page=1,
+                order_by=['id'], page_token=res['next_page_token'])
+        with self.assertRaises(ValueError):
+            self.manager.keyset_paginate_query(
+                'SELECT * FROM repo.table', rows_per_page=1,
+                order_by=['id'], page_token='not a token')
+        with self.assertRaises(ValueError):
+            self.manager.keyset_paginate_query(
+                'SELECT * FROM repo.table', rows_per_page=1, order_by=[])
+
+
+class ResumableUploads(TestCase):
+    """Tests resumable uploads in manager.py."""
+
+    @factory.django.mute_signals(signals.pre_save)
+    def setUp(self):
+        self.username = "delete_me_test_username"
+        User.objects.create_user(
+            self.username, "test_email@csail.mit.edu", "password")
+        self.create_patch('core.db.manager.DataHubConnection')
+        self.create_patch(
+            'core.db.manager.DataHubManager.create_user_data_folder')
+
+        # keep the files out of /user_data
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        mock_path = self.create_patch('core.db.manager.user_data_path')
+        mock_path.side_effect = lambda *args, **kwargs: user_data_path(
+            *args, **kwargs).replace('/user_data', self.root, 1)
+        os.makedirs(os.path.join(self.root, self.username, 'repo'))
+
+        self.manager = DataHubManager(
+            user=self.username, repo_base=self.username)
+
+    def create_patch(self, name):
+        # helper method for creating patches
+        patcher = patch(name)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def read_file(self, file_name):
+        with open(self.manager.get_file_path('repo', file_name)) as f:
+            return f.read()
+
+    def test_upload_in_chunks(self):
+        upload = self.manager.start_upload('repo', 'data.csv', 8)
+        upload_id = upload['upload_id']
+        self.assertEqual(upload['offset'], 0)
+        # incomplete uploads aren't listed with the repo's files
+        self.assertEqual(
+            os.listdir(os.path.join(self.root, self.username, 'repo')), [])
+
+        upload = self.manager.append_upload(
+            'repo', upload_id, 0, io.BytesIO(b'a,b\n'))
+        self.assertEqual(upload['offset'], 4)
+        self.assertFalse(upload['complete'])
+
+        upload = self.manager.append_upload(
+            'repo', upload_id, 4, io.BytesIO(b'1,2\n'))
+        self.assertTrue(upload['complete'])
+        self.assertEqual(self.read_file('data.csv'), 'a,b\n1,2\n')
+        with self.assertRaises(LookupError):
+            self.manager.describe_upload('repo', upload_id)
+
+    def test_upload_resumes_from_its_offset(self):
+        upload_id = self.manager.start_upload(
+            'repo', 'data.csv', 8)['upload_id']
+        self.manager.append_upload(
+            'repo', upload_id, 0, io.BytesIO(b'a,b\n1'))
+
+        # the client resends a chunk it thinks was lost
+        with self.assertRaises(ValueError):
+            self.manager.append_upload(
+                'repo', upload_id, 4, io.BytesIO(b'1,2\n'))
+
+        offset = self.manager.describe_upload('repo', upload_id)['offset']
+        self.assertEqual(offset, 5)
+        self.manager.append_upload(
+            'repo', upload_id, offset, io.BytesIO(b',2\n'))
+        self.assertEqual(self.read_file('data.csv'), 'a,b\n1,2\n')
+
+    def test_upload_cannot_grow_past_its_size(self):
+        upload_id = self.manager.start_upload(
+            'repo', 'data.csv', 4)['upload_id']
+        with self.assertRaises(ValueError):
+            self.manager.append_upload(
+                'repo', upload_id, 0, io.BytesIO(b'a,b\n1,2\n'))
+        self.assertEqual(
+            self.manager.describe_upload('repo', upload_id)['offset'], 0)
+
+    def test_cancel_upload(self):
+        upload_id = self.manager.start_upload(
+            'repo', 'data.csv', 4)['upload_id']
+        self.manager.cancel_upload('repo', upload_id)
+
+        with self.assertRaises(LookupError):
+            self.manager.describe_upload('repo', upload_id)
+        with self.assertRaises(LookupError):
+            self.manager.describe_upload('repo', '../../etc/passwd')
+
+    def test_upload_file_names_stay_in_the_repo(self):
+        for file_name in ['x/../../../../tmp/evil', '../evil', 'x\\y',
+                          'a..b']:
+            with self.assertRaises(ValueError):
+                self.manager.start_upload('repo', file_name, 4)
+
+    def test_finished_upload_cannot_be_appended_to(self):
+        upload_id = self.manager.start_upload(
+            'repo', 'data.csv', 4)['upload_id']
+        upload_path = _upload_path(
+            self.username, 'repo', upload_id)
+        self.manager.append_upload('repo', upload_id, 0, io.BytesIO(b'a,b\n'))
+
+        # a request that was waiting on the lock when the upload finished
+        with self.assertRaises(LookupError):
+            _open_upload(upload_path)
+        self.assertFalse(os.path.exists(upload_path))
+        self.assertEqual(self.read_file('data.csv'), 'a,b\n')
+
+    def test_abandoned_uploads_expire(self):
+        old_id = self.manager.start_upload(
+            'repo', 'old.csv', 4)['upload_id']
+        upload_path = _upload_path(
+            self.username, 'repo', old_id)
+        an_hour_past_expiry = time.time() - settings.UPLOAD_EXPIRY - 3600
+        os.utime(upload_path, (an_hour_past_expiry, an_hour_past_expiry))
+
+        new_id = self.manager.start_upload(
+            'repo', 'new.csv', 4)['upload_id']
+        with self.assertRaises(LookupError):
+            self.manager.describe_upload('repo', old_id)
+        self.manager.describe_upload('repo', new_id)
+
+
+class RefineFile(TestCase):
+    """Tests refining files in the repo into tables."""
+
+    training_input = '["x 1 ok", "y 22 failed"]'
+    training_output = '[["x", "1"], ["y", "22"]]'
+
+    def setUp(self):
+        self.create_patch(
+            'core.db.manager.DataHubManager.has_repo_db_privilege')
+        self.mock_file_privilege = self.create_patch(
+            'core.db.manager.DataHubManager.has_repo_file_privilege')
+        self.mock_load_table = self.create_patch(
+            'core.db.manager.DataHubManager._load_table')
+        # keep the rows, which are generated as they're loaded
+        self.mock_load_table.side_effect = (
+            lambda username, repo_base, repo, table, columns, data:
+            list(data))
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        mock_path = self.create_patch('core.db.manager.user_data_path')
+        mock_path.side_effect = lambda *args, **kwargs: user_data_path(
+            *args, **kwargs).replace('/user_data', self.root, 1)
+        os.makedirs(os.path.join(self.root, 'repo_base', 'repo'))
+        with open(os.path.join(
+                self.root, 'repo_base', 'repo', 'server.log'), 'w') as f:
+            f.write('a 3 ok\nb 44 ok\nc 5 ok\n')
+
+    def create_patch(self, name):
+        # helper method for creating patches
+        patcher = patch(name)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def refine(self, **kwargs):
+        return DataHubManager.refine_file(
+            'username', 'repo_base', 'repo', '', 'server.log',
+            self.training_input, self.training_output, **kwargs)
+
+    def test_refine_file(self):
+        progress = MagicMock()
+        rows = self.refine(header=['Name', 'Count'], progress=progress)
+
+        self.assertEqual(rows, [(1, [u'a', u'3']), (2, [u'b', u'44']),
+                                (3, [u'c', u'5'])])
+        args = self.mock_load_table.call_args[0]
+        self.assertEqual(args[3:5], ('server', ['name', 'count']))
+        self.assertEqual(sum(c[0][0] for c in progress.call_args_list), 22)
+
+    def test_refine_file_checks_column_names(self):
+        with self.assertRaises(ValueError):
+            self.refine(header=['name'])
+
+    def test_refine_file_checks_read_privilege(self):
+        self.mock_file_privilege.side_effect = PermissionDenied()
+        with self.assertRaises(PermissionDenied):
+            self.refine()
+        self.mock_file_privilege.assert_called_once_with(
+            'username', 'repo_base', 'repo', 'read')
+        self.assertFalse(self.mock_load_table.called)
+
+    def test_refine_file_rejects_paths_outside_the_repo(self):
+        for file_name in ['../other_repo/server.log', '..', '/etc/passwd']:
+            with self.assertRaises(ValueError):
+                DataHubManager.refine_file(
+                    'username', 'repo_base', 'repo', '', file_name,
+                    self.training_input, self.training_output)
+        self.assertFalse(self.mock_load_table.called)
+
+
+class ExportCard(TestCase):
+    """Tests exporting cards' results to files."""
+
+    @factory.django.mute_signals(signals.pre_save)
+    def setUp(self):
+        User.objects.create_user('username', 'username@example.com', 'pw')
+        self.mock_connection = self.create_patch(
+            'core.db.manager.DataHubConnection')
+        self.create_patch(
+            'core.db.manager.DataHubManager.has_repo_file_privilege')
+        self.create_patch('core.db.manager.Card')
+        self.mock_create_folder = self.create_patch(
+            'core.db.manager.DataHubManager.create_user_data_folder')
+        self.manager = DataHubManager(user='username')
+
+    def create_patch(self, name):
+        # helper method for creating patches
+        patcher = patch(name)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def export(self):
+        self.manager.export_card('repo', 'out', 'card')
+
+    def test_query_is_checked_before_writing(self):
+        con = self.mock_connection.return_value
+        con.list_query_tables.side_effect = ProgrammingError()
+
+        with self.assertRaises(PermissionDenied):
+            self.export()
+        self.assertFalse(self.mock_create_folder.called)
+        self.assertFalse(con.export_query.called)
+
+    def test_only_query_errors_are_permission_errors(self):
+        con = self.mock_connection.return_value
+        con.export_query.side_effect = ProgrammingError()
+        with self.assertRaises(PermissionDenied):
+            self.export()
+
+        con.export_query.side_effect = IOError('No space left on device')
+        with self.assertRaises(IOError):
+            self.export()
+
+
+class LoadTable(TestCase):
+    """Tests loading imported and refined rows into new tables."""
+
+    @factory.django.mute_signals(signals.pre_save)
+    def setUp(self):
+        User.objects.create_user('username', 'username@example.com', 'pw')
+        self.create_patch('core.db.manager.DataHubConnection')
+        self.mock_loader = self.create_patch(
+            'core.db.manager.importer.ParallelLoader')
+        mock_superuser = self.create_patch(
+            'core.db.manager._superuser_connection')
+        self.mock_superuser_con = (
+            mock_superuser.return_value.__enter__.return_value)
+
+    def create_patch(self, name):
+        # helper method for creating patches
+        patcher = patch(name)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def load(self):
+        return DataHubManager._load_table(
+            'username', 'repo_base', 'repo', 'table', ['a'],
+            iter([(1, ['x'])]))
+
+    def test_failed_load_drops_its_tables(self):
+        loader = self.mock_loader.return_value
+        loader.load.side_effect = Exception('COPY failed')
+        loader.rejects_table = 'table_rejects'
+
+        with self.assertRaises(ImportError):
+            self.load()
+        self.assertEqual(
+            [c[1]['table'] for c in
+             self.mock_superuser_con.delete_table.call_args_list],
+            ['table', 'table_rejects'])
+
+    def test_import_file_only_imports_csv(self):
+        with self.assertRaises(ValueError):
+            DataHubManager.import_file(
+                'username', 'repo_base', 'repo', 'table', 'data.json',
+                file_format='JSON')
+        self.assertFalse(self.mock_loader.called)
+
 
 class PrivilegeChecks(TestCase):
     """Test privilege checking methods"""
@@ -225,6 +573,7 @@ class PrivilegeChecks(TestCase):
 
         self.mock_connection = self.create_patch(
             'core.db.manager.DataHubConnection')
+        _privilege_cache.clear()
 
     def create_patch(self, name):
         # helper method for creating patches
@@ -257,6 +606,7 @@ class PrivilegeChecks(TestCase):
         Collaborator = self.create_patch('core.db.manager.Collaborator')
         collab = MagicMock()
         collab.file_permission = 'read, write'
+        collab.repo_name = 'repo'
         collab.user = user
         collabs = [collab]
         Collaborator.objects.filter.return_value = collabs
@@ -279,3 +629,61 @@ class PrivilegeChecks(TestCase):
         with self.assertRaises(PermissionDenied):
             DataHubManager.has_repo_file_privilege(
                 self.username, 'repo_base', 'repo', 'read')
+
+    def test_privileges_fetched_once_per_repo_base(self):
+        m_get_privs = self.mock_connection.return_value.get_privileges
+        m_get_privs.return_value = [
+            (None, None, None, ['CONNECT']),
+            ('repo', None, None, ['USAGE']),
+            ('repo', 'table', None, ['SELECT']),
+            ('repo', 'table', 'col', ['SELECT', 'UPDATE'])]
+        m_has_db_priv = self.mock_connection.return_value.has_repo_db_privilege
+
+        self.assertTrue(DataHubManager.has_base_privilege(
+            self.username, 'repo_base', 'CONNECT'))
+        self.assertFalse(DataHubManager.has_base_privilege(
+            self.username, 'repo_base', 'CREATE'))
+        DataHubManager.has_repo_db_privilege(
+            self.username, 'repo_base', 'repo', 'USAGE')
+        with self.assertRaises(PermissionDenied):
+            DataHubManager.has_repo_db_privilege(
+                self.username, 'repo_base', 'repo', 'CREATE')
+        self.assertTrue(DataHubManager.has_table_privilege(
+            self.username, 'repo_base', 'repo.table', 'INSERT, SELECT'))
+        self.assertFalse(DataHubManager.has_column_privilege(
+            self.username, 'repo_base', 'repo.table', 'other', 'UPDATE'))
+        self.assertTrue(DataHubManager.has_column_privilege(
+            self.username, 'repo_base', 'repo.table', 'col', 'UPDATE'))
+
+        self.assertEqual(m_get_privs.call_count, 1)
+        self.assertFalse(m_has_db_priv.called)
+
+    def test_unknown_objects_are_checked_in_the_database(self):
+        self.mock_connection.return_value.get_privileges.return_value = [
+            (None, None, None, ['CONNECT'])]
+        m_has_db_priv = self.mock_connection.return_value.has_repo_db_privilege
+        m_has_db_priv.return_value = True
+
+        DataHubManager.has_repo_db_privilege(
+            self.username, 'repo_base', 'new_repo', 'USAGE')
+        self.assertTrue(m_has_db_priv.called)
+
+    def test_collaborator_changes_invalidate_privileges(self):
+        m_get_privs = self.mock_connection.return_value.get_privileges
+        m_get_privs.return_value = [('repo', None, None, ['CREATE'])]
+        DataHubManager.has_repo_db_privilege(
+            self.username, self.username, 'repo', 'CREATE')
+
+        manager = DataHubManager(user=self.username)
+        self.create_patch('core.db.manager.User')
+        mock_Collaborator = self.create_patch(
+            'core.db.manager.Collaborator')
+        mock_Collaborator.objects.get_or_create.return_value = (
+            MagicMock(), True)
+        manager.add_collaborator(
+            'repo', 'new_collaborator', db_privileges=['SELECT'],
+            file_privileges=['read'])
+        DataHubManager.has_repo_db_privilege(
+            self.username, self.username, 'repo', 'CREATE')
+
+        self.assertEqual(m_get_privs.call_count, 2)
@@ -0,0 +1,133 @@
+from mock import Mock, patch
+
+from django.test import TestCase
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from core.db.backend.pool import ConnectionPoolManager, PoolKey
+
+
+def _mock_connection(**kwargs):
+    conn = Mock()
+    conn.closed = False
+    conn.get_transaction_status.return_value = (
+        extensions.TRANSACTION_STATUS_IDLE)
+
+    def close():
+        conn.closed = True
+    conn.close.side_effect = close
+    return conn
+
+
+class ConnectionPoolManagerTests(TestCase):
+    """Tests connection reuse, limits and eviction in ConnectionPoolManager."""
+
+    def setUp(self):
+        self.connect = Mock(side_effect=_mock_connection)
+        self.manager = ConnectionPoolManager(
+            max_connections=2, max_pool_connections=2,
+            idle_timeout=60, wait_timeout=0, connect=self.connect)
+
+    def pool(self, user):
+        return self.manager.get_pool(
+            PoolKey(user, 'password', 'repo_base'),
+            user=user, password='password', database='repo_base')
+
+    def test_connections_are_reused(self):
+        pool = self.pool('foo')
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(self.connect.call_count, 1)
+        self.connect.assert_called_with(
+            user='foo', password='password', database='repo_base')
+        self.assertEqual(self.manager.hits, 1)
+        self.assertEqual(self.manager.misses, 1)
+        self.assertFalse(conn.close.called)
+
+    def test_transactions_are_rolled_back_on_return(self):
+        pool = self.pool('foo')
+        conn = pool.getconn()
+        conn.get_transaction_status.return_value = (
+            extensions.TRANSACTION_STATUS_INTRANS)
+        pool.putconn(conn)
+
+        self.assertTrue(conn.rollback.called)
+        self.assertEqual(self.manager.stats()['idle_connections'], 1)
+
+    def test_lru_idle_connection_is_evicted_at_the_cap(self):
+        foo, bar, baz = self.pool('foo'), self.pool('bar'), self.pool('baz')
+        foo_conn = foo.getconn()
+        bar_conn = bar.getconn()
+        foo.putconn(foo_conn)
+        bar.putconn(bar_conn)
+
+        baz.getconn()
+
+        self.assertTrue(foo_conn.closed)
+        self.assertFalse(bar_conn.closed)
+        self.assertEqual(self.manager.evictions, 1)
+        self.assertEqual(self.manager.open_connections, 2)
+        self.assertFalse(PoolKey('foo', 'password', 'repo_base')
+                         in self.manager)
+
+    def test_waits_then_raises_when_exhausted(self):
+        foo, bar = self.pool('foo'), self.pool('bar')
+        foo.getconn()
+        foo.getconn()
+
+        with self.assertRaises(PoolError):
+            bar.getconn()
+        self.assertEqual(self.manager.waits, 1)
+        self.assertEqual(self.manager.open_connections, 2)
+
+    def test_idle_connections_and_pools_expire(self):
+        pool = self.pool('foo')
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        with patch('core.db.backend.pool.time.time') as mock_time:
+            mock_time.return_value = pool.last_used + 120
+            self.pool('bar').getconn()
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(len(self.manager), 1)
+        self.assertEqual(self.manager.evictions, 1)
+
+    def test_closed_pool_closes_returned_connections(self):
+        pool = self.pool('foo')
+        conn = pool.getconn()
+        self.manager.close_pools(lambda key: key.repo_base == 'repo_base')
+        pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(self.manager.open_connections, 0)
+        with self.assertRaises(PoolError):
+            pool.getconn()
+
+    def test_dropped_pools_still_held_are_registered_again(self):
+        pool = self.pool('foo')
+        pool.putconn(pool.getconn())
+        with patch('core.db.backend.pool.time.time') as mock_time:
+            mock_time.return_value = pool.last_used + 120
+            self.pool('bar').getconn()
+        self.assertNotIn(pool.key, self.manager)
+
+        # a caller that got the pool before it was dropped still uses it
+        conn = pool.getconn()
+        self.assertIs(self.manager[pool.key], pool)
+        self.assertIs(self.pool('foo'), pool)
+        pool.putconn(conn)
+        self.assertFalse(conn.closed)
+
+    def test_replaced_pools_close_returned_connections(self):
+        pool = self.pool('foo')
+        conn = pool.getconn()
+        del self.manager._pools[pool.key]
+        replacement = self.pool('foo')
+        pool.putconn(conn)
+
+        self.assertIsNot(replacement, pool)
+        self.assertTrue(conn.closed)
+        self.assertEqual(self.manager.open_connections, 0)
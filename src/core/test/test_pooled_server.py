@@ -0,0 +1,91 @@
+from mock import Mock, patch
+
+from django.test import TestCase
+
+from tserver.pooled_server import PooledServer, ServerMetrics
+
+
+class ServerMetricsTests(TestCase):
+    """Tests summarizing the Thrift server's metrics."""
+
+    def test_report_summarizes_and_resets(self):
+        metrics = ServerMetrics()
+        metrics.queued(3)
+        metrics.queued(1)
+        for n in range(1, 21):
+            metrics.processed(wait=0.5, latency=float(n), ok=n != 20)
+
+        summary = metrics.report(connections=4, queue_depth=2)
+        self.assertEqual(summary, {
+            'connections': 4,
+            'queue_depth': 2,
+            'max_queue_depth': 3,
+            'requests': 20,
+            'failures': 1,
+            'mean_wait': 0.5,
+            'mean_latency': 10.5,
+            'p95_latency': 20.0,
+        })
+
+        summary = metrics.report(connections=0, queue_depth=0)
+        self.assertEqual(summary['requests'], 0)
+        self.assertEqual(summary['max_queue_depth'], 0)
+        self.assertEqual(summary['mean_latency'], 0)
+        self.assertEqual(summary['p95_latency'], 0)
+
+
+class PooledServerTests(TestCase):
+    """Tests the Thrift server's connection and queue limits."""
+
+    def setUp(self):
+        lsocket = Mock()
+        lsocket.handle.fileno.return_value = 100
+        self.server = PooledServer(Mock(), lsocket, max_connections=2,
+                                   max_queue=2)
+        self.addCleanup(self.server._read.close)
+        self.addCleanup(self.server._write.close)
+        self.mock_select = self.create_patch(
+            'tserver.pooled_server.select.select')
+        self.mock_select.return_value = ([], [], [])
+
+    def create_patch(self, name):
+        # helper method for creating patches
+        patcher = patch(name)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def add_client(self, fileno):
+        connection = Mock()
+        connection.fileno.return_value = fileno
+        connection.is_readable.return_value = True
+        connection.is_writeable.return_value = False
+        connection.is_closed.return_value = False
+        self.server.clients[fileno] = connection
+
+    def readable(self):
+        self.server._select()
+        return self.mock_select.call_args[0][0]
+
+    def test_accepts_connections_under_the_limit(self):
+        self.add_client(1)
+        self.assertEqual(
+            sorted(self.readable()),
+            sorted([self.server._read.fileno(), 100, 1]))
+
+    def test_stops_accepting_at_max_connections(self):
+        self.add_client(1)
+        self.add_client(2)
+        readable = self.readable()
+        self.assertNotIn(100, readable)
+        self.assertIn(1, readable)
+        self.assertIn(2, readable)
+
+    def test_stops_reading_at_max_queue(self):
+        self.add_client(1)
+        self.server.tasks.put('task')
+        self.server.tasks.put('task')
+        readable = self.readable()
+        self.assertNotIn(1, readable)
+        self.assertIn(100, readable)
+        self.assertIn(self.server._read.fileno(), readable)
@@ -1,4 +1,5 @@
 from core.db.query_rewriter import SQLQueryRewriter
+from core.db.rlsmanager import RowLevelSecurityManager
 
 from django.db.models import signals
 from django.test import TestCase
@@ -17,6 +18,9 @@ class QueryRewriter(TestCase):
         self.user = "test_user"
         self.query_rewriter = SQLQueryRewriter(self.repo_base, self.user)
 
+        # rewritten queries are cached across instances
+        RowLevelSecurityManager.clear_policy_cache()
+
         self.mock_connection = self.create_patch(
             'core.db.manager.DataHubConnection')
 
@@ -352,3 +356,25 @@ class QueryRewriter(TestCase):
         self.assertEquals(
             self.query_rewriter.apply_row_level_security(update_query),
             "RLS for update called")
+
+    def test_apply_row_level_security_caches_rewrites(self):
+        mock_find_table_policies = self.create_patch(
+            'core.db.query_rewriter.SQLQueryRewriter.find_table_policies')
+        mock_find_table_policies.return_value = ["tester='Alice'"]
+
+        query = "select * from repo.table"
+        first = self.query_rewriter.apply_row_level_security(query)
+        second = SQLQueryRewriter(
+            self.repo_base, self.user).apply_row_level_security(query)
+        self.assertEqual(first, second)
+        self.assertEqual(mock_find_table_policies.call_count, 1)
+
+        # other users get their own rewrite
+        SQLQueryRewriter(
+            self.repo_base, 'other_user').apply_row_level_security(query)
+        self.assertEqual(mock_find_table_policies.call_count, 2)
+
+        # policy changes invalidate cached rewrites
+        RowLevelSecurityManager.clear_policy_cache()
+        self.query_rewriter.apply_row_level_security(query)
+        self.assertEqual(mock_find_table_policies.call_count, 3)
@@ -3,7 +3,7 @@ from django.db.models import signals
 from django.contrib.auth.models import User
 from django.test import TestCase
 import factory
-from mock import patch
+from mock import patch, MagicMock
 
 
 class RowLevelSecurityManagerTests(TestCase):
@@ -20,6 +20,7 @@ class RowLevelSecurityManagerTests(TestCase):
             'core.db.rlsmanager.core.db.connection.DataHubConnection')
 
         self.manager = RowLevelSecurityManager(self.username, self.repo_base)
+        RowLevelSecurityManager.clear_policy_cache()
 
     def create_patch(self, name):
         # helper method for creating patches
@@ -46,6 +47,60 @@ class RowLevelSecurityManagerTests(TestCase):
 
         self.assertTrue(create_pol.called)
 
+    @patch('core.db.rlsmanager.settings.RLS_BACKEND', 'native')
+    def test_create_security_policy_syncs_native_policies(self):
+        sync = self.mock_connection.return_value.sync_row_level_security
+        mock_find_security_policies = self.create_patch(
+            'core.db.rlsmanager'
+            '.RowLevelSecurityManager.find_security_policies')
+        policy = MagicMock(
+            policy="policy='True'", policy_type="select",
+            grantee="test_grantee")
+        mock_find_security_policies.side_effect = [[], [policy]]
+
+        RowLevelSecurityManager.create_security_policy(
+            policy="policy='True'",
+            policy_type="select",
+            grantee="test_grantee",
+            grantor=self.username,
+            repo_base=self.repo_base,
+            repo=self.repo,
+            table=self.table)
+
+        sync.assert_called_with(self.repo, self.table, [
+            ("policy='True'", "select", "test_grantee")])
+        # as the table's owner
+        self.assertEqual(
+            self.mock_connection.call_args[1]['user'], self.username)
+
+    @patch('core.db.rlsmanager.settings.RLS_BACKEND', 'native')
+    def test_create_security_policy_removes_policies_that_fail_to_sync(self):
+        connection = self.mock_connection.return_value
+        connection.sync_row_level_security.side_effect = ValueError()
+        mock_find_security_policies = self.create_patch(
+            'core.db.rlsmanager'
+            '.RowLevelSecurityManager.find_security_policies')
+        mock_find_security_policies.side_effect = [
+            [], [], [MagicMock(id=1)]]
+
+        with self.assertRaises(ValueError):
+            RowLevelSecurityManager.create_security_policy(
+                policy="not an expression",
+                policy_type="select",
+                grantee="test_grantee",
+                grantor=self.username,
+                repo_base=self.repo_base,
+                repo=self.repo,
+                table=self.table)
+
+        connection.remove_security_policy.assert_called_with(1)
+
+    def test_rewrite_backend_skips_native_policies(self):
+        self.assertFalse(RowLevelSecurityManager.sync_native_policies(
+            self.repo_base, self.repo, self.table))
+        self.assertFalse(
+            self.mock_connection.return_value.sync_row_level_security.called)
+
     def test_find_security_policies(self):
         find_policies = self.mock_connection.return_value\
             .find_security_policies
@@ -60,6 +115,41 @@ class RowLevelSecurityManagerTests(TestCase):
             safe=False)
         self.assertTrue(find_policies.called)
 
+    def test_find_security_policies_caches_rewriter_lookups(self):
+        find_policies = self.mock_connection.return_value\
+            .find_security_policies
+        find_policies.return_value = [
+            (1, "visible='True'", 'select', 'test', self.username,
+             self.repo, self.table)]
+
+        def find():
+            return RowLevelSecurityManager.find_security_policies(
+                repo_base=self.repo_base,
+                repo=self.repo,
+                table=self.table,
+                policy_type="select",
+                grantee="test",
+                safe=False)
+
+        first = find()
+        self.assertEqual(find(), first)
+        self.assertEqual(find_policies.call_count, 1)
+
+        # changing a policy invalidates the cache
+        update_pol = self.mock_connection.return_value.update_security_policy
+        mock_find_by_id = self.create_patch(
+            'core.db.rlsmanager'
+            '.RowLevelSecurityManager.find_security_policy_by_id')
+        mock_find_by_id.return_value.repo_base = self.username
+        RowLevelSecurityManager.update_security_policy(
+            policy_id=1, new_policy="visible='False'",
+            new_policy_type="select", new_grantee="test",
+            username=self.username)
+        self.assertTrue(update_pol.called)
+
+        find()
+        self.assertEqual(find_policies.call_count, 2)
+
     def test_find_security_policy_by_id(self):
         find_id = self.mock_connection.return_value.find_security_policy_by_id
         #try and then catch this. It tries to unpack a magicmock when testing
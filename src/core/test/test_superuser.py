@@ -0,0 +1,90 @@
+import threading
+
+from mock import Mock
+
+from django.test import TestCase
+
+from core.db import superuser
+from core.db.superuser import superuser_connection
+
+
+class SuperuserSessionTests(TestCase):
+    """Tests sharing superuser connections within sessions."""
+
+    def setUp(self):
+        self.connection_class = Mock(side_effect=lambda **kwargs: Mock())
+        superuser.end_session()
+        self.addCleanup(superuser.end_session)
+
+    def connection(self, repo_base='repo_base'):
+        return superuser_connection(repo_base, self.connection_class)
+
+    def test_connections_are_not_shared_outside_of_sessions(self):
+        with self.connection() as first:
+            pass
+        with self.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.close_connection.called)
+        self.assertTrue(second.close_connection.called)
+
+    def test_connections_are_shared_within_sessions(self):
+        superuser.begin_session()
+        with self.connection() as first:
+            with self.connection() as nested:
+                pass
+        with self.connection() as second:
+            pass
+        with self.connection('other_repo_base') as other:
+            pass
+
+        self.assertIs(first, nested)
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertFalse(first.close_connection.called)
+
+        stats = superuser.end_session()
+        self.assertTrue(first.close_connection.called)
+        self.assertTrue(other.close_connection.called)
+        self.assertEqual(stats, {'opened': 2, 'reused': 2, 'discarded': 0})
+
+    def test_connections_are_given_back_after_errors(self):
+        superuser.begin_session()
+        with self.assertRaises(ValueError):
+            with self.connection() as first:
+                raise ValueError()
+        with self.connection() as second:
+            pass
+
+        self.assertTrue(first.close_connection.called)
+        self.assertIsNot(first, second)
+        self.assertEqual(superuser.end_session()['discarded'], 1)
+
+    def test_sessions_are_per_thread(self):
+        superuser.begin_session()
+        with self.connection() as first:
+            pass
+
+        connections = []
+
+        def use_connection():
+            with self.connection() as conn:
+                connections.append(conn)
+        thread = threading.Thread(target=use_connection)
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(first, connections[0])
+        self.assertTrue(connections[0].close_connection.called)
+
+    def test_release(self):
+        superuser.begin_session()
+        with self.connection() as first:
+            pass
+        superuser.release('repo_base')
+        with self.connection() as second:
+            pass
+
+        self.assertTrue(first.close_connection.called)
+        self.assertIsNot(first, second)
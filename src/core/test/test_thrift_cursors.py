@@ -0,0 +1,99 @@
+from mock import Mock, patch
+
+from django.test import TestCase
+
+from datahub.constants import Connection, DBException
+from service.handler import DataHubHandler
+
+
+class ThriftCursorTests(TestCase):
+    """Tests cursors opened through the Thrift handler."""
+
+    def setUp(self):
+        self.mock_manager = self.create_patch('service.handler.DataHubManager')
+        self.mock_manager.side_effect = self.manager
+        self.managers = []
+        self.handler = DataHubHandler()
+        self.con = Connection(user='username', repo_base='repo_base',
+                              is_app=False)
+
+    def create_patch(self, name):
+        # helper method for creating patches
+        patcher = patch(name)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def manager(self, **kwargs):
+        manager = Mock()
+        manager.execute_sql.return_value = {
+            'fields': [{'name': 'n', 'type': 'integer'}],
+            'tuples': iter([(n,) for n in range(5)])}
+        self.managers.append(manager)
+        return manager
+
+    def open_cursor(self, con=None):
+        return self.handler.open_cursor(con or self.con, 'SELECT n FROM t')
+
+    def test_fetch_in_batches_closes_exhausted_cursor(self):
+        cursor_con = self.open_cursor()
+
+        res = self.handler.fetch(cursor_con, 3)
+        self.assertEqual([t.cells for t in res.tuples],
+                         [['0'], ['1'], ['2']])
+        self.assertEqual(res.num_more_tuples, -1)
+        self.assertFalse(self.managers[0].close_connection.called)
+
+        res = self.handler.fetch(cursor_con, 3)
+        self.assertEqual(len(res.tuples), 2)
+        self.assertEqual(res.num_more_tuples, 0)
+        self.assertTrue(self.managers[0].close_connection.called)
+        self.assertEqual(self.handler.sessions, {})
+
+    def test_fetch_count_is_clamped(self):
+        cursor_con = self.open_cursor()
+        with patch('service.handler.settings.THRIFT_MAX_FETCH', 2):
+            res = self.handler.fetch(cursor_con, 1000)
+        self.assertEqual(len(res.tuples), 2)
+
+        res = self.handler.fetch(cursor_con, -1)
+        self.assertEqual(len(res.tuples), 0)
+        self.assertEqual(res.num_more_tuples, -1)
+
+    def test_cursors_belong_to_who_opened_them(self):
+        cursor_con = self.open_cursor()
+        other_con = Connection(user='other', repo_base='repo_base',
+                               is_app=False, cursor=cursor_con.cursor)
+
+        with self.assertRaises(DBException):
+            self.handler.fetch(other_con, 1)
+        with self.assertRaises(DBException):
+            self.handler.close_cursor(other_con)
+        self.assertIn(cursor_con.cursor, self.handler.sessions)
+
+    def test_idle_cursors_expire(self):
+        cursor_con = self.open_cursor()
+        self.handler.sessions[cursor_con.cursor].last_used -= 301
+
+        with patch('service.handler.settings.THRIFT_CURSOR_TIMEOUT', 300):
+            with self.assertRaises(DBException):
+                self.handler.fetch(cursor_con, 1)
+        self.assertTrue(self.managers[0].close_connection.called)
+        self.assertEqual(self.handler.sessions, {})
+
+    @patch('service.handler.settings.THRIFT_MAX_CURSORS_PER_USER', 2)
+    @patch('service.handler.settings.THRIFT_MAX_CURSORS', 3)
+    def test_open_cursors_are_limited(self):
+        self.open_cursor()
+        self.open_cursor()
+        with self.assertRaises(DBException):
+            self.open_cursor()
+        # refused before a connection is taken
+        self.assertEqual(len(self.managers), 2)
+
+        other_con = Connection(user='other', repo_base='repo_base',
+                               is_app=False)
+        self.open_cursor(other_con)
+        with self.assertRaises(DBException):
+            self.open_cursor(other_con)
+        self.assertEqual(len(self.handler.sessions), 3)
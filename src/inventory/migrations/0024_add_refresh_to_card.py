@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0023_auto_20171210_0018'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='last_refreshed',
+            field=models.DateTimeField(null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='result_size',
+            field=models.IntegerField(null=True, blank=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0024_add_refresh_to_card'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('username', models.CharField(max_length=50)),
+                ('repo_base', models.CharField(max_length=50)),
+                ('repo_name', models.CharField(max_length=50)),
+                ('kind', models.CharField(max_length=20)),
+                ('params', models.TextField(default='{}')),
+                ('status', models.CharField(
+                    default='queued', max_length=10,
+                    choices=[('queued', 'queued'), ('running', 'running'),
+                             ('succeeded', 'succeeded'), ('failed', 'failed'),
+                             ('cancelled', 'cancelled')])),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('progress', models.BigIntegerField(default=0)),
+                ('total', models.BigIntegerField(null=True, blank=True)),
+                ('result', models.TextField(null=True, blank=True)),
+                ('error', models.TextField(null=True, blank=True)),
+                ('worker', models.CharField(
+                    max_length=100, null=True, blank=True)),
+                ('started', models.DateTimeField(null=True, blank=True)),
+                ('finished', models.DateTimeField(null=True, blank=True)),
+            ],
+            options={
+                'db_table': 'jobs',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together=set([('status', 'id')]),
+        ),
+    ]
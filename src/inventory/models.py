@@ -29,6 +29,10 @@ class Card(models.Model):
     card_name = models.CharField(max_length=50)
     public = models.BooleanField(default=False)
     query = models.TextField()
+    # when the card's results were last computed, rather than read from the
+    # card results cache, and how many rows that page of results had
+    last_refreshed = models.DateTimeField(null=True, blank=True)
+    result_size = models.IntegerField(null=True, blank=True)
 
     def __unicode__(self):
         return 'card: %s.%s %s' % (self.repo_base,
@@ -129,3 +133,51 @@ class LicenseView(models.Model):
             view_sql=self.view_sql,
             license_id=self.license_id,
             id=self.id)
+
+
+class Job(models.Model):
+    """
+    A queued export or import, run in the background by core.jobs workers.
+
+    progress counts the bytes written (exports) or read (imports) so far.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED)
+
+    id = models.AutoField(primary_key=True)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    username = models.CharField(max_length=50)
+    repo_base = models.CharField(max_length=50)
+    repo_name = models.CharField(max_length=50)
+    kind = models.CharField(max_length=20)
+    # json encoded keyword arguments for the job's handler
+    params = models.TextField(default='{}')
+    status = models.CharField(max_length=10, default=QUEUED,
+                              choices=[(s, s) for s in STATUSES])
+    cancel_requested = models.BooleanField(default=False)
+    progress = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True, blank=True)
+    # the name of the file the job wrote to the repo, if any
+    result = models.TextField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    worker = models.CharField(max_length=100, null=True, blank=True)
+    started = models.DateTimeField(null=True, blank=True)
+    # when the worker running the job last reported that it's still alive
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    def __unicode__(self):
+        return 'job %s: %s %s.%s (%s)' % (self.id, self.kind, self.repo_base,
+                                          self.repo_name, self.status)
+
+    @property
+    def done(self):
+        return self.status in (Job.SUCCEEDED, Job.FAILED, Job.CANCELLED)
+
+    class Meta:
+        db_table = "jobs"
+        index_together = ('status', 'id')
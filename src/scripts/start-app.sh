@@ -5,6 +5,10 @@ echo "Generating Thrift files..."
 pushd /datahub/
 source src/setup.sh
 popd
+if [ "${RUN_JOBS:-1}" != "0" ]; then
+    echo "Starting job worker..."
+    python src/manage.py runjobs &
+fi
 echo "Starting Gunicorn..."
 exec gunicorn browser.wsgi \
     --config=provisions/gunicorn/config_dev.py
@@ -1,5 +1,10 @@
 import hashlib
+import itertools
+import random
+import threading
+import time
 
+from config import settings
 from core.db.connection import DataHubConnection
 from core.db.manager import DataHubManager
 
@@ -29,11 +34,51 @@ def construct_result_set(res):
                      field_types=field_types)
 
 
+class _CursorSession(object):
+    """
+    An open cursor: the manager whose connection it's on, the fields and
+    remaining rows of its query, and who opened it.
+    """
+
+    def __init__(self, con, manager, result):
+        self.user = con.user
+        self.repo_base = con.repo_base
+        self.manager = manager
+        self.fields = result['fields']
+        self.rows = iter(result['tuples'])
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+
+    def fetch(self, count):
+        # Reads one row past count, to tell whether the cursor is exhausted.
+        rows = list(itertools.islice(self.rows, count + 1))
+        more = len(rows) > count
+        if more:
+            self.rows = itertools.chain(rows[count:], self.rows)
+        self.last_used = time.time()
+        return rows[:count], more
+
+    def close(self):
+        close = getattr(self.rows, 'close', None)
+        if close is not None:
+            close()
+        self.manager.close_connection()
+
+
+def _batch_exception(e):
+    # Batches are rolled back as a whole, so report which statement failed.
+    index = getattr(e, 'statement_index', None)
+    details = None if index is None else 'statement_index: %d' % index
+    return DBException(message=str(e), details=details)
+
+
 class DataHubHandler:
 
     def __init__(self):
+        # cursor id: _CursorSession
         self.sessions = {}
-        pass
+        self._sessions_lock = threading.Lock()
+        self._random = random.SystemRandom()
 
     def get_version(self):
         return VERSION
@@ -204,3 +249,121 @@ class DataHubHandler:
             return construct_result_set(res)
         except Exception as e:
             raise DBException(message=str(e))
+
+    def execute_batch(self, con, statements):
+        try:
+            with DataHubManager(user=con.user, repo_base=con.repo_base,
+                                is_app=con.is_app) as manager:
+                res = manager.execute_batch(
+                    [(s.query, s.query_params) for s in statements])
+            return [construct_result_set(r) for r in res]
+        except Exception as e:
+            raise _batch_exception(e)
+
+    def execute_many(self, con, query, query_params_list):
+        try:
+            with DataHubManager(user=con.user, repo_base=con.repo_base,
+                                is_app=con.is_app) as manager:
+                res = manager.execute_many(
+                    query=query, params_list=query_params_list)
+            return [construct_result_set(r) for r in res]
+        except Exception as e:
+            raise _batch_exception(e)
+
+    def open_cursor(self, con, query, query_params=None):
+        try:
+            self._expire_sessions()
+            with self._sessions_lock:
+                # fail early, before taking a connection
+                self._check_cursor_limits(con)
+            manager = DataHubManager(
+                user=con.user, repo_base=con.repo_base, is_app=con.is_app)
+            try:
+                res = manager.execute_sql(
+                    query=query, params=query_params, stream=True)
+                session = _CursorSession(con, manager, res)
+            except Exception:
+                manager.close_connection()
+                raise
+
+            with self._sessions_lock:
+                try:
+                    self._check_cursor_limits(con)
+                except Exception:
+                    session.close()
+                    raise
+                cursor = self._random.getrandbits(63)
+                self.sessions[cursor] = session
+
+            return Connection(
+                client_id=con.client_id, seq_id=con.seq_id, user=con.user,
+                is_app=con.is_app, repo_base=con.repo_base, cursor=cursor)
+        except Exception as e:
+            raise DBException(message=str(e))
+
+    def fetch(self, con, count):
+        try:
+            session = self._session(con)
+            count = max(0, min(count, settings.THRIFT_MAX_FETCH))
+            with session.lock:
+                rows, more = session.fetch(count)
+            if not more:
+                self._close_session(con.cursor)
+
+            res = construct_result_set({
+                'status': True, 'row_count': len(rows),
+                'tuples': rows, 'fields': session.fields})
+            res.con = con
+            # the number of tuples left isn't known until they're read
+            res.num_more_tuples = -1 if more else 0
+            return res
+        except Exception as e:
+            raise DBException(message=str(e))
+
+    def close_cursor(self, con):
+        try:
+            self._session(con)
+            self._close_session(con.cursor)
+            return True
+        except Exception as e:
+            raise DBException(message=str(e))
+
+    def close_connection(self, con):
+        try:
+            if con.cursor is not None:
+                self._close_session(con.cursor)
+            return True
+        except Exception as e:
+            raise DBException(message=str(e))
+
+    def _check_cursor_limits(self, con):
+        # Called with _sessions_lock held.
+        if len(self.sessions) >= settings.THRIFT_MAX_CURSORS:
+            raise Exception('Too many open cursors.')
+        open_cursors = sum(
+            1 for s in self.sessions.values()
+            if s.user == con.user and s.repo_base == con.repo_base)
+        if open_cursors >= settings.THRIFT_MAX_CURSORS_PER_USER:
+            raise Exception('Too many open cursors. Close some first.')
+
+    def _session(self, con):
+        # Returns the connection's cursor, if it's open and theirs.
+        self._expire_sessions()
+        session = self.sessions.get(con.cursor)
+        if (session is None or session.user != con.user or
+                session.repo_base != con.repo_base):
+            raise LookupError('Cursor not found. It may have expired.')
+        return session
+
+    def _close_session(self, cursor):
+        with self._sessions_lock:
+            session = self.sessions.pop(cursor, None)
+        if session is not None:
+            with session.lock:
+                session.close()
+
+    def _expire_sessions(self):
+        expired = time.time() - settings.THRIFT_CURSOR_TIMEOUT
+        for cursor, session in self.sessions.items():
+            if session.last_used < expired:
+                self._close_session(cursor)
@@ -59,6 +59,12 @@ struct ResultSet {
   7: optional list <string> field_types,
 }
 
+// a query and its parameters, for execute_batch
+struct Statement {
+  1: optional string query,
+  2: optional list <binary> query_params,
+}
+
 // Error in DB Operation
 exception DBException {
   1: optional i32 error_code,
@@ -94,5 +100,30 @@ service DataHub {
       2: string query,
       3: list <binary> query_params) throws (1: DBException ex)
 
+  // runs the statements in order, in one transaction
+  list <ResultSet> execute_batch (
+      1: Connection con,
+      2: list <Statement> statements) throws (1: DBException ex)
+
+  // runs the query once per list of params, in one transaction
+  list <ResultSet> execute_many (
+      1: Connection con,
+      2: string query,
+      3: list <list <binary>> query_params_list) throws (1: DBException ex)
+
+  // runs a query, and returns the connection with a server-side cursor over
+  // its result in con.cursor
+  Connection open_cursor (
+      1: Connection con,
+      2: string query,
+      3: list <binary> query_params) throws (1: DBException ex)
+
+  // returns the next count tuples of con.cursor. num_more_tuples is 0 once
+  // the cursor is exhausted, which also closes it, and -1 before then.
+  ResultSet fetch (
+      1: Connection con, 2: i32 count) throws (1: DBException ex)
+
+  bool close_cursor (1: Connection con) throws (1: DBException ex)
+
   bool close_connection (1: Connection con) throws (1: DBException ex)
 }
@@ -0,0 +1,195 @@
+import logging
+import select
+import threading
+import time
+
+from thrift.server import TNonblockingServer
+from thrift.server.TNonblockingServer import Connection, WAIT_PROCESS
+from thrift.transport import TTransport
+
+'''
+A non-blocking Thrift server with a bounded worker pool.
+
+One thread reads requests from, and writes replies to, every client socket,
+and a fixed pool of workers processes the requests. Clients must use the
+framed transport.
+
+The server stops accepting connections while it has max_connections open,
+leaving new ones in the listen backlog, and stops reading requests while
+max_queue are waiting for a worker, so load beyond that waits in the kernel
+rather than in memory or database connections.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class ServerMetrics(object):
+    """
+    Request counts, latencies and queue depths, summarized and reset by
+    report().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.failures = 0
+        self.latencies = []
+        self.waits = []
+        self.max_queue_depth = 0
+
+    def queued(self, depth):
+        with self.lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def processed(self, wait, latency, ok):
+        with self.lock:
+            self.requests += 1
+            self.failures += 0 if ok else 1
+            self.waits.append(wait)
+            self.latencies.append(latency)
+
+    def report(self, connections, queue_depth):
+        """Returns a summary of the metrics since the last report."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            waits = self.waits
+            summary = {
+                'connections': connections,
+                'queue_depth': queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'requests': self.requests,
+                'failures': self.failures,
+                'mean_wait': sum(waits) / len(waits) if waits else 0,
+                'mean_latency': (
+                    sum(latencies) / len(latencies) if latencies else 0),
+                'p95_latency': (
+                    latencies[int(len(latencies) * 0.95)]
+                    if latencies else 0),
+            }
+            self.reset()
+        return summary
+
+
+class _Worker(threading.Thread):
+
+    def __init__(self, server):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.server = server
+
+    def run(self):
+        while True:
+            task = self.server.tasks.get()
+            if task is None:
+                return
+            enqueued, iprot, oprot, otrans, callback = task
+            started = time.time()
+            ok = True
+            try:
+                self.server.processor.process(iprot, oprot)
+            except Exception:
+                logger.exception('Exception while processing request')
+                ok = False
+            finished = time.time()
+            self.server.metrics.processed(
+                started - enqueued, finished - enqueued, ok)
+            callback(ok, otrans.getvalue() if ok else '')
+
+
+class PooledServer(TNonblockingServer.TNonblockingServer):
+    """
+    TNonblockingServer with limits on open connections and queued requests,
+    and metrics logged every metrics_interval seconds.
+    """
+
+    def __init__(self, processor, lsocket, protocol_factory=None, threads=10,
+                 max_connections=1000, max_queue=100, metrics_interval=60):
+        TNonblockingServer.TNonblockingServer.__init__(
+            self, processor, lsocket, protocol_factory, protocol_factory,
+            threads)
+        self.max_connections = max_connections
+        self.max_queue = max_queue
+        self.metrics = ServerMetrics()
+        self.metrics_interval = metrics_interval
+        self._next_report = time.time() + metrics_interval
+
+    def prepare(self):
+        if self.prepared:
+            return
+        self.socket.listen()
+        for _ in xrange(self.threads):
+            _Worker(self).start()
+        self.prepared = True
+
+    def close(self):
+        for _ in xrange(self.threads):
+            self.tasks.put(None)
+        self.socket.close()
+        self.prepared = False
+
+    def report(self):
+        """Returns the metrics since the last report, and logs them."""
+        summary = self.metrics.report(len(self.clients), self.tasks.qsize())
+        logger.info(
+            'connections=%(connections)d queue_depth=%(queue_depth)d '
+            'max_queue_depth=%(max_queue_depth)d requests=%(requests)d '
+            'failures=%(failures)d mean_wait=%(mean_wait).4fs '
+            'mean_latency=%(mean_latency).4fs p95_latency=%(p95_latency).4fs',
+            summary)
+        return summary
+
+    def _select(self):
+        # Only listens for new connections and requests while under the
+        # limits. Waits at most until the next report is due.
+        readable = [self._read.fileno()]
+        if len(self.clients) < self.max_connections:
+            readable.append(self.socket.handle.fileno())
+        reading = self.tasks.qsize() < self.max_queue
+        writable = []
+        for i, connection in self.clients.items():
+            if reading and connection.is_readable():
+                readable.append(connection.fileno())
+            if connection.is_writeable():
+                writable.append(connection.fileno())
+            if connection.is_closed():
+                del self.clients[i]
+        timeout = max(self._next_report - time.time(), 0)
+        return select.select(
+            readable, writable, readable, timeout)
+
+    def handle(self):
+        assert self.prepared, 'You have to call prepare before handle'
+        rset, wset, xset = self._select()
+        for readable in rset:
+            if readable == self._read.fileno():
+                # only wakes up the select
+                self._read.recv(1024)
+            elif readable == self.socket.handle.fileno():
+                client = self.socket.accept().handle
+                self.clients[client.fileno()] = Connection(
+                    client, self.wake_up)
+            elif readable in self.clients:
+                connection = self.clients[readable]
+                connection.read()
+                if connection.status == WAIT_PROCESS:
+                    itransport = TTransport.TMemoryBuffer(connection.message)
+                    otransport = TTransport.TMemoryBuffer()
+                    iprot = self.in_protocol.getProtocol(itransport)
+                    oprot = self.out_protocol.getProtocol(otransport)
+                    self.tasks.put((time.time(), iprot, oprot, otransport,
+                                    connection.ready))
+                    self.metrics.queued(self.tasks.qsize())
+        for writeable in wset:
+            if writeable in self.clients:
+                self.clients[writeable].write()
+        for oob in xset:
+            if oob in self.clients:
+                self.clients[oob].close()
+                del self.clients[oob]
+
+        if time.time() >= self._next_report:
+            self.report()
+            self._next_report = time.time() + self.metrics_interval
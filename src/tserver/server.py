@@ -1,4 +1,7 @@
 #!/usr/bin/python
+import argparse
+import logging
+
 from datahub import DataHub
 from service.handler import DataHubHandler
 
@@ -7,22 +10,51 @@ from thrift.server import TServer
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 
+from config import settings
+from pooled_server import PooledServer
+
 '''
 @author: anant bhardwaj
 @date: Oct 9, 2013
 
 DataHub Server (TCP Mode)
+
+In the default, threaded mode, each client connection gets its own thread
+and a buffered transport. In nonblocking mode, clients must use the framed
+transport, and requests are processed by a fixed pool of threads.
 '''
 
+parser = argparse.ArgumentParser(description='DataHub Thrift TCP server')
+parser.add_argument('--mode', choices=['threaded', 'nonblocking'],
+                    default=settings.THRIFT_SERVER_MODE)
+parser.add_argument('--port', type=int, default=9000)
+parser.add_argument('--threads', type=int,
+                    default=settings.THRIFT_SERVER_THREADS)
+parser.add_argument('--max-connections', type=int,
+                    default=settings.THRIFT_SERVER_MAX_CONNECTIONS)
+parser.add_argument('--max-queue', type=int,
+                    default=settings.THRIFT_SERVER_MAX_QUEUE)
+parser.add_argument('--metrics-interval', type=int,
+                    default=settings.THRIFT_SERVER_METRICS_INTERVAL)
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO)
+
 handler = DataHubHandler()
 
 processor = DataHub.Processor(handler)
-transport = TSocket.TServerSocket('0.0.0.0', 9000)
-tfactory = TTransport.TBufferedTransportFactory()
+transport = TSocket.TServerSocket('0.0.0.0', args.port)
 pfactory = TBinaryProtocol.TBinaryProtocolFactory()
 
-server = TServer.TThreadedServer(
-    processor, transport, tfactory, pfactory)
+if args.mode == 'nonblocking':
+    server = PooledServer(
+        processor, transport, pfactory, threads=args.threads,
+        max_connections=args.max_connections, max_queue=args.max_queue,
+        metrics_interval=args.metrics_interval)
+else:
+    tfactory = TTransport.TBufferedTransportFactory()
+    server = TServer.TThreadedServer(
+        processor, transport, tfactory, pfactory)
 
-print('Starting DataHub Server')
+print('Starting DataHub Server (%s)' % args.mode)
 server.serve()
@@ -2,8 +2,16 @@
 abspath=$(cd "$(dirname "$BASH_SOURCE")"; pwd)
 basepath=$(cd "$abspath/.."; pwd)
 
+# usage: start_tcp_server.sh [threaded|nonblocking] [server.py options]
+# nonblocking mode needs clients to use TFramedTransport.
+mode_option=""
+if [ $# -gt 0 ]; then
+    mode_option="--mode $1"
+    shift
+fi
+
 sh $abspath/stop_tcp_server.sh
 sh $basepath/set_env.sh
 echo "Starting DataHub TCP server..."
-nohup python $abspath/server.py > /dev/null 2>&1 &
+nohup python $abspath/server.py $mode_option "$@" > /dev/null 2>&1 &
 echo "Done."
\ No newline at end of file